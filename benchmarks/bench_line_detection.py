@@ -0,0 +1,120 @@
+"""
+Benchmark: detección de la línea de firma en páginas con muchas tablas.
+
+Compara find_signature_line con method="drawings" (page.get_drawings()
+completo) contra "cdrawings" (get_cdrawings() + corte temprano) y "bboxlog"
+(solo bboxes, get_cdrawings() si hace falta), con y sin zona de búsqueda, y
+verifica que encuentren la misma línea.
+
+Uso:
+    python benchmarks/bench_line_detection.py --pages 50 --rows 40 --cols 8
+    python benchmarks/bench_line_detection.py --pdf input/contrato.pdf
+"""
+from __future__ import annotations
+import argparse
+import time
+
+import fitz
+
+from pdf_ocr_stamper.anchors import find_signature_line
+
+
+def _draw_table(page: fitz.Page, top: float, rows: int, cols: int, as_one_path: bool):
+    """Tabla con bordes: un path por celda, o toda la grilla en un solo path."""
+    x0, x1 = 50.0, page.rect.width - 50.0
+    row_h, col_w = 12.0, (x1 - x0) / cols
+    shape = page.new_shape()
+    for r in range(rows):
+        for c in range(cols):
+            cell = fitz.Rect(x0 + c * col_w, top + r * row_h, x0 + (c + 1) * col_w, top + (r + 1) * row_h)
+            shape.draw_rect(cell)
+            if not as_one_path:
+                shape.finish(width=0.5, color=(0, 0, 0))
+    if as_one_path:
+        shape.finish(width=0.5, color=(0, 0, 0))
+    # borde exterior de la tabla
+    shape.draw_rect(fitz.Rect(x0, top, x1, top + rows * row_h))
+    shape.finish(width=1.0, color=(0, 0, 0))
+    shape.commit()
+
+
+def _draw_logo(page: fitz.Page, n: int):
+    """Logo vectorial: muchas curvas pequeñas."""
+    shape = page.new_shape()
+    for i in range(n):
+        cx, cy = 80 + (i % 20) * 3.0, 40 + (i // 20) * 3.0
+        shape.draw_circle((cx, cy), 2.0)
+        shape.finish(fill=(0.2, 0.2, 0.6), color=None)
+    shape.commit()
+
+
+def _make_doc(pages: int, rows: int, cols: int, logo: int) -> fitz.Document:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        _draw_logo(page, logo)
+        _draw_table(page, 90, rows, cols, as_one_path=bool(i % 2))
+        # línea de firma: alternar trazo y rectángulo relleno fino (como Word)
+        y = page.rect.height - 120
+        if i % 2:
+            page.draw_rect(fitz.Rect(60, y, 300, y + 0.6), fill=(0, 0, 0), color=None)
+        else:
+            page.draw_line((60, y), (300, y), width=0.8)
+        page.insert_text((60, y + 14), "Firma del representante legal")
+    return doc
+
+
+def _rounded(xy):
+    # bboxlog trabaja en float32: se compara al centésimo de punto
+    return None if xy is None else tuple(round(v, 2) for v in xy)
+
+
+def _run(doc: fitz.Document, method: str, clip_bottom: float | None, min_width) -> tuple[float, list]:
+    found = []
+    t0 = time.perf_counter()
+    for page in doc:
+        clip = None
+        if clip_bottom:
+            r = page.rect
+            clip = (r.x0, r.y1 - r.height * clip_bottom, r.x1, r.y1)
+        found.append(find_signature_line(page, min_width, 10, clip=clip, method=method))
+    return time.perf_counter() - t0, found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pdf", help="Usar un PDF real en lugar del sintético")
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--rows", type=int, default=40)
+    ap.add_argument("--cols", type=int, default=8)
+    ap.add_argument("--logo", type=int, default=400, help="Curvas del logo vectorial por página")
+    ap.add_argument("--min-width", default="30%")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    doc = fitz.open(args.pdf) if args.pdf else _make_doc(args.pages, args.rows, args.cols, args.logo)
+    n = doc.page_count
+    print(f"páginas: {n}, min_width: {args.min_width}")
+    print(f"{'modo':<28}{'ms total':>12}{'ms/página':>12}{'líneas':>10}")
+    reference = None
+    for label, method, clip in (
+        ("drawings", "drawings", None),
+        ("drawings + zona 35%", "drawings", 0.35),
+        ("cdrawings", "cdrawings", None),
+        ("cdrawings + zona 35%", "cdrawings", 0.35),
+        ("bboxlog", "bboxlog", None),
+        ("bboxlog + zona 35%", "bboxlog", 0.35),
+    ):
+        best_t, found = min((_run(doc, method, clip, args.min_width) for _ in range(args.repeat)),
+                            key=lambda r: r[0])
+        if clip is None:
+            if reference is None:
+                reference = found
+            elif [_rounded(f) for f in found] != [_rounded(f) for f in reference]:
+                print(f"  ! {label}: resultado distinto de drawings")
+        print(f"{label:<28}{best_t * 1000:>12.1f}{best_t * 1000 / n:>12.3f}{sum(1 for f in found if f):>10}")
+    doc.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+"""
+Benchmark del lote completo sobre el corpus sintético (synthetic_corpus.py).
+
+Mide:
+  - process_batch de punta a punta, en un proceso nuevo por repetición y con
+    output_dir vacío: archivos/s, páginas/s y RSS pico (proceso principal y
+    workers);
+  - cada etapa por documento (read, open, analyze, stamp, save) en este
+    proceso, sin cachés: percentiles p50/p90/p99/max en ms y ms por página.
+
+El resultado es JSON (bench_<commit>.json) para comparar entre commits:
+    python benchmarks/bench_pipeline.py --sizes 1,10,100,1000            # -> bench_abc1234.json
+    git checkout otra-rama
+    python benchmarks/bench_pipeline.py --sizes 1,10,100,1000 --compare bench_abc1234.json
+
+Con --corpus DIR se reutiliza (o se genera una vez) el corpus en DIR.
+"""
+from __future__ import annotations
+import argparse
+import contextlib
+import hashlib
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz
+
+from pdf_ocr_stamper.config_loader import load_config
+from pdf_ocr_stamper.pipeline import _analyze_for, _build_context, _new_result, _stamp_placements
+from pdf_ocr_stamper.saving import serialize
+
+from synthetic_corpus import DEFAULT_SIZES, KINDS, build_corpus
+
+STAGES = ("read", "open", "analyze", "stamp", "save")
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    v = sorted(values)
+
+    def pct(p: float) -> float:
+        return round(v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))], 3)
+
+    return {"n": len(v), "p50": pct(50), "p90": pct(90), "p99": pct(99), "max": round(v[-1], 3),
+            "total": round(sum(v), 3)}
+
+
+def _peak_rss_mb() -> dict:
+    """RSS pico de este proceso y del mayor de sus hijos ya terminados (workers)."""
+    try:
+        import resource
+    except ImportError:  # Windows
+        try:
+            import psutil
+            return {"main": round(psutil.Process().memory_info().peak_wset / 2**20, 1), "workers_max": None}
+        except Exception:
+            return {"main": None, "workers_max": None}
+    per_mb = 2**20 if sys.platform == "darwin" else 2**10  # ru_maxrss: bytes en macOS, KB en Linux
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return {"main": round(own / per_mb, 1), "workers_max": round(children / per_mb, 1) if children else None}
+
+
+def _corpus_cfg(corpus: Path, output_dir: Path, workers: int | None, save_mode: str) -> dict:
+    cfg = load_config(str(corpus / "config.yaml"))
+    cfg["input_dir"] = str(corpus / "input")
+    cfg["output_dir"] = str(output_dir)
+    cfg["rules_yaml"] = str(corpus / cfg["rules_yaml"])
+    cfg["signature"] = dict(cfg["signature"], path=str(corpus / cfg["signature"]["path"]))
+    cfg["outlog"] = str(output_dir / "placement_log.csv")
+    cfg["output"] = dict(cfg.get("output") or {}, save_mode=save_mode)
+    if workers is not None:
+        cfg["workers"] = workers
+    return cfg
+
+
+def _run_batch(cfg: dict) -> dict:
+    """Corre en un proceso nuevo: el RSS pico es solo de este lote."""
+    from pdf_ocr_stamper.pipeline import process_batch
+
+    # salida del lote (y de sus workers, que heredan el descriptor) descartada
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, 1)
+    t0 = time.perf_counter()
+    process_batch(cfg, auto_confirm=True)
+    wall = time.perf_counter() - t0
+    out = Path(cfg["output_dir"])
+    return {"wall_s": round(wall, 4), "outputs": sum(1 for _ in out.glob("*.pdf")),
+            "errors": (out / "error_log.csv").exists(), "peak_rss_mb": _peak_rss_mb()}
+
+
+def bench_batch(corpus: Path, files: list[dict], repeat: int, workers: int | None, save_mode: str) -> dict:
+    pages = sum(f["pages"] for f in files)
+    runs = []
+    spawn = multiprocessing.get_context("spawn")
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix="bench_out_") as tmp:
+            cfg = _corpus_cfg(corpus, Path(tmp), workers, save_mode)
+            with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                runs.append(pool.submit(_run_batch, cfg).result())
+    best = min(runs, key=lambda r: r["wall_s"])
+    return {
+        "repeat": repeat,
+        "wall_s": [r["wall_s"] for r in runs],
+        "files_per_s": round(len(files) / best["wall_s"], 3),
+        "pages_per_s": round(pages / best["wall_s"], 2),
+        "peak_rss_mb": {k: max((r["peak_rss_mb"][k] or 0) for r in runs) or None for k in ("main", "workers_max")},
+        "outputs": best["outputs"],
+        "errors": any(r["errors"] for r in runs),
+    }
+
+
+def bench_stages(corpus: Path, files: list[dict], repeat: int, save_mode: str) -> dict:
+    """Etapas de _process_file una por una, sin cachés (cada repetición analiza de verdad)."""
+    with tempfile.TemporaryDirectory(prefix="bench_stages_") as tmp:
+        cfg = _corpus_cfg(corpus, Path(tmp), None, save_mode)
+        cfg.update(result_cache=False, template_cache=False, ledger=False)
+        ctx = _build_context(cfg)
+        times = {s: [] for s in STAGES}
+        per_page = {s: [] for s in STAGES}
+        by_file = []
+        for f in files:
+            path = corpus / "input" / f["file"]
+            rule = ctx["plan"].pick(path.name)
+            rows, had_rows = ctx["manifest"].rows_for(path.name)
+            file_t = {s: [] for s in STAGES}
+            for _ in range(repeat):
+                t = {}
+                t0 = time.perf_counter()
+                data = path.read_bytes()
+                t["read"] = time.perf_counter()
+                doc = fitz.open(stream=data, filetype="pdf")
+                t["open"] = time.perf_counter()
+                result = _new_result(path)
+                placements = _analyze_for(doc, path.name, ctx, rule, rows, had_rows, result)[0]
+                t["analyze"] = time.perf_counter()
+                _stamp_placements(doc, path, placements, ctx, result["errors"])
+                t["stamp"] = time.perf_counter()
+                serialize(doc, ctx["save_mode"], len(data))
+                t["save"] = time.perf_counter()
+                doc.close()
+                prev = t0
+                for s in STAGES:
+                    ms = (t[s] - prev) * 1000
+                    prev = t[s]
+                    times[s].append(ms)
+                    per_page[s].append(ms / f["pages"])
+                    file_t[s].append(ms)
+            by_file.append({**f, "placements": len(placements), "errors": len(result["errors"]),
+                            "ms": {s: round(sorted(v)[len(v) // 2], 3) for s, v in file_t.items()}})
+    return {
+        "repeat": repeat,
+        "ms": {s: _percentiles(v) for s, v in times.items()},
+        "ms_per_page": {s: _percentiles(v) for s, v in per_page.items()},
+        "by_file": by_file,
+    }
+
+
+def _git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=10)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+
+def _compare(new: dict, old: dict):
+    """Diferencia relativa de las métricas principales entre dos corridas."""
+    def row(label, a, b, higher_is_better):
+        if not a or not b:
+            return
+        delta = (b - a) / a * 100
+        better = delta > 0 if higher_is_better else delta < 0
+        print(f"  {label:<28} {a:>12.3f} -> {b:>12.3f}  {delta:+7.1f}%  {'mejor' if better else 'peor' if delta else ''}")
+
+    print(f"Comparación {old['meta'].get('commit')} -> {new['meta'].get('commit')}")
+    if old["meta"].get("corpus_sha256") != new["meta"].get("corpus_sha256"):
+        print("  [WARN] los corpus difieren: la comparación no es directa")
+    if "batch" in old and "batch" in new:
+        row("batch files/s", old["batch"]["files_per_s"], new["batch"]["files_per_s"], True)
+        row("batch pages/s", old["batch"]["pages_per_s"], new["batch"]["pages_per_s"], True)
+        row("batch RSS pico (MB)", old["batch"]["peak_rss_mb"]["main"], new["batch"]["peak_rss_mb"]["main"], False)
+    if "stages" in old and "stages" in new:
+        for s in STAGES:
+            for p in ("p50", "p90"):
+                row(f"{s} {p} (ms)", old["stages"]["ms"][s].get(p), new["stages"]["ms"][s].get(p), False)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", help="Carpeta del corpus (se genera si no existe); por defecto una temporal")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Páginas por documento, p.ej. 1,10,100,1000")
+    ap.add_argument("--per-size", type=int, default=1)
+    ap.add_argument("--kinds", default=",".join(KINDS))
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--repeat", type=int, default=3, help="Repeticiones (lote: se toma la más rápida)")
+    ap.add_argument("--workers", type=int, default=None, help="workers de process_batch (por defecto el de config)")
+    ap.add_argument("--save-mode", default="full", help="full | incremental | compact")
+    ap.add_argument("--skip-batch", action="store_true")
+    ap.add_argument("--skip-stages", action="store_true")
+    ap.add_argument("--out", help="Archivo JSON del resultado (por defecto bench_<commit>.json)")
+    ap.add_argument("--compare", help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args()
+
+    corpus_args = {"sizes": [int(s) for s in args.sizes.split(",")], "per_size": args.per_size,
+                   "kinds": args.kinds.split(","), "seed": args.seed}
+    with contextlib.ExitStack() as stack:
+        corpus = Path(args.corpus) if args.corpus else Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="bench_corpus_")))
+        generated = not ((corpus / "input").is_dir() and (corpus / "config.yaml").exists())
+        if not generated:
+            print(f"[INFO] Reutilizando corpus {corpus}", file=sys.stderr)
+        else:
+            t0 = time.perf_counter()
+            build_corpus(corpus, corpus_args["sizes"], args.per_size, tuple(corpus_args["kinds"]), args.seed)
+            print(f"[INFO] Corpus generado en {time.perf_counter() - t0:.1f}s: {corpus}", file=sys.stderr)
+        files = []
+        digest = hashlib.sha256()  # mismo corpus (mismo seed) = mismo digest
+        for p in sorted((corpus / "input").glob("*.pdf")):
+            digest.update(p.name.encode() + p.read_bytes())
+            with fitz.open(p) as doc:
+                files.append({"file": p.name, "pages": doc.page_count, "bytes": p.stat().st_size})
+
+        report = {"meta": {
+            "commit": _git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "pymupdf": fitz.VersionBind,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "corpus": corpus_args if generated else {"dir": str(corpus)},
+            "corpus_sha256": digest.hexdigest(),
+            "files": len(files),
+            "pages": sum(f["pages"] for f in files),
+            "bytes": sum(f["bytes"] for f in files),
+            "save_mode": args.save_mode,
+            "workers": args.workers,
+        }}
+        if not args.skip_batch:
+            report["batch"] = bench_batch(corpus, files, args.repeat, args.workers, args.save_mode)
+            print(f"[INFO] Lote: {report['batch']['files_per_s']} archivos/s, "
+                  f"{report['batch']['pages_per_s']} páginas/s, RSS pico {report['batch']['peak_rss_mb']['main']} MB",
+                  file=sys.stderr)
+        if not args.skip_stages:
+            report["stages"] = bench_stages(corpus, files, args.repeat, args.save_mode)
+            for s in STAGES:
+                st = report["stages"]["ms"][s]
+                print(f"[INFO] {s:<8} p50 {st['p50']:>9.2f} ms  p90 {st['p90']:>9.2f} ms  max {st['max']:>9.2f} ms",
+                      file=sys.stderr)
+
+    # a archivo y no a stdout: PyMuPDF escribe avisos en stdout al importarse
+    out = Path(args.out or f"bench_{report['meta']['commit'] or 'local'}.json")
+    out.write_text(json.dumps(report, indent=2, ensure_ascii=False), encoding="utf-8")
+    print(f"[INFO] Resultado: {out}", file=sys.stderr)
+    if args.compare:
+        _compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: elección de regla y de filas del manifest con muchos patrones.
+
+Compara RulePlan.pick (GlobIndex: literales, prefijo*sufijo y una regex
+combinada) contra el recorrido lineal con name_matches, y
+ManifestPlan.rows_for con miles de filas exactas y con patrones, creciendo
+la cantidad de reglas. Verifica que ambos elijan la misma regla.
+
+Uso:
+    python benchmarks/bench_rule_matching.py --rules 10,100,1000,5000 --files 20000
+"""
+from __future__ import annotations
+import argparse
+import random
+import time
+
+from pdf_ocr_stamper.manifest import compile_manifest
+from pdf_ocr_stamper.rules_loader import compile_rules
+from pdf_ocr_stamper.utils_units import name_matches
+
+DEPARTMENTS = ("rrhh", "finanzas", "juridica", "academica", "bienestar", "extension", "investigacion", "posgrados")
+
+
+def _patterns(n: int, rng: random.Random) -> list[str]:
+    """Patrones por dependencia como los de rules.yaml reales: prefijos, sufijos y algunos con ? o [..]."""
+    out = []
+    for i in range(n):
+        dep = DEPARTMENTS[i % len(DEPARTMENTS)]
+        kind = rng.randrange(10)
+        if kind < 5:
+            out.append(f"{dep}_{i:05d}_*.pdf")
+        elif kind < 7:
+            out.append(f"*_{dep}{i:05d}.pdf")
+        elif kind < 8:
+            out.append(f"cto_{i:05d}_?????.pdf")
+        elif kind < 9:
+            out.append(f"{dep}_{i:05d}_[0-9]*.pdf")
+        else:
+            out.append(f"contrato_{dep}_{i:05d}.pdf")
+    out.append("*.pdf")  # la regla general va al final, como en rules.yaml
+    return out
+
+
+def _names(patterns: list[str], count: int, rng: random.Random) -> list[str]:
+    """Nombres que caen en reglas repartidas por toda la lista (y en la general)."""
+    names = []
+    for _ in range(count):
+        p = rng.choice(patterns)
+        name = (p.replace("[0-9]", str(rng.randrange(10))).replace("?", "x")
+                .replace("*", f"{rng.randrange(10**6):06d}"))
+        names.append(name.upper() if rng.random() < 0.2 else name)
+    return names
+
+
+def _linear(rules, name: str):
+    for r in rules:
+        if name_matches(r.match, name):
+            return r
+    return None
+
+
+def _time(func, names: list[str]) -> tuple[float, list]:
+    t0 = time.perf_counter()
+    found = [func(n) for n in names]
+    return time.perf_counter() - t0, found
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rules", default="10,100,1000,5000", help="Cantidades de reglas a probar")
+    ap.add_argument("--files", type=int, default=20000, help="Búsquedas por medición")
+    ap.add_argument("--manifest-rows", type=int, default=50000, help="Filas exactas del manifest")
+    ap.add_argument("--seed", type=int, default=1234)
+    args = ap.parse_args()
+
+    print(f"búsquedas por medición: {args.files}")
+    print(f"{'reglas':>8}{'lineal µs':>12}{'índice µs':>12}{'manifest µs':>14}{'compilar ms':>13}")
+    for n in (int(s) for s in args.rules.split(",")):
+        rng = random.Random(args.seed)
+        patterns = _patterns(n, rng)
+        names = _names(patterns, args.files, rng)
+
+        t0 = time.perf_counter()
+        plan = compile_rules({"rules": [{"match": p} for p in patterns]})
+        compile_ms = (time.perf_counter() - t0) * 1000
+        t_index, found = _time(plan.pick, names)
+        # el recorrido lineal es O(reglas): se mide sobre una muestra para no esperar minutos
+        sample = names[:max(1, min(len(names), 200000 // max(n, 1)))]
+        t_linear, expected = _time(lambda name: _linear(plan.rules, name), sample)
+        if found[:len(sample)] != expected:
+            print(f"  ! {n} reglas: el índice eligió otra regla que el recorrido lineal")
+
+        # manifest: filas exactas + los mismos patrones (cada uno con su fila)
+        per_file = {f"contrato_{i:06d}.pdf": [{"page": "1"}] for i in range(args.manifest_rows)}
+        per_file.update({p: [{"page": "2"}] for p in patterns if p != "*.pdf"})
+        manifest = compile_manifest(per_file, {})
+        t_manifest, _ = _time(manifest.rows_for, names)
+
+        print(f"{n:>8}{t_linear * 1e6 / len(sample):>12.2f}{t_index * 1e6 / len(names):>12.2f}"
+              f"{t_manifest * 1e6 / len(names):>14.2f}{compile_ms:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+Benchmark: firma embebida por página vs. una sola vez por documento.
+
+Compara el estampado con insert_image(stream=...) en cada página contra
+la reutilización del xref (signature.insert_signature) y, con --dpi, las
+variantes de SignatureAssets (png / palette / jpeg reducidas a esa
+resolución); reporta tiempo de estampado y tamaño del PDF resultante
+(guardado "full", como el lote por defecto).
+
+Uso:
+    python benchmarks/bench_signature_embed.py --pages 200 --signature config/firma.png
+    python benchmarks/bench_signature_embed.py --upscale 8 --dpi 200
+"""
+from __future__ import annotations
+import argparse
+import io
+import time
+from pathlib import Path
+
+import fitz
+from PIL import Image
+
+from pdf_ocr_stamper.signature import SignatureAssets, SignatureSettings, insert_signature
+
+
+def _signature_bytes(path: str | None, upscale: float) -> bytes:
+    if path and Path(path).exists():
+        img = Image.open(path).convert("RGBA")
+    else:
+        img = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+        for x in range(20, 380):
+            img.putpixel((x, 150), (0, 0, 120, 255))
+    if upscale != 1:
+        img = img.resize((int(img.width * upscale), int(img.height * upscale)))
+    buf = io.BytesIO()
+    img.save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _make_doc(pages: int) -> fitz.Document:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Contrato de prueba - página {i + 1}")
+    return doc
+
+
+RECT = fitz.Rect(310, 650, 410, 705)
+
+
+def _run(img_bytes: bytes, pages: int, reuse: bool) -> tuple[float, int]:
+    doc = _make_doc(pages)
+    t0 = time.perf_counter()
+    xref = 0
+    for page in doc:
+        xref = insert_signature(page, RECT, img_bytes, 0, xref if reuse else 0)
+    elapsed = time.perf_counter() - t0
+    size = len(doc.tobytes())
+    doc.close()
+    return elapsed, size
+
+
+def _run_assets(assets: SignatureAssets, pages: int) -> tuple[float, int]:
+    """Como el lote: variante por tamaño colocado y un xref por documento."""
+    doc = _make_doc(pages)
+    t0 = time.perf_counter()
+    xrefs: dict[str, int] = {}
+    for page in doc:
+        assets.insert(page, RECT, assets.variant(RECT.width, RECT.height), 0, xrefs)
+    elapsed = time.perf_counter() - t0
+    size = len(doc.tobytes())
+    doc.close()
+    return elapsed, size
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pages", type=int, default=200)
+    ap.add_argument("--signature", default="config/firma.png")
+    ap.add_argument("--upscale", type=float, default=1.0, help="Escala la firma para simular imágenes grandes")
+    ap.add_argument("--dpi", type=float, default=200, help="signature.target_dpi de las variantes (0 = omitirlas)")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    img_bytes = _signature_bytes(args.signature, args.upscale)
+    print(f"firma: {len(img_bytes)} bytes, páginas: {args.pages}")
+    print(f"{'modo':<16}{'ms total':>12}{'ms/página':>12}{'bytes salida':>16}")
+    for label, reuse in (("stream/página", False), ("xref reutilizado", True)):
+        best_t, size = min(_run(img_bytes, args.pages, reuse) for _ in range(args.repeat))
+        print(f"{label:<16}{best_t * 1000:>12.1f}{best_t * 1000 / args.pages:>12.3f}{size:>16}")
+    if not args.dpi:
+        return
+    png, w, h = img_bytes, *Image.open(io.BytesIO(img_bytes)).size
+    for fmt in ("png", "palette", "jpeg"):
+        # una instancia por formato, sin caché en disco; la variante se genera en la primera repetición
+        assets = SignatureAssets(png, w, h, SignatureSettings(target_dpi=args.dpi, format=fmt))
+        variant = assets.variant(RECT.width, RECT.height)
+        best_t, size = min(_run_assets(assets, args.pages) for _ in range(args.repeat))
+        label = f"{fmt} {variant.width}x{variant.height}"
+        print(f"{label:<16}{best_t * 1000:>12.1f}{best_t * 1000 / args.pages:>12.3f}{size:>16}")
+
+
+if __name__ == "__main__":
+    main()
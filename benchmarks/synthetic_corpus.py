@@ -0,0 +1,198 @@
+"""
+Corpus sintético y reproducible de contratos para benchmarks.
+
+Tipos de documento (mismo seed = mismos PDFs):
+  anchor   capa de texto; la última página trae "VICERRECTOR ACADÉMICO"
+  lines    tablas con muchos bordes + línea de firma vectorial, sin anchor
+  scanned  páginas solo imagen (escaneo simulado) con la línea de firma dibujada
+
+Genera además rules.yaml, config.yaml y firma.png para correr el lote:
+    python benchmarks/synthetic_corpus.py --out bench_corpus --sizes 1,10,100
+    cd bench_corpus && pdf-ocr-stamper -c config.yaml -y
+"""
+from __future__ import annotations
+import argparse
+import random
+from pathlib import Path
+
+import fitz
+
+KINDS = ("anchor", "lines", "scanned")
+DEFAULT_SIZES = (1, 10, 100)
+SCAN_DPI = 100
+
+WORDS = ("contrato prestación servicios cláusula obligaciones partes universidad docente "
+         "honorarios plazo vigencia terminación anticipada confidencialidad domicilio "
+         "pago mensual certificación cumplimiento objeto alcance supervisión").split()
+
+RULES_YAML = """\
+defaults:
+  position: bottom_right
+  margin_x: "3%"
+  margin_y: "5%"
+  scale: 0.5
+  keep_aspect: true
+  search_last_pages: 3
+rules:
+  - match: "anchor_*.pdf"
+    anchors:
+      - regex: "VICERRECTOR\\\\s+ACAD[ÉE]MICO"
+        dx: 0
+        dy: -80
+        align: "below_center"
+  - match: "*.pdf"
+    line_detection:
+      enabled: true
+      min_width: "30%"
+      dy_above_line: 10
+      raster: auto
+"""
+
+CONFIG_YAML = """\
+input_dir: "input"
+output_dir: "output"
+signature:
+  path: "firma.png"
+rules_yaml: rules.yaml
+x: 420
+y: 120
+rotation: 0
+keep_aspect: true
+"""
+
+
+def _paragraph(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def _text_page(doc: fitz.Document, rng: random.Random, title: str):
+    page = doc.new_page()
+    page.insert_text((72, 60), title, fontsize=12)
+    y = 90
+    while y < page.rect.height - 200:
+        page.insert_textbox(fitz.Rect(72, y, page.rect.width - 72, y + 60), _paragraph(rng, 40), fontsize=9)
+        y += 66
+    return page
+
+
+def _signature_block(page: fitz.Page, with_anchor: bool):
+    y = page.rect.height - 150
+    page.draw_line((72, y), (300, y), width=0.8)
+    page.insert_text((72, y + 14), "Firma del contratista", fontsize=9)
+    if with_anchor:
+        page.insert_text((330, y + 14), "VICERRECTOR ACADÉMICO", fontsize=9)
+
+
+def _table(page: fitz.Page, top: float, rows: int, cols: int):
+    x0, x1 = 50.0, page.rect.width - 50.0
+    row_h, col_w = 12.0, (x1 - x0) / cols
+    shape = page.new_shape()
+    for r in range(rows):
+        for c in range(cols):
+            shape.draw_rect(fitz.Rect(x0 + c * col_w, top + r * row_h, x0 + (c + 1) * col_w, top + (r + 1) * row_h))
+            shape.finish(width=0.5, color=(0, 0, 0))
+    shape.commit()
+
+
+def make_anchor_doc(pages: int, rng: random.Random) -> fitz.Document:
+    doc = fitz.open()
+    for i in range(pages):
+        page = _text_page(doc, rng, f"CONTRATO DE PRESTACIÓN DE SERVICIOS - página {i + 1}")
+    _signature_block(page, with_anchor=True)
+    return doc
+
+
+def make_lines_doc(pages: int, rng: random.Random) -> fitz.Document:
+    doc = fitz.open()
+    for i in range(pages):
+        page = doc.new_page()
+        page.insert_text((72, 60), f"ANEXO DE TARIFAS - página {i + 1}", fontsize=12)
+        _table(page, 80, rows=rng.randint(25, 40), cols=rng.randint(5, 9))
+    _signature_block(page, with_anchor=False)
+    return doc
+
+
+def _scan_images(rng: random.Random, variants: int = 3) -> list[bytes]:
+    """Páginas renderizadas a imagen (sin capa de texto); se reutilizan entre documentos."""
+    images = []
+    for v in range(variants):
+        src = fitz.open()
+        page = _text_page(src, rng, f"CONTRATO ESCANEADO - variante {v + 1}")
+        _signature_block(page, with_anchor=False)
+        pix = page.get_pixmap(dpi=SCAN_DPI, colorspace=fitz.csGRAY)
+        images.append(pix.tobytes("jpeg", jpg_quality=70))
+        src.close()
+    return images
+
+
+def make_scanned_doc(pages: int, rng: random.Random, images: list[bytes]) -> fitz.Document:
+    doc = fitz.open()
+    xrefs: dict[int, int] = {}
+    for _ in range(pages):
+        page = doc.new_page()
+        k = rng.randrange(len(images))
+        xrefs[k] = page.insert_image(page.rect, stream=images[k], xref=xrefs.get(k, 0))
+    return doc
+
+
+def build_corpus(out_dir: str | Path, sizes=DEFAULT_SIZES, per_size: int = 1, kinds=KINDS,
+                 seed: int = 1234, signature: str | None = None) -> list[dict]:
+    """
+    Escribe out_dir/input/*.pdf + rules.yaml + config.yaml + firma.png.
+    Retorna [{"file", "kind", "pages", "bytes"}, ...].
+    """
+    out = Path(out_dir)
+    input_dir = out / "input"
+    input_dir.mkdir(parents=True, exist_ok=True)
+    images = _scan_images(random.Random(seed)) if "scanned" in kinds else []
+    manifest = []
+    for kind in kinds:
+        for size in sizes:
+            for n in range(per_size):
+                name = f"{kind}_{size:04d}p_{n + 1:02d}.pdf"
+                rng = random.Random(f"{seed}:{name}")  # cada PDF depende solo del seed y su nombre
+                if kind == "anchor":
+                    doc = make_anchor_doc(size, rng)
+                elif kind == "lines":
+                    doc = make_lines_doc(size, rng)
+                else:
+                    doc = make_scanned_doc(size, rng, images)
+                path = input_dir / name
+                doc.set_metadata({})  # sin fechas: mismos bytes con el mismo seed
+                doc.save(path, garbage=1, deflate=True, no_new_id=True)
+                doc.close()
+                manifest.append({"file": name, "kind": kind, "pages": size, "bytes": path.stat().st_size})
+
+    (out / "rules.yaml").write_text(RULES_YAML, encoding="utf-8")
+    (out / "config.yaml").write_text(CONFIG_YAML, encoding="utf-8")
+    sig_path = out / "firma.png"
+    if signature and Path(signature).exists():
+        sig_path.write_bytes(Path(signature).read_bytes())
+    else:
+        sig = fitz.Pixmap(fitz.csRGB, fitz.IRect(0, 0, 400, 200), 1)
+        sig.clear_with(0)
+        for x in range(20, 380):
+            sig.set_pixel(x, 150, (0, 0, 120, 255))
+        sig.save(sig_path)
+    return manifest
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--out", default="bench_corpus")
+    ap.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="Páginas por documento, p.ej. 1,10,100,1000")
+    ap.add_argument("--per-size", type=int, default=1, help="Documentos por tipo y tamaño")
+    ap.add_argument("--kinds", default=",".join(KINDS))
+    ap.add_argument("--seed", type=int, default=1234)
+    ap.add_argument("--signature", help="Imagen de firma (por defecto una sintética)")
+    args = ap.parse_args()
+
+    files = build_corpus(args.out, [int(s) for s in args.sizes.split(",")], args.per_size,
+                         tuple(args.kinds.split(",")), args.seed, args.signature)
+    total_pages = sum(f["pages"] for f in files)
+    total_bytes = sum(f["bytes"] for f in files)
+    print(f"{len(files)} PDF(s), {total_pages} páginas, {total_bytes / 1e6:.1f} MB en {Path(args.out) / 'input'}")
+
+
+if __name__ == "__main__":
+    main()
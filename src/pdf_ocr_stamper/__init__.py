@@ -1 +1,7 @@
-__all__ = []
+from .api import stamp_pdf
+from .rules_loader import load_rule_plan
+from .signature import load_signature
+from .types import MatchSource, SignatureImage, StampOutcome, StampResult
+
+__all__ = ["stamp_pdf", "load_rule_plan", "load_signature",
+           "MatchSource", "SignatureImage", "StampOutcome", "StampResult"]
@@ -1,64 +1,152 @@
 from __future__ import annotations
 import re
-from typing import Optional, Tuple, List
+from typing import TYPE_CHECKING, Callable, Iterable, Optional, Sequence, Tuple
 import fitz
-from .utils_units import parse_length
+from .utils_units import Length, parse_length
+
+if TYPE_CHECKING:
+    from .rules_loader import AnchorSpec
 
 BBox = Tuple[float, float, float, float]  # x0,y0,x1,y1
 
-def find_anchor_bbox(page: fitz.Page, regex_list: list[dict]):
+class PageText:
+    """
+    Texto de una página extraído UNA vez con page.get_text("words") (la forma
+    más liviana que trae bbox). Las líneas se arman agrupando palabras por
+    (bloque, línea), así la búsqueda por líneas y por palabras comparten datos.
+    """
+    __slots__ = ("words", "_lines")
+
+    def __init__(self, words: list):
+        self.words = words  # [(x0, y0, x1, y1, text, block_no, line_no, word_no), ...]
+        self._lines = None
+
+    @property
+    def lines(self) -> list[tuple[str, BBox]]:
+        if self._lines is None:
+            grouped: dict[tuple[int, int], list] = {}
+            for w in self.words:
+                grouped.setdefault((w[5], w[6]), []).append(w)
+            lines = []
+            for ws in grouped.values():
+                text = " ".join(w[4] for w in ws)
+                bbox = (min(w[0] for w in ws), min(w[1] for w in ws),
+                        max(w[2] for w in ws), max(w[3] for w in ws))
+                lines.append((text, bbox))
+            self._lines = lines
+        return self._lines
+
+    def iter_words(self):
+        for x0, y0, x1, y1, text, *_ in self.words:
+            yield text, (float(x0), float(y0), float(x1), float(y1))
+
+def extract_page_text(page: fitz.Page, clip=None) -> PageText:
+    return PageText(page.get_text("words", clip=clip))
+
+
+_BACKREF = re.compile(r"\\[1-9]|\(\?P=")
+
+class AnchorMatcher:
+    """
+    Busca todos los anchors de una regla en una sola pasada con una
+    alternación combinada. Conserva la prioridad: gana el primer anchor de la
+    lista que aparezca en la página (y su primera línea), igual que recorrer
+    anchor por anchor.
+    """
+    __slots__ = ("anchors", "combined", "group_to_idx")
+
+    def __init__(self, anchors: Sequence[AnchorSpec]):
+        self.anchors = tuple(anchors)
+        self.combined = None
+        self.group_to_idx: dict[int, int] = {}
+        if len(self.anchors) > 1 and not any(_BACKREF.search(a.regex) for a in self.anchors):
+            try:
+                rx = re.compile("|".join(f"(?P<_a{i}>{a.regex})" for i, a in enumerate(self.anchors)), flags=re.I)
+            except re.error:
+                rx = None  # p.ej. flags inline; se usa la búsqueda anchor por anchor
+            if rx is not None:
+                self.combined = rx
+                self.group_to_idx = {rx.groupindex[f"_a{i}"]: i for i in range(len(self.anchors))}
+
+    def search(self, items: Iterable[tuple[str, BBox]]) -> Optional[tuple[BBox, AnchorSpec]]:
+        """items: (texto, bbox) en orden de lectura."""
+        anchors = self.anchors
+        if not anchors:
+            return None
+        if self.combined is None:
+            items = list(items)
+            for anchor in anchors:
+                rx = anchor.rx
+                for text, bbox in items:
+                    if rx.search(text or ""):
+                        return bbox, anchor
+            return None
+
+        best_idx, best_bbox = len(anchors), None
+        for text, bbox in items:
+            m = self.combined.search(text or "")
+            if not m:
+                continue
+            idx = self.group_to_idx[m.lastindex]
+            # un anchor de mayor prioridad podría aparecer más a la derecha en la misma línea
+            for j in range(min(idx, best_idx)):
+                if anchors[j].rx.search(text):
+                    idx = j
+                    break
+            if idx < best_idx:
+                best_idx, best_bbox = idx, bbox
+                if best_idx == 0:
+                    break
+        if best_bbox is None:
+            return None
+        return best_bbox, anchors[best_idx]
+
+def find_anchor_bbox(page: fitz.Page, matcher: AnchorMatcher, text: PageText | None = None):
     """
     Busca en este orden:
-      1) Por LÍNEAS (texto continuo) usando page.get_text("dict")
+      1) Por LÍNEAS (texto continuo)
       2) Por PALABRAS sueltas (fallback)
-    Devuelve (bbox, regla_anchor) o None.
+    Ambas pasadas usan la misma extracción de texto (text, o se extrae una vez).
+    Devuelve (bbox, AnchorSpec) o None.
     """
-    import re
+    if text is None:
+        text = extract_page_text(page)
+    if not text.words:
+        return None
 
     # 1) Buscar por líneas (mejor para frases como "FIRMA DEL REPRESENTANTE LEGAL")
-    try:
-        d = page.get_text("dict")
-        for rule in regex_list or []:
-            pattern = rule.get("regex")
-            if not pattern:
-                continue
-            rx = re.compile(pattern, flags=re.I)
-
-            for block in d.get("blocks", []):
-                for line in block.get("lines", []):
-                    # texto completo de la línea
-                    line_text = "".join(span.get("text", "") for span in line.get("spans", []))
-                    if rx.search(line_text or ""):
-                        # bbox = unión de spans de la línea
-                        x0s, y0s, x1s, y1s = [], [], [], []
-                        for span in line.get("spans", []):
-                            b = span.get("bbox", None)
-                            if not b: 
-                                continue
-                            x0s.append(b[0]); y0s.append(b[1]); x1s.append(b[2]); y1s.append(b[3])
-                        if x0s:
-                            bbox = (min(x0s), min(y0s), max(x1s), max(y1s))
-                            return bbox, rule
-    except Exception:
-        pass  # si algo falla, seguimos con búsqueda por palabras
+    found = matcher.search(text.lines)
+    if found:
+        return found
 
     # 2) Fallback: por PALABRAS sueltas (sirve para anclas de una sola palabra, p.ej. "AUTORIZO")
-    words = page.get_text("words")  # [x0,y0,x1,y1, text, ...]
-    if not words:
-        return None
+    return matcher.search(text.iter_words())
 
-    for rule in regex_list or []:
-        pattern = rule.get("regex")
-        if not pattern:
-            continue
-        rx = re.compile(pattern, flags=re.I)
-        for x0, y0, x1, y1, text, *_ in words:
-            if rx.search(text or ""):
-                return (float(x0), float(y0), float(x1), float(y1)), rule
 
+def find_anchor_in_regions(page: fitz.Page, matcher: AnchorMatcher, clips: Sequence,
+                           get_text: Callable[[object], PageText]):
+    """
+    Busca primero en las zonas clips (de menor a mayor) y, si no aparece,
+    en la página completa (clip=None). get_text(clip) entrega el texto de cada zona.
+    Se respeta la prioridad de los anchors: si en una zona aparece uno que no es
+    el primero de la lista, se revisa la página completa por si uno de mayor
+    prioridad está fuera de la zona (en ese caso gana ese, como sin zonas).
+    """
+    tried = set()
+    for clip in (*clips, None):
+        if clip in tried:
+            continue
+        tried.add(clip)
+        found = find_anchor_bbox(page, matcher, get_text(clip))
+        if not found:
+            continue
+        if clip is not None and found[1] is not matcher.anchors[0]:
+            full = find_anchor_bbox(page, matcher, get_text(None))
+            if full and matcher.anchors.index(full[1]) < matcher.anchors.index(found[1]):
+                return full
+        return found
     return None
 
-
 def compute_pos_from_anchor(anchor_bbox: BBox, align: str, dx: float, dy: float, sig_w: float, sig_h: float) -> tuple[float, float]:
     x0, y0, x1, y1 = anchor_bbox
     anchor_cx = (x0 + x1) / 2
@@ -80,36 +168,165 @@ def compute_pos_from_anchor(anchor_bbox: BBox, align: str, dx: float, dy: float,
 
     return x + float(dx or 0), y + float(dy or 0)
 
-def find_signature_line(page: fitz.Page, min_width: str | float | None, dy_above_line: float | None) -> Optional[tuple[float, float]]:
+# Grosor máximo (pt) para considerar un path como línea (trazo o rectángulo relleno fino)
+LINE_MAX_THICKNESS = 3.0
+# Holgura (pt) para decidir que el extremo de una línea toca un borde vertical (tabla/celda)
+EDGE_TOL = 2.0
+LINE_METHODS = ("cdrawings", "bboxlog", "drawings")
+_PATH_KINDS = ("fill-path", "stroke-path")
+
+def _horizontal_segments(items, max_thickness: float):
     """
-    Busca una línea horizontal larga y retorna (x, y_sup_izq) donde colocar
-    la firma (y desplazada hacia arriba por dy_above_line).
+    Segmentos horizontales (x0, x1, y) de los items de un path. Sirve para
+    get_drawings() y get_cdrawings(): líneas "l" casi horizontales y
+    rectángulos/quads finos ("re"/"qu", líneas dibujadas como relleno).
     """
-    drawings = page.get_drawings()
-    W, H = page.mediabox_size
-    min_w_pts = parse_length(min_width, ref=W) if min_width else None
-    best = None  # (y, x0, x1)
+    for it in items:
+        op = it[0]
+        if op == "l":
+            (x0, y0), (x1, y1) = it[1], it[2]
+            if abs(y1 - y0) < 1.0:  # casi horizontal
+                yield min(x0, x1), max(x0, x1), (y0 + y1) / 2.0
+        elif op in ("re", "qu"):
+            if op == "re":
+                x0, y0, x1, y1 = it[1]
+                xs, ys = (x0, x1), (y0, y1)
+            else:
+                pts = tuple(it[1])
+                xs, ys = [p[0] for p in pts], [p[1] for p in pts]
+            if max(ys) - min(ys) <= max_thickness:
+                yield min(xs), max(xs), (min(ys) + max(ys)) / 2.0
+
+def _vertical_edges(paths, max_thickness: float) -> list[tuple[float, float, float, float]]:
+    """
+    Bordes verticales (x0, x1, y0, y1) de los paths: paths o rectángulos finos
+    y altos, líneas "l" casi verticales y los lados de los rectángulos
+    ("re"/"qu" no finos, p.ej. celdas de una tabla).
+    """
+    edges = []
+    for path in paths:
+        rx0, ry0, rx1, ry1 = path["rect"]
+        if rx1 - rx0 <= max_thickness < ry1 - ry0:
+            edges.append((rx0, rx1, ry0, ry1))  # p.ej. borde de tabla dibujado como polígono relleno
+            continue
+        for it in path["items"]:
+            op = it[0]
+            if op == "l":
+                (x0, y0), (x1, y1) = it[1], it[2]
+                if abs(x1 - x0) < 1.0 and abs(y1 - y0) > max_thickness:
+                    edges.append((min(x0, x1), max(x0, x1), min(y0, y1), max(y0, y1)))
+            elif op in ("re", "qu"):
+                if op == "re":
+                    x0, y0, x1, y1 = it[1]
+                    xs, ys = (x0, x1), (y0, y1)
+                else:
+                    pts = tuple(it[1])
+                    xs, ys = [p[0] for p in pts], [p[1] for p in pts]
+                x0, x1, y0, y1 = min(xs), max(xs), min(ys), max(ys)
+                if y1 - y0 <= max_thickness:
+                    continue
+                if x1 - x0 <= max_thickness:
+                    edges.append((x0, x1, y0, y1))
+                else:
+                    edges.append((x0, x0, y0, y1))
+                    edges.append((x1, x1, y0, y1))
+    return edges
+
+def _is_table_edge(x0: float, x1: float, y: float, edges) -> bool:
+    """Una línea cuyo extremo toca un borde vertical a su altura es borde de tabla/celda, no de firma."""
+    for ex0, ex1, ey0, ey1 in edges:
+        if ey0 - EDGE_TOL <= y <= ey1 + EDGE_TOL and (
+                ex0 - EDGE_TOL <= x0 <= ex1 + EDGE_TOL or ex0 - EDGE_TOL <= x1 <= ex1 + EDGE_TOL):
+            return True
+    return False
+
+def _in_area(x0: float, x1: float, y: float, area) -> bool:
+    return area is None or (area[1] <= y <= area[3] and x1 >= area[0] and x0 <= area[2])
+
+def _lowest_in_paths(paths, area, min_w: float, max_thickness: float, best=None):
+    """
+    Recorre paths de abajo hacia arriba (por rect.y1) y corta apenas ninguno
+    puede tener una línea más baja que best = (y, x0, x1). Se descartan los
+    bordes de tablas y celdas (extremos que tocan un borde vertical).
+    """
+    edges = _vertical_edges(paths, max_thickness)
+    for path in sorted(paths, key=lambda d: d["rect"][3], reverse=True):
+        rx0, ry0, rx1, ry1 = path["rect"]
+        if best is not None and ry1 <= best[0]:
+            break
+        if rx1 - rx0 < min_w:
+            continue
+        if area is not None and (ry1 < area[1] or ry0 > area[3] or rx1 < area[0] or rx0 > area[2]):
+            continue
+        if ry1 - ry0 <= max_thickness:
+            # path fino completo (p.ej. Word dibuja las líneas como polígonos rellenos): es una línea
+            segments = ((rx0, rx1, (ry0 + ry1) / 2.0),)
+        else:
+            segments = _horizontal_segments(path["items"], max_thickness)
+        for x0, x1, y in segments:
+            if (x1 - x0 >= min_w and _in_area(x0, x1, y, area) and (best is None or y > best[0])
+                    and not _is_table_edge(x0, x1, y, edges)):
+                best = (y, x0, x1)
+    return best
 
-    for d in drawings:
-        t = d.get("type")
-        pts = None
-        if t == "line":
-            (op, p0), (_, p1) = d["items"]
-            pts = (p0, p1)
-        elif t == "polyline" and len(d["items"]) == 2:
-            (op, p0), (_, p1) = d["items"]
-            pts = (p0, p1)
-
-        if not pts:
+def _lowest_line_bboxlog(page: fitz.Page, area, min_w: float, max_thickness: float):
+    """
+    page.get_bboxlog() da solo (tipo, bbox) por operación, sin armar items:
+    un path fino y ancho ya es una línea. Los paths gruesos que podrían
+    contener una línea más baja (p.ej. una tabla en un solo path) se
+    revisan con get_cdrawings(), solo si hace falta. Como bordes verticales
+    se usan los bboxes finos y altos y los lados de los bboxes gruesos.
+    """
+    best = None  # (y, x0, x1)
+    pending = False
+    boxes = [(kind, bbox) for kind, bbox in page.get_bboxlog() if kind in _PATH_KINDS]
+    edges = []
+    for _, (x0, y0, x1, y1) in boxes:
+        if x1 - x0 <= max_thickness < y1 - y0:
+            edges.append((x0, x1, y0, y1))
+        elif x1 - x0 > max_thickness and y1 - y0 > max_thickness:
+            edges += ((x0, x0, y0, y1), (x1, x1, y0, y1))
+    for kind, (x0, y0, x1, y1) in sorted(boxes, key=lambda b: b[1][3], reverse=True):
+        if best is not None and y1 <= best[0]:
+            break  # todo lo que sigue está más arriba
+        if area is not None and (y1 < area[1] or y0 > area[3] or x1 < area[0] or x0 > area[2]):
             continue
+        if y1 - y0 <= max_thickness:
+            if kind == "stroke-path":
+                # el bbox de un trazo incluye medio grosor a cada lado
+                pad = (y1 - y0) / 2.0
+                x0, x1 = x0 + pad, x1 - pad
+            if x1 - x0 < min_w:
+                continue
+            y = (y0 + y1) / 2.0
+            if _in_area(x0, x1, y, area) and (best is None or y > best[0]) and not _is_table_edge(x0, x1, y, edges):
+                best = (y, x0, x1)
+        elif x1 - x0 >= min_w:
+            pending = True
+    if pending:
+        best = _lowest_in_paths(page.get_cdrawings(), area, min_w, max_thickness, best)
+    return best
+
+def find_signature_line(page: fitz.Page, min_width: Length | str | float | None, dy_above_line: float | None,
+                        clip=None, max_thickness: float = LINE_MAX_THICKNESS,
+                        method: str = "cdrawings") -> Optional[tuple[float, float]]:
+    """
+    Busca la línea horizontal larga más baja (dentro de clip, si se indica) y
+    retorna (x, y_sup_izq) donde colocar la firma (y desplazada hacia arriba
+    por dy_above_line). Los bordes de tablas y celdas no cuentan como línea.
+    method: "cdrawings" (paths sin objetos Python por punto), "bboxlog" (solo
+    bboxes; más liviano si las líneas son paths simples) o "drawings"
+    (page.get_drawings() completo, el más lento).
+    """
+    W, H = page.mediabox_size
+    min_w_pts = parse_length(min_width, ref=W) if min_width else 0.0
+    area = tuple(clip) if clip is not None else None
 
-        (x0, y0), (x1, y1) = pts
-        if abs(y1 - y0) < 1.0:  # casi horizontal
-            width = abs(x1 - x0)
-            if min_w_pts is None or width >= min_w_pts:
-                y = (y0 + y1) / 2.0
-                if (best is None) or (y > best[0]):  # la más baja
-                    best = (y, min(x0, x1), max(x0, x1))
+    if method == "bboxlog":
+        best = _lowest_line_bboxlog(page, area, min_w_pts, max_thickness)
+    else:
+        paths = page.get_drawings() if method == "drawings" else page.get_cdrawings()
+        best = _lowest_in_paths(paths, area, min_w_pts, max_thickness)
 
     if best:
         y, x0, x1 = best
@@ -0,0 +1,50 @@
+# src/pdf_ocr_stamper/api.py
+# API de biblioteca: PDF en memoria -> PDF estampado en memoria, sin carpetas
+# ni archivos temporales. process_batch y el servicio HTTP usan el mismo núcleo.
+#
+#   from pdf_ocr_stamper import load_rule_plan, load_signature, stamp_pdf
+#   rules = load_rule_plan("rules.yaml")
+#   firma = load_signature("config/firma.png")
+#   res = stamp_pdf(pdf_bytes, rules, firma, filename="contrato.pdf")
+#   res.pdf, res.outcome.match_source, res.placements
+from __future__ import annotations
+from pathlib import Path
+
+from .pipeline import _memory_context, _new_result, _resolve_request, _stamp_document
+from .rules_loader import RulePlan
+from .types import MatchSource, SignatureImage, StampOutcome, StampResult
+
+def stamp_pdf(data: bytes | bytearray | memoryview, rules: RulePlan, signature: SignatureImage, *,
+              filename: str = "documento.pdf", rule_name: str | None = None,
+              rows: list[dict] | None = None, cfg: dict | None = None,
+              dry_run: bool = False, save_mode: str = "full") -> StampResult:
+    """
+    Estampa un PDF en memoria con las mismas reglas y estrategias que el lote.
+
+    - filename elige la regla (match de rules.yaml) si no se pasa rule_name.
+    - rows: filas tipo manifest.csv (page, x, y, width, height, scale, rotation,
+      keep_aspect, stamp_page_range); sin filas se usan los defaults de cfg
+      (las mismas claves de config.yaml: x, y, scale, page, ocr...).
+    - dry_run: no estampa; result.previews = {página: JPEG}.
+    - save_mode: "full", "incremental" (original + actualización) o "compact".
+
+    Los errores por página quedan en result.errors (como error_log.csv);
+    lanza ValueError si rule_name no existe o una fila no es válida.
+    """
+    ctx = _memory_context(rules, signature, cfg, dry_run=dry_run, save_mode=save_mode)
+    rule, compiled, had_manifest_rows = _resolve_request(ctx, filename, rule_name, rows)
+    pdf_path = Path(filename)
+    result = _new_result(pdf_path)
+    previews: dict = {}
+    _stamp_document(data, pdf_path, ctx, rule, compiled, had_manifest_rows, result, previews=previews)
+
+    outcome = None
+    if "match_source" in result:
+        outcome = StampOutcome(
+            match_source=MatchSource(result["match_source"]),
+            rule_name=result["rule_name"] or None,
+            reason=result["reason"] or None,
+            pages_affected=result["pages_affected"],
+        )
+    return StampResult(pdf=result["pdf"], outcome=outcome, placements=result["placements"],
+                       errors=result["errors"], previews=previews)
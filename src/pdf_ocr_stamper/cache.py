@@ -0,0 +1,124 @@
+# src/pdf_ocr_stamper/cache.py
+# Caché de resultados por contenido: si el PDF de entrada, su regla, sus filas
+# del manifest, la firma y la configuración no cambiaron, se reutiliza la salida.
+# En el mismo archivo SQLite se guardan las plantillas conocidas (templates.py).
+from __future__ import annotations
+from pathlib import Path
+import hashlib
+import json
+import sqlite3
+
+CACHE_FILENAME = ".stamper_cache.sqlite"
+
+# Claves de config que no afectan el resultado de un archivo
+_VOLATILE_CFG_KEYS = {"workers", "force", "outlog", "dry_run", "error_log",
+                      "resume", "retries", "retry_backoff", "job_timeout", "job_memory_mb",
+                      "watch_debounce", "watch_poll_interval", "service", "log_timings", "profile_dir",
+                      "metrics", "discovery"}
+
+def file_sha256(path: Path, chunk: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def stable_hash(obj) -> str:
+    data = json.dumps(obj, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+def config_hash(cfg: dict) -> str:
+    return stable_hash({k: v for k, v in cfg.items() if k not in _VOLATILE_CFG_KEYS})
+
+class _SqliteStore:
+    """Conexión perezosa al SQLite de la carpeta de salida; cada subclase crea su tabla."""
+
+    _SCHEMA = ""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            # WAL: los lectores (workers) no bloquean al que escribe; NORMAL: sin fsync por commit
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(self._SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+class ResultCache(_SqliteStore):
+    """
+    SQLite en la carpeta de salida. Los workers solo leen; el proceso
+    principal escribe cuando un archivo termina sin errores.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS results ("
+        " cache_key TEXT PRIMARY KEY,"
+        " filename TEXT NOT NULL,"
+        " output_path TEXT NOT NULL,"
+        " payload TEXT NOT NULL,"
+        " updated_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+    def get(self, key: str) -> dict | None:
+        row = self._db().execute(
+            "SELECT output_path, payload FROM results WHERE cache_key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None
+        entry = json.loads(row[1])
+        entry["output_path"] = row[0]
+        return entry
+
+    def put(self, key: str, filename: str, output_path: str, placements: list, report: dict | None,
+            match_source: str = "") -> None:
+        payload = json.dumps({"placements": placements, "report": report, "match_source": match_source},
+                             ensure_ascii=False, default=str)
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO results (cache_key, filename, output_path, payload) VALUES (?, ?, ?, ?)",
+                (key, filename, str(output_path), payload),
+            )
+
+class TemplateCache(_SqliteStore):
+    """
+    Huella de diseño (plantilla) -> resultado de la búsqueda por página
+    (anchor o línea hallados). Misma política que ResultCache: los workers
+    leen, el proceso principal escribe.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS templates ("
+        " fingerprint TEXT PRIMARY KEY,"
+        " source_file TEXT NOT NULL,"
+        " pages TEXT NOT NULL,"
+        " updated_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+    def get(self, fingerprint: str) -> dict | None:
+        row = self._db().execute(
+            "SELECT pages FROM templates WHERE fingerprint = ?", (fingerprint,)
+        ).fetchone()
+        if not row:
+            return None
+        # las claves JSON son texto -> número de página
+        return {int(p1): hit for p1, hit in json.loads(row[0]).items()}
+
+    def put(self, fingerprint: str, filename: str, pages: dict) -> None:
+        db = self._db()
+        with db:
+            db.execute(
+                "INSERT OR REPLACE INTO templates (fingerprint, source_file, pages) VALUES (?, ?, ?)",
+                (fingerprint, filename, json.dumps(pages, ensure_ascii=False)),
+            )
@@ -1,6 +1,7 @@
 import typer
 from pathlib import Path
 import os, sys
+import multiprocessing
 from pdf_ocr_stamper.config_loader import load_config
 from pdf_ocr_stamper.pipeline import process_batch
 
@@ -28,18 +29,56 @@ def main(
     manifest: str = typer.Option(None, "--manifest", "-m"),
     dry_run: bool = typer.Option(False, "--dry-run"),
     rules: str = typer.Option(None, "--rules", help="Ruta a rules.yaml"),
-    outlog: str = typer.Option("output/placement_log.csv", "--outlog", help="CSV con estrategia usada"),
+    outlog: str = typer.Option("output/placement_log.csv", "--outlog", help="CSV con estrategia usada (JSON Lines si termina en .jsonl)"),
     yes: bool = typer.Option(False, "--yes", "-y", help="No pedir confirmación; continuar automáticamente"),
-    menu: bool = typer.Option(False, "--menu", help="Mostrar menú interactivo")
+    menu: bool = typer.Option(False, "--menu", help="Mostrar menú interactivo"),
+    workers: int = typer.Option(None, "--workers", "-w", help="Procesos en paralelo (0 = todos los núcleos)"),
+    force: bool = typer.Option(False, "--force", help="Reprocesar todo aunque la caché diga que no hubo cambios"),
+    analyze: str = typer.Option(None, "--analyze", help="Solo analizar y escribir el plan de colocación (CSV/JSON)"),
+    apply: str = typer.Option(None, "--apply", help="Estampar desde un plan de colocación, sin analizar"),
+    resume: bool = typer.Option(False, "--resume", help="Continuar el lote anterior: solo los PDFs sin terminar"),
+    retries: int = typer.Option(None, "--retries", help="Reintentos por PDF fallido (espera creciente entre intentos)"),
+    watch: bool = typer.Option(False, "--watch", help="Quedar vigilando input_dir y estampar cada PDF nuevo"),
+    serve: bool = typer.Option(False, "--serve", help="Servicio HTTP local: POST /stamp con el PDF"),
+    port: int = typer.Option(None, "--port", help="Puerto de --serve (por defecto service.port o 8765)"),
+    save_mode: str = typer.Option(None, "--save-mode", help="Salida del PDF: full | incremental | compact"),
+    profile: str = typer.Option(None, "--profile", help="Perfilar cada PDF con cProfile y dejar .prof/.txt en esta carpeta")
 ):
     base_cwd = Path.cwd()
-    cfg = load_config(config)
-    if manifest:
-        cfg["manifest_csv"] = manifest
-    cfg["dry_run"] = dry_run
-    if rules:
-        cfg["rules_yaml"] = rules
-    cfg["outlog"] = outlog
+    if analyze and apply:
+        raise typer.BadParameter("Use --analyze o --apply, no ambos")
+    if (watch or serve) and (analyze or apply):
+        raise typer.BadParameter("--watch/--serve no se combinan con --analyze/--apply")
+    if watch and serve:
+        raise typer.BadParameter("Use --watch o --serve, no ambos")
+
+    def build_cfg() -> dict:
+        # config.yaml + opciones de la línea de comandos (--watch la relee al cambiar)
+        cfg = load_config(config)
+        if manifest:
+            cfg["manifest_csv"] = manifest
+        cfg["dry_run"] = dry_run
+        if rules:
+            cfg["rules_yaml"] = rules
+        cfg["outlog"] = outlog
+        if workers is not None:
+            cfg["workers"] = workers
+        cfg["force"] = force
+        cfg["resume"] = resume
+        if retries is not None:
+            cfg["retries"] = retries
+        if analyze or apply:
+            cfg["phase"] = "analyze" if analyze else "apply"
+            cfg["plan_path"] = analyze or apply
+        if save_mode:
+            cfg["output"] = dict(cfg.get("output") or {}, save_mode=save_mode)
+        if port is not None:
+            cfg["service"] = dict(cfg.get("service") or {}, port=port)
+        if profile:
+            cfg["profile_dir"] = profile
+        return cfg
+
+    cfg = build_cfg()
     
     
     # Muestra de dónde se tomará cada cosa
@@ -64,10 +103,29 @@ def main(
 
     print(f"[INFO] OutLog CSV: {outlog}  ->  {_abs(outlog)}")
     print(f"[INFO] Dry-run: {dry_run}")
+    print(f"[INFO] Workers: {cfg.get('workers', 1)}")
+    print(f"[INFO] Force: {force}")
+    print(f"[INFO] Save mode: {(cfg.get('output') or {}).get('save_mode', 'full')}")
+    print(f"[INFO] Resume: {resume}  (reintentos: {cfg.get('retries', 0)})")
+    if profile:
+        print(f"[INFO] Profile: {profile}  ->  {_abs(profile)}")
+    if cfg.get("phase"):
+        print(f"[INFO] Fase: {cfg['phase']}  ->  plan {_abs(cfg['plan_path'])}")
+    print(f"[INFO] Watch: {watch}")
+    print(f"[INFO] Serve: {serve}")
     print(f"[INFO] Menu: {menu}")
     print("──────────────────────────────────────────────────────")
     
     
+    if watch:
+        from pdf_ocr_stamper.watch import watch as watch_folder
+        watch_folder(build_cfg, config)
+        return
+    if serve:
+        from pdf_ocr_stamper.service import serve as serve_http
+        serve_http(cfg)
+        return
+
     # Pasa el flag al pipeline
     if not menu:
         process_batch(cfg, auto_confirm=yes)
@@ -157,4 +215,5 @@ def main(
             print("Opción inválida.")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()  # requerido por el pool en el exe de PyInstaller
     typer.run(main)
@@ -0,0 +1,136 @@
+# src/pdf_ocr_stamper/discovery.py
+# Descubrimiento de PDFs en input_dir (bloque `discovery:` de config.yaml).
+# Recorre con os.scandir y genera los archivos a medida que los encuentra, así
+# el lote empieza a procesar sin esperar a listar toda la carpeta (carpetas de
+# red con decenas de miles de PDFs). Cada carpeta se ordena por nombre (sin
+# stat), de modo que el orden del lote sigue siendo determinista; el stat solo
+# se hace si hay filtros de tamaño o fecha.
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import Iterator
+import os
+
+@dataclass(frozen=True, slots=True)
+class DiscoverySettings:
+    recursive: bool = False
+    include: tuple[str, ...] = ("*.pdf",)   # sobre la ruta relativa, sin distinguir mayúsculas
+    exclude: tuple[str, ...] = ()
+    min_bytes: int = 0
+    max_bytes: int = 0                      # 0 = sin límite
+    modified_after: float | None = None     # epoch
+    modified_before: float | None = None
+
+    @property
+    def needs_stat(self) -> bool:
+        return bool(self.min_bytes or self.max_bytes or self.modified_after is not None
+                    or self.modified_before is not None)
+
+def _patterns(value, key: str) -> tuple[str, ...]:
+    if value in (None, ""):
+        return ()
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, (list, tuple)) or not all(isinstance(v, str) for v in value):
+        raise ValueError(f"config.yaml: discovery.{key} debe ser un patrón o una lista de patrones")
+    return tuple(v.strip().replace("\\", "/").lower() for v in value if v.strip())
+
+def _timestamp(value, key: str) -> float | None:
+    if value in (None, ""):
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    try:
+        # YAML convierte 2024-01-31 en date; también se acepta "2024-01-31 18:00"
+        return datetime.fromisoformat(str(value)).timestamp()
+    except ValueError:
+        raise ValueError(f"config.yaml: discovery.{key} inválido {value!r} (use AAAA-MM-DD o AAAA-MM-DD HH:MM)") from None
+
+def compile_discovery_settings(cfg: dict) -> DiscoverySettings:
+    """Lee el bloque `discovery:` de config.yaml (por defecto: solo *.pdf de la raíz, como antes)."""
+    dcfg = cfg.get("discovery") or {}
+    if not isinstance(dcfg, dict):
+        raise ValueError("config.yaml: 'discovery' debe ser un mapeo")
+    try:
+        min_bytes = int(float(dcfg.get("min_size_kb") or 0) * 1024)
+        max_bytes = int(float(dcfg.get("max_size_mb") or 0) * (1 << 20))
+    except (TypeError, ValueError):
+        raise ValueError("config.yaml: discovery.min_size_kb / max_size_mb deben ser números") from None
+    return DiscoverySettings(
+        recursive=bool(dcfg.get("recursive", False)),
+        include=_patterns(dcfg.get("include", "*.pdf"), "include") or ("*.pdf",),
+        exclude=_patterns(dcfg.get("exclude"), "exclude"),
+        min_bytes=max(0, min_bytes),
+        max_bytes=max(0, max_bytes),
+        modified_after=_timestamp(dcfg.get("modified_after"), "modified_after"),
+        modified_before=_timestamp(dcfg.get("modified_before"), "modified_before"),
+    )
+
+def _matches(rel: str, patterns: tuple[str, ...]) -> bool:
+    rel = rel.lower()
+    return any(fnmatchcase(rel, p) for p in patterns)
+
+def _passes_stat(entry: os.DirEntry, opts: DiscoverySettings) -> bool:
+    try:
+        st = entry.stat()
+    except OSError:
+        return False
+    if st.st_size < opts.min_bytes or (opts.max_bytes and st.st_size > opts.max_bytes):
+        return False
+    if opts.modified_after is not None and st.st_mtime < opts.modified_after:
+        return False
+    if opts.modified_before is not None and st.st_mtime >= opts.modified_before:
+        return False
+    return True
+
+def iter_pdfs(input_dir: Path, opts: DiscoverySettings, skip_dirs: tuple[Path, ...] = ()) -> Iterator[Path]:
+    """
+    Genera input_dir/<ruta relativa> de cada PDF que pasa los filtros, carpeta
+    por carpeta en orden de nombre. Omite archivos y carpetas ocultos (".x")
+    y las carpetas de skip_dirs (p.ej. output_dir dentro de input_dir).
+    Sigue los enlaces simbólicos a carpetas, pero cada carpeta real se recorre
+    una sola vez (un enlace que apunta a un ancestro no genera un ciclo).
+    """
+    skip = set()
+    for d in skip_dirs:
+        try:
+            skip.add(os.path.normcase(os.path.realpath(d)))
+        except OSError:
+            pass
+    visited = {os.path.normcase(os.path.realpath(input_dir))}
+    pending = [(input_dir, "")]
+    while pending:
+        folder, prefix = pending.pop()
+        try:
+            with os.scandir(folder) as it:
+                entries = sorted((e for e in it if not e.name.startswith(".")), key=lambda e: e.name)
+        except OSError as e:
+            print(f"[WARN] No se pudo leer {folder}: {e}")
+            continue
+        subdirs = []
+        for entry in entries:
+            rel = prefix + entry.name
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                continue
+            if is_dir:
+                if opts.recursive and not _matches(rel + "/", opts.exclude):
+                    real = os.path.normcase(os.path.realpath(entry.path))
+                    if real not in skip and real not in visited:
+                        visited.add(real)
+                        subdirs.append((Path(entry.path), rel + "/"))
+                continue
+            if not _matches(rel, opts.include) or _matches(rel, opts.exclude):
+                continue
+            try:
+                if not entry.is_file():
+                    continue
+            except OSError:
+                continue
+            if opts.needs_stat and not _passes_stat(entry, opts):
+                continue
+            yield input_dir / rel
+        pending.extend(reversed(subdirs))  # primero los archivos de la carpeta, luego sus subcarpetas en orden
@@ -0,0 +1,188 @@
+# src/pdf_ocr_stamper/isolation.py
+# Un proceso aislado por documento en curso, con límite de tiempo (reloj) y de
+# memoria (RSS). Si un PDF patológico se cuelga o se come la RAM, se mata su
+# worker, se levanta otro y el lote sigue.
+from __future__ import annotations
+from multiprocessing.connection import wait
+from typing import Callable, Iterable, Iterator
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+
+try:  # opcional: RSS en Windows/macOS; en Linux alcanza con /proc
+    import psutil
+except ImportError:  # pragma: no cover
+    psutil = None
+
+POLL_SECONDS = 0.2
+# Workers seguidos que mueren antes de estar listos (init roto: config, firma, imports)
+MAX_INIT_CRASHES = 3
+_END = object()
+
+def rss_bytes(pid: int) -> int | None:
+    """Memoria residente del proceso, o None si no se puede medir en este sistema."""
+    if psutil is not None:
+        try:
+            return psutil.Process(pid).memory_info().rss
+        except Exception:
+            return None
+    try:
+        with open(f"/proc/{pid}/statm", encoding="ascii") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+def _worker_main(conn, init: Callable, init_arg, call: Callable):
+    init(init_arg)
+    conn.send(("ready", None, None))
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        idx, func, job = msg
+        try:
+            conn.send(("result", idx, call(func, job)))
+        except Exception as e:
+            conn.send(("error", idx, "".join(traceback.format_exception_only(type(e), e)).strip()))
+
+class _Worker:
+    __slots__ = ("proc", "conn", "ready", "idx", "started", "spawned")
+
+    def __init__(self, mp, init, init_arg, call):
+        self.conn, child = mp.Pipe()
+        self.proc = mp.Process(target=_worker_main, args=(child, init, init_arg, call), daemon=True)
+        self.proc.start()
+        child.close()
+        self.ready = False
+        self.idx = None       # job en curso
+        self.started = 0.0
+        self.spawned = time.monotonic()  # para el límite de tiempo del arranque (init)
+
+    def kill(self):
+        try:
+            self.proc.kill()
+            self.proc.join(5)
+        finally:
+            self.conn.close()
+
+class IsolatedPool:
+    """
+    Reparte jobs entre `workers` procesos (uno por documento en curso) y
+    genera los resultados en el orden de entrada. init(init_arg) corre una vez
+    por proceso; call(func, job) procesa cada job.
+    on_failure(job, where, message) arma el resultado de un job cuyo worker
+    se mató por timeout / memory_limit o murió (worker_crash). Si
+    MAX_INIT_CRASHES workers seguidos mueren (o superan timeout sin avisar
+    "ready") antes de estar listos, el problema no es un PDF sino el arranque:
+    se lanza RuntimeError en lugar de relanzarlos sin fin.
+    """
+
+    def __init__(self, workers: int, init: Callable, init_arg, call: Callable,
+                 on_failure: Callable, timeout: float = 0, memory_limit: int = 0):
+        self.workers = max(1, workers)
+        self.init, self.init_arg, self.call = init, init_arg, call
+        self.on_failure = on_failure
+        self.timeout = float(timeout or 0)
+        self.memory_limit = int(memory_limit or 0)
+        self.lookahead = max(self.workers * 4, 8)  # resultados adelantados en memoria, acotados
+        self._init_crashes = 0
+
+    def imap(self, func: Callable, jobs: Iterable) -> Iterator[dict]:
+        """jobs puede ser una lista o un generador (se consume a medida que hay workers libres)."""
+        source = iter(jobs)
+        first = next(source, _END)
+        if first is _END:
+            return
+        source = itertools.chain([first], source)
+        size = len(jobs) if isinstance(jobs, (list, tuple)) else self.workers
+        mp = multiprocessing.get_context("spawn")
+        pool = [_Worker(mp, self.init, self.init_arg, self.call) for _ in range(min(self.workers, size))]
+        done: dict[int, dict] = {}
+        inflight: dict[int, object] = {}  # idx -> job enviado y aún sin resultado
+        next_job = next_out = 0
+        exhausted = False
+        poll = POLL_SECONDS if not self.timeout else min(POLL_SECONDS, self.timeout / 10)
+        try:
+            while not exhausted or next_out < next_job:
+                # 1) repartir jobs a los workers libres (sin adelantarse demasiado)
+                for w in pool:
+                    if exhausted or next_job >= next_out + self.lookahead:
+                        break
+                    if w.ready and w.idx is None:
+                        job = next(source, _END)
+                        if job is _END:
+                            exhausted = True
+                            break
+                        w.conn.send((next_job, func, job))
+                        inflight[next_job] = job
+                        w.idx, w.started = next_job, time.monotonic()
+                        next_job += 1
+
+                # 2) recibir resultados (o detectar workers muertos)
+                for conn in wait([w.conn for w in pool], timeout=poll):
+                    w = next(w for w in pool if w.conn is conn)
+                    try:
+                        kind, idx, payload = conn.recv()
+                    except (EOFError, OSError):
+                        w.proc.join(1)  # para tener exitcode
+                        self._replace(pool, w, mp, done, inflight, "worker_crash",
+                                      f"el proceso terminó inesperadamente, exitcode={w.proc.exitcode}")
+                        continue
+                    if kind == "ready":
+                        w.ready = True
+                        self._init_crashes = 0
+                    elif kind == "result":
+                        done[idx] = payload
+                        inflight.pop(idx, None)
+                        w.idx = None
+                    else:
+                        done[idx] = self.on_failure(inflight.pop(idx), "worker_error", payload)
+                        w.idx = None
+
+                # 3) límites del job en curso
+                now = time.monotonic()
+                for w in list(pool):
+                    if not w.ready:
+                        if self.timeout and now - w.spawned > self.timeout:
+                            # colgado en init: cuenta como arranque fallido (no hay job que reportar)
+                            self._replace(pool, w, mp, done, inflight, "worker_init_timeout",
+                                          f"no terminó de iniciar en {self.timeout:g}s")
+                        continue
+                    if w.idx is None:
+                        continue
+                    if self.timeout and now - w.started > self.timeout:
+                        self._replace(pool, w, mp, done, inflight, "timeout",
+                                      f"superó {self.timeout:g}s de procesamiento")
+                    elif self.memory_limit:
+                        rss = rss_bytes(w.proc.pid)
+                        if rss is not None and rss > self.memory_limit:
+                            self._replace(pool, w, mp, done, inflight, "memory_limit",
+                                          f"RSS {rss // (1 << 20)} MB > límite {self.memory_limit // (1 << 20)} MB")
+
+                # 4) entregar en orden
+                while next_out in done:
+                    yield done.pop(next_out)
+                    next_out += 1
+        finally:
+            for w in pool:
+                try:
+                    if w.proc.is_alive() and w.idx is None:
+                        w.conn.send(None)
+                        w.proc.join(2)
+                except Exception:
+                    pass
+                if w.proc.is_alive():
+                    w.kill()
+
+    def _replace(self, pool: list, w: _Worker, mp, done: dict, inflight: dict, where: str, message: str):
+        idx = w.idx
+        w.kill()
+        if not w.ready:
+            self._init_crashes += 1
+            if self._init_crashes >= MAX_INIT_CRASHES:
+                raise RuntimeError(f"{self._init_crashes} workers seguidos fallaron al iniciar ({message})")
+        pool[pool.index(w)] = _Worker(mp, self.init, self.init_arg, self.call)
+        if idx is not None:
+            done[idx] = self.on_failure(inflight.pop(idx), where, message)
@@ -0,0 +1,110 @@
+# src/pdf_ocr_stamper/ledger.py
+# Registro persistente del lote (tabla jobs en el SQLite de output/): estado de
+# cada archivo para poder reanudar con --resume después de un corte.
+from __future__ import annotations
+from pathlib import Path
+import time
+
+from .cache import _SqliteStore
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+# start/finish se agrupan en una transacción: commit cada N cambios o cada tantos segundos
+COMMIT_EVERY = 50
+COMMIT_SECONDS = 2.0
+
+class JobLedger(_SqliteStore):
+    """
+    Un registro por archivo: estado, intentos, salida y match_source.
+    Solo escribe el proceso principal: arma el lote, marca in_progress los
+    archivos entregados a los workers y registra el resultado. start/finish
+    se acumulan en memoria y commit() los escribe en una sola transacción
+    (sin dejarla abierta: la caché usa el mismo archivo SQLite).
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._pending: list[tuple[str, tuple]] = []  # (sql, parámetros) sin commit
+        self._pending_since = 0.0                     # time.monotonic() del primero
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " file TEXT PRIMARY KEY,"
+        " state TEXT NOT NULL,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " output_path TEXT,"
+        " match_source TEXT,"
+        " last_error TEXT,"
+        " updated_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+    )
+
+    def reset(self, files: list[str]) -> None:
+        """Lote nuevo: todo pendiente."""
+        db = self._db()
+        with db:
+            db.execute("DELETE FROM jobs")
+            db.executemany("INSERT INTO jobs (file, state) VALUES (?, ?)", ((f, PENDING) for f in files))
+
+    def register(self, files: list[str]) -> None:
+        """Reanudar: agrega como pendientes los archivos que no estaban en el lote."""
+        db = self._db()
+        with db:
+            db.executemany("INSERT OR IGNORE INTO jobs (file, state) VALUES (?, ?)", ((f, PENDING) for f in files))
+
+    def states(self) -> dict[str, tuple[str, int]]:
+        self.commit()
+        return {f: (state, attempts) for f, state, attempts in
+                self._db().execute("SELECT file, state, attempts FROM jobs")}
+
+    def start(self, file: str) -> None:
+        self._write(
+            "INSERT INTO jobs (file, state, attempts) VALUES (?, ?, 1) "
+            "ON CONFLICT(file) DO UPDATE SET state = excluded.state, attempts = attempts + 1,"
+            " updated_at = CURRENT_TIMESTAMP",
+            (file, IN_PROGRESS),
+        )
+
+    def finish(self, file: str, ok: bool, output_path: str | None = None,
+               match_source: str | None = None, error: str | None = None) -> None:
+        self._write(
+            "UPDATE jobs SET state = ?, output_path = ?, match_source = ?, last_error = ?,"
+            " updated_at = CURRENT_TIMESTAMP WHERE file = ?",
+            (DONE if ok else FAILED, output_path, match_source, error, file),
+        )
+
+    def _write(self, sql: str, params: tuple) -> None:
+        if not self._pending:
+            self._pending_since = time.monotonic()
+        self._pending.append((sql, params))
+
+    def due(self) -> bool:
+        """True si toca commit: COMMIT_EVERY cambios o COMMIT_SECONDS desde el primero sin confirmar."""
+        return len(self._pending) >= COMMIT_EVERY or (
+            bool(self._pending) and time.monotonic() - self._pending_since >= COMMIT_SECONDS)
+
+    def commit(self) -> None:
+        if not self._pending:
+            return
+        db = self._db()
+        with db:
+            for sql, params in self._pending:
+                db.execute(sql, params)
+        self._pending = []
+
+    def close(self) -> None:
+        self.commit()
+        super().close()
+
+def is_unfinished(state: tuple[str, int] | None, max_attempts: int) -> bool:
+    """Para --resume: pendiente, cortado a mitad, o fallido con reintentos disponibles."""
+    if state is None:
+        return True
+    st, attempts = state
+    if st == DONE:
+        return False
+    if st == FAILED:
+        return attempts < max_attempts
+    return True
@@ -0,0 +1,114 @@
+# src/pdf_ocr_stamper/logsinks.py
+# Logs que se escriben a medida que avanza el lote (no al final): cada archivo
+# se abre una vez, las filas se acumulan en un buffer acotado y se vuelcan
+# cada N filas o cada pocos segundos. Si el proceso muere, el log queda con
+# todas las filas hasta el último volcado (siempre líneas completas).
+from __future__ import annotations
+from pathlib import Path
+import csv
+import io
+import json
+import os
+import threading
+import time
+
+PLACEMENT_FIELDS = ["file", "page", "strategy", "x", "y", "w", "h", "rotation",
+                    "save_mode", "save_ms", "out_bytes"]  # salida del PDF (vacío en dry-run)
+ERROR_FIELDS = ["file", "where", "error", "stack"]
+UNMATCHED_FIELDS = ["filename", "match_source", "rule_name", "reason", "pages_affected", "output_path"]
+
+FLUSH_ROWS = 200      # volcar cuando el buffer llega a N filas
+FLUSH_SECONDS = 2.0   # ... o cuando pasó este tiempo desde el último volcado
+
+class LogSink:
+    """
+    Log CSV, o JSONL si la ruta termina en .jsonl. Se usa como una lista
+    (append/extend), así sirve donde antes se acumulaban filas.
+
+    - append=True agrega al archivo existente (encabezado solo si está vacío);
+      si no, lo trunca al abrir.
+    - lazy=True no crea el archivo hasta la primera fila (p.ej. error_log).
+    - Cada volcado es una sola escritura de líneas completas y todas las
+      operaciones toman un lock: se puede compartir entre hilos. Con
+      append=True varios procesos pueden agregar al mismo archivo (O_APPEND).
+    """
+
+    def __init__(self, path: str | Path, fieldnames: list[str], append: bool = False, lazy: bool = False,
+                 flush_rows: int = FLUSH_ROWS, flush_seconds: float = FLUSH_SECONDS):
+        self.path = Path(path)
+        self.fieldnames = list(fieldnames)
+        self.jsonl = self.path.suffix.lower() == ".jsonl"
+        self.append_mode = append
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_seconds = flush_seconds
+        self.rows_written = 0
+        self._buf: list[dict] = []
+        self._f = None
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        if not lazy:
+            self._open()
+
+    def _open(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = self.path.open("a" if self.append_mode else "w", newline="", encoding="utf-8")
+        if not self.jsonl and self._f.tell() == 0:
+            self._f.write(self._format([dict(zip(self.fieldnames, self.fieldnames))]))
+            self._f.flush()
+
+    def _format(self, rows: list[dict]) -> str:
+        if self.jsonl:
+            return "".join(
+                json.dumps({k: row.get(k, "") for k in self.fieldnames}, ensure_ascii=False, default=str) + "\n"
+                for row in rows
+            )
+        out = io.StringIO()
+        w = csv.DictWriter(out, fieldnames=self.fieldnames, extrasaction="ignore")
+        w.writerows(rows)
+        return out.getvalue()
+
+    def _flush_locked(self):
+        if not self._buf:
+            return
+        if self._f is None:
+            self._open()
+        self._f.write(self._format(self._buf))
+        self._f.flush()
+        self.rows_written += len(self._buf)
+        self._buf.clear()
+        self._last_flush = time.monotonic()
+
+    def append(self, row: dict) -> None:
+        with self._lock:
+            self._buf.append(row)
+            if len(self._buf) >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_seconds:
+                self._flush_locked()
+
+    def extend(self, rows) -> None:
+        for row in rows:
+            self.append(row)
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._f is not None:
+                try:
+                    os.fsync(self._f.fileno())
+                except OSError:
+                    pass
+                self._f.close()
+                self._f = None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.rows_written + len(self._buf)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
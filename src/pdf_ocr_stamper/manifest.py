@@ -1,11 +1,28 @@
+from __future__ import annotations
 import csv
+from dataclasses import dataclass, field
 from pathlib import Path
 
-def parse_page_range(expr: str | None, page_count: int):
+from .utils_naming import GlobIndex, is_glob
+
+@dataclass(frozen=True, slots=True)
+class PageRange:
+    """Rango "1-3,5,7-" ya parseado; se expande al conocer page_count."""
+    segments: tuple[tuple[int, int | None], ...]  # (inicio, fin|None=última)
+
+    def resolve(self, page_count: int):
+        result = set()
+        for start, end in self.segments:
+            end = page_count if end is None else end
+            for i in range(max(start, 1), min(end, page_count) + 1):
+                result.add(i)
+        return sorted(result) or None
+
+def compile_page_range(expr: str | None) -> PageRange | None:
     expr = (expr or "").strip()
     if not expr:
         return None
-    result = set()
+    segments = []
     parts = [p.strip() for p in expr.split(",") if p.strip()]
     for p in parts:
         if "-" in p:
@@ -13,15 +30,16 @@ def parse_page_range(expr: str | None, page_count: int):
             a = a.strip()
             b = b.strip()
             start = int(a) if a else 1
-            end = int(b) if b else page_count
-            for i in range(start, end + 1):
-                if 1 <= i <= page_count:
-                    result.add(i)
+            end = int(b) if b else None
+            segments.append((start, end))
         else:
             i = int(p)
-            if 1 <= i <= page_count:
-                result.add(i)
-    return sorted(result) or None
+            segments.append((i, i))
+    return PageRange(tuple(segments))
+
+def parse_page_range(expr: str | None, page_count: int):
+    pr = compile_page_range(expr)
+    return pr.resolve(page_count) if pr else None
 
 def load_manifest(path: str | None):
     if not path:
@@ -38,3 +56,100 @@ def load_manifest(path: str | None):
                 continue
             per_file.setdefault(fname, []).append(row)
     return per_file
+
+
+# -------- Filas compiladas (se validan una vez al cargar) --------
+
+@dataclass(frozen=True, slots=True)
+class RowSpec:
+    """Fila del manifest con los defaults de config.yaml/rules.yaml ya aplicados."""
+    x: float
+    y: float
+    has_xy: bool                 # el manifest trajo x/y propios
+    width: float | None
+    height: float | None
+    scale: float | None
+    rotation: int
+    keep_aspect: bool
+    page: int | None             # página explícita (fila o config)
+    page_range: PageRange | None  # stamp_page_range explícito (fila o config)
+
+_DEFAULT_KEYS = ("*", "__default__")
+
+@dataclass(frozen=True, slots=True)
+class ManifestPlan:
+    rows: dict[str, tuple[RowSpec, ...]]
+    default_rows: tuple[RowSpec, ...]
+    # filename con comodines ("rrhh_*.pdf", "2024/*"), en el orden del CSV; "*" sigue siendo el default
+    patterns: tuple[str, ...] = field(init=False, repr=False, compare=False)
+    index: GlobIndex = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        patterns = tuple(k for k in self.rows if is_glob(k) and k not in _DEFAULT_KEYS)
+        object.__setattr__(self, "patterns", patterns)
+        object.__setattr__(self, "index", GlobIndex(patterns))
+
+    def rows_for(self, filename: str) -> tuple[tuple[RowSpec, ...], bool]:
+        """
+        Retorna (filas, hubo_filas_propias_del_archivo): primero el nombre
+        exacto, luego el primer patrón que coincide y por último el default.
+        """
+        name_l = filename.lower()
+        own = self.rows.get(name_l)
+        if own:
+            return own, True
+        if self.patterns:
+            i = self.index.first(name_l)
+            if i is not None:
+                return self.rows[self.patterns[i]], True
+        return (self.rows.get("*") or self.rows.get("__default__") or self.default_rows), False
+
+def _f(v):
+    v = (v or "").strip() if isinstance(v, str) else v
+    return None if v in ("", None) else v
+
+def compile_row(row: dict, cfg: dict, rule_scale=None, rule_keep_aspect=True) -> RowSpec:
+    default_scale = cfg.get("scale")
+    default_keep_aspect = bool(cfg.get("keep_aspect", True))
+
+    x = float(_f(row.get("x")) or cfg.get("x", 0))
+    y = float(_f(row.get("y")) or cfg.get("y", 0))
+    width = _f(row.get("width")) or cfg.get("width")
+    height = _f(row.get("height")) or cfg.get("height")
+    scale = _f(row.get("scale")) or default_scale or rule_scale
+    keep_aspect = str(_f(row.get("keep_aspect")) or default_keep_aspect or rule_keep_aspect).lower() == "true"
+    page = _f(row.get("page")) or cfg.get("page")
+
+    return RowSpec(
+        x=x,
+        y=y,
+        has_xy=(_f(row.get("x")) is not None) or (_f(row.get("y")) is not None),
+        width=float(width) if width is not None else None,
+        height=float(height) if height is not None else None,
+        scale=float(scale) if scale is not None else None,
+        rotation=int(_f(row.get("rotation")) or cfg.get("rotation", 0)),
+        keep_aspect=keep_aspect,
+        page=int(page) if page else None,
+        page_range=compile_page_range(_f(row.get("stamp_page_range")) or cfg.get("stamp_page_range")),
+    )
+
+def compile_manifest(per_file: dict[str, list[dict]], cfg: dict,
+                     rule_scale=None, rule_keep_aspect=True) -> ManifestPlan:
+    """
+    Convierte las filas crudas del manifest en RowSpec inmutables.
+    Lanza ValueError indicando archivo/fila si algún valor es inválido.
+    """
+    def _compile(fname: str, i: int, row: dict) -> RowSpec:
+        try:
+            return compile_row(row, cfg, rule_scale, rule_keep_aspect)
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"manifest.csv ({fname!r}, fila #{i}): {e}") from None
+
+    rows = {
+        fname: tuple(_compile(fname, i, r) for i, r in enumerate(items, 1))
+        for fname, items in per_file.items()
+    }
+    return ManifestPlan(
+        rows=rows,
+        default_rows=(_compile("(config)", 1, {}),),
+    )
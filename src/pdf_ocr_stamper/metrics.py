@@ -0,0 +1,189 @@
+# src/pdf_ocr_stamper/metrics.py
+# Métricas en formato de texto de Prometheus, sin dependencias:
+#   - metrics.textfile: archivo .prom para el textfile collector de
+#     node_exporter, reescrito (atómico) mientras avanza el lote;
+#   - GET /metrics: en --serve por el mismo puerto del servicio y en --watch
+#     por metrics.port.
+# Los contadores son del proceso principal y se acumulan entre los lotes de
+# --watch; los workers no los tocan (se cuentan los resultados que devuelven).
+from __future__ import annotations
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+import os
+import re
+import threading
+import time
+
+from .timing import STAGES
+
+PREFIX = "pdf_stamper"
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)  # segundos
+WRITE_INTERVAL = 2.0  # metrics.textfile: reescritura como mucho cada N segundos (y al final del lote)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_PAGE_SUFFIX = re.compile(r"_\d+$")  # anchor_page_3 -> anchor_page: etiquetas acotadas
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _num(v: float) -> str:
+    return repr(float(v)) if v != int(v) else str(int(v))
+
+class _Histogram:
+    __slots__ = ("counts", "sum", "count")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        self.sum += seconds
+        self.count += 1
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[i] += 1
+
+    def lines(self, name: str, labels: str = "") -> list[str]:
+        sep = "," if labels else ""
+        out = [f'{name}_bucket{{{labels}{sep}le="{_num(b)}"}} {c}' for b, c in zip(BUCKETS, self.counts)]
+        out.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {self.count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        out.append(f"{name}_sum{suffix} {self.sum:.6f}")
+        out.append(f"{name}_count{suffix} {self.count}")
+        return out
+
+class Metrics:
+    """Registro de métricas del proceso; observe() por cada resultado del lote o del servicio."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.outcomes: Counter = Counter()   # match_source -> PDFs
+        self.errors: Counter = Counter()     # where -> errores
+        self.pages = 0
+        self.cached = 0
+        self.failed = 0
+        self.stages: dict[str, _Histogram] = {}
+        self.file_seconds = _Histogram()
+        self.batches = 0
+        self.batch_files = 0
+        self.batch_done = 0
+        self.batch_running = 0
+        self.last_batch_end = 0.0
+
+    def batch_started(self, files: int):
+        with self._lock:
+            self.batches += 1
+            self.batch_files, self.batch_done, self.batch_running = files, 0, 1
+
+    def batch_finished(self):
+        with self._lock:
+            self.batch_running = 0
+            self.last_batch_end = time.time()
+
+    def observe(self, result: dict, ok: bool):
+        with self._lock:
+            self.batch_done += 1
+            self.batch_files = max(self.batch_files, self.batch_done)  # lote en streaming: total aún desconocido
+            self.outcomes[result.get("match_source") or "error"] += 1
+            if not ok:
+                self.failed += 1
+            for err in result["errors"]:
+                self.errors[_PAGE_SUFFIX.sub("", err.get("where") or "unknown")] += 1
+            if result.get("cached"):
+                self.cached += 1
+                return
+            self.pages += result.get("pages", 0)
+            timings = result.get("timings") or {}
+            for stage, ms in timings.items():
+                self.stages.setdefault(stage, _Histogram()).observe(ms / 1000)
+            if timings:
+                self.file_seconds.observe(sum(timings.values()) / 1000)
+
+    def render(self) -> str:
+        p = PREFIX
+        with self._lock:
+            out = [f"# HELP {p}_files_total PDFs procesados por resultado (match_source; error = sin resultado)",
+                   f"# TYPE {p}_files_total counter"]
+            out += [f'{p}_files_total{{outcome="{_label(k)}"}} {v}' for k, v in sorted(self.outcomes.items())]
+            out += [f"# HELP {p}_files_failed_total PDFs sin salida (no se pudo abrir/guardar, timeout, ...)",
+                    f"# TYPE {p}_files_failed_total counter", f"{p}_files_failed_total {self.failed}",
+                    f"# HELP {p}_files_cached_total PDFs omitidos por la caché de resultados",
+                    f"# TYPE {p}_files_cached_total counter", f"{p}_files_cached_total {self.cached}",
+                    f"# HELP {p}_pages_total Páginas de los PDFs procesados",
+                    f"# TYPE {p}_pages_total counter", f"{p}_pages_total {self.pages}",
+                    f"# HELP {p}_errors_total Errores por etapa (where de error_log)",
+                    f"# TYPE {p}_errors_total counter"]
+            out += [f'{p}_errors_total{{where="{_label(k)}"}} {v}' for k, v in sorted(self.errors.items())]
+            out += [f"# HELP {p}_stage_duration_seconds Tiempo por etapa y PDF",
+                    f"# TYPE {p}_stage_duration_seconds histogram"]
+            for stage in STAGES:
+                if stage in self.stages:
+                    out += self.stages[stage].lines(f"{p}_stage_duration_seconds", f'stage="{stage}"')
+            out += [f"# HELP {p}_file_duration_seconds Tiempo total por PDF",
+                    f"# TYPE {p}_file_duration_seconds histogram"]
+            out += self.file_seconds.lines(f"{p}_file_duration_seconds")
+            out += [f"# HELP {p}_batches_total Lotes iniciados (cada tanda de --watch cuenta)",
+                    f"# TYPE {p}_batches_total counter", f"{p}_batches_total {self.batches}",
+                    f"# HELP {p}_batch_files PDFs del lote en curso o del último (con -y: los descubiertos hasta ahora)",
+                    f"# TYPE {p}_batch_files gauge", f"{p}_batch_files {self.batch_files}",
+                    f"# HELP {p}_batch_files_done PDFs terminados del lote en curso (o del último)",
+                    f"# TYPE {p}_batch_files_done gauge", f"{p}_batch_files_done {self.batch_done}",
+                    f"# HELP {p}_batch_running 1 mientras hay un lote en curso",
+                    f"# TYPE {p}_batch_running gauge", f"{p}_batch_running {self.batch_running}",
+                    f"# HELP {p}_last_batch_end_timestamp_seconds Fin del último lote (epoch)",
+                    f"# TYPE {p}_last_batch_end_timestamp_seconds gauge",
+                    f"{p}_last_batch_end_timestamp_seconds {self.last_batch_end:.3f}"]
+        return "\n".join(out) + "\n"
+
+METRICS = Metrics()
+
+class TextfileWriter:
+    """Reescribe metrics.textfile de forma atómica (node_exporter nunca lee un archivo a medias)."""
+
+    def __init__(self, path: str | Path | None, interval: float = WRITE_INTERVAL):
+        self.path = Path(path) if path else None
+        self.interval = interval
+        self._last = 0.0
+
+    def update(self, metrics: Metrics = METRICS, force: bool = False):
+        if self.path is None or (not force and time.monotonic() - self._last < self.interval):
+            return
+        self._last = time.monotonic()
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_name(self.path.name + f".{os.getpid()}.tmp")
+            tmp.write_text(metrics.render(), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            print(f"[WARN] metrics.textfile: {e}")
+
+def textfile_writer(cfg: dict) -> TextfileWriter:
+    return TextfileWriter((cfg.get("metrics") or {}).get("textfile"))
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = METRICS.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # sin una línea por cada scrape
+        pass
+
+def start_http_server(cfg: dict) -> ThreadingHTTPServer | None:
+    """GET /metrics en metrics.port (hilo aparte); None si metrics.port no está configurado."""
+    mcfg = cfg.get("metrics") or {}
+    port = int(mcfg.get("port") or 0)
+    if not port:
+        return None
+    server = ThreadingHTTPServer((mcfg.get("host", "127.0.0.1"), port), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True, name="metrics").start()
+    print(f"[INFO] Métricas en http://{server.server_address[0]}:{port}/metrics")
+    return server
@@ -0,0 +1,129 @@
+# src/pdf_ocr_stamper/ocr.py
+# OCR opcional (Tesseract vía PyMuPDF) para páginas escaneadas sin capa de texto.
+# Los resultados se cachean en disco por hash de contenido de la página.
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+import hashlib
+import json
+import os
+import tempfile
+import fitz
+
+from .anchors import PageText
+
+@dataclass(frozen=True, slots=True)
+class OcrSettings:
+    enabled: bool = False
+    language: str = "spa"
+    dpi: int = 300
+    tessdata: str | None = None
+    cache_dir: Path | None = None
+
+def compile_ocr_settings(cfg: dict) -> OcrSettings:
+    """Lee el bloque `ocr:` de config.yaml (deshabilitado por defecto)."""
+    ocfg = cfg.get("ocr") or {}
+    if not isinstance(ocfg, dict):
+        raise ValueError("config.yaml: 'ocr' debe ser un mapeo")
+    cache_dir = ocfg.get("cache_dir")
+    if cache_dir is None:
+        cache_dir = Path(cfg.get("output_dir", "output")) / ".ocr_cache"
+    try:
+        dpi = int(ocfg.get("dpi", 300))
+    except (TypeError, ValueError):
+        raise ValueError(f"config.yaml: ocr.dpi inválido {ocfg.get('dpi')!r}") from None
+    return OcrSettings(
+        enabled=bool(ocfg.get("enabled", False)),
+        language=str(ocfg.get("language") or "spa"),
+        dpi=dpi,
+        tessdata=ocfg.get("tessdata") or None,
+        cache_dir=Path(cache_dir) if cache_dir else None,
+    )
+
+def page_content_hash(page: fitz.Page) -> str:
+    """
+    Hash del contenido visible de la página: content stream, imágenes
+    (stream crudo, sin decodificar), tamaño y rotación.
+    """
+    doc = page.parent
+    h = hashlib.sha1()
+    h.update(repr((tuple(page.rect), page.rotation)).encode())
+    h.update(page.read_contents() or b"")
+    for img in page.get_images(full=True):
+        try:
+            h.update(doc.xref_stream_raw(img[0]) or b"")
+        except Exception:
+            h.update(str(img).encode())
+    return h.hexdigest()
+
+class OcrCache:
+    """Un JSON por página en cache_dir/<ab>/<hash>.json; escritura atómica."""
+
+    def __init__(self, cache_dir: Path | None):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, key: str) -> list | None:
+        if not self.cache_dir:
+            return None
+        p = self._path(key)
+        try:
+            return [tuple(w) for w in json.loads(p.read_text(encoding="utf-8"))]
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def put(self, key: str, words: list) -> None:
+        if not self.cache_dir:
+            return
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        # escritura atómica: varios workers pueden compartir la caché
+        fd, tmp = tempfile.mkstemp(dir=p.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump([list(w) for w in words], f, ensure_ascii=False)
+            os.replace(tmp, p)
+        except Exception:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+def _ocr_clip_words(page: fitz.Page, settings: OcrSettings, clip: fitz.Rect) -> list:
+    """Rasteriza y hace OCR solo de clip; devuelve palabras en coordenadas de la página."""
+    vis_clip = clip * page.rotation_matrix
+    pix = page.get_pixmap(dpi=settings.dpi, clip=vis_clip)
+    ocr_doc = fitz.open("pdf", pix.pdfocr_tobytes(compress=False, language=settings.language,
+                                                   tessdata=settings.tessdata))
+    try:
+        ocr_page = ocr_doc[0]
+        unzoom = vis_clip.width / ocr_page.rect.width
+        m = fitz.Matrix(unzoom, unzoom) * fitz.Matrix(1, 0, 0, 1, vis_clip.x0, vis_clip.y0) * page.derotation_matrix
+        words = []
+        for x0, y0, x1, y1, text, *rest in ocr_page.get_text("words"):
+            r = fitz.Rect(x0, y0, x1, y1) * m
+            words.append((r.x0, r.y0, r.x1, r.y1, text, *rest))
+        return words
+    finally:
+        ocr_doc.close()
+
+def ocr_page_text(page: fitz.Page, settings: OcrSettings, cache: OcrCache, clip=None) -> PageText:
+    """
+    Retorna las palabras OCR de la página (mismo formato que get_text("words")),
+    desde la caché si ya se procesó una página con el mismo contenido.
+    Con clip solo se rasteriza esa zona (mucho más barato que la página completa).
+    """
+    clip_key = "" if clip is None else ",".join(f"{v:.1f}" for v in clip)
+    key = hashlib.sha1(
+        f"{page_content_hash(page)}|{settings.language}|{settings.dpi}|{clip_key}".encode()
+    ).hexdigest()
+    words = cache.get(key)
+    if words is None:
+        if clip is None:
+            tp = page.get_textpage_ocr(language=settings.language, dpi=settings.dpi,
+                                       full=True, tessdata=settings.tessdata)
+            words = page.get_text("words", textpage=tp)
+        else:
+            words = _ocr_clip_words(page, settings, fitz.Rect(clip))
+        cache.put(key, words)
+    return PageText(words)
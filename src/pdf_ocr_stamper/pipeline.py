@@ -1,15 +1,36 @@
 from pathlib import Path
-import csv
+from collections import deque
+from dataclasses import replace
+import cProfile
+import functools
+import hashlib
+import os
+import pstats
+import shutil
+import time
 import traceback
+import multiprocessing
 import fitz
-from PIL import Image
 import typer
 
-from .manifest import load_manifest, parse_page_range
-from .rules_loader import load_rules, pick_rule_for
-from .anchors import find_anchor_bbox, compute_pos_from_anchor, find_signature_line
+from .manifest import load_manifest, compile_manifest, compile_row
+from .rules_loader import load_rule_plan
+from .anchors import extract_page_text, find_anchor_in_regions, compute_pos_from_anchor, find_signature_line
+from .ocr import OcrCache, compile_ocr_settings, ocr_page_text
+from .placement_plan import is_marker, plan_marker, read_plan, write_plan
+from .cache import CACHE_FILENAME, ResultCache, TemplateCache, config_hash, stable_hash
+from .templates import layout_fingerprint, verify_anchor, verify_line
+from .raster_lines import find_signature_line_raster, looks_scanned, raster_available
 from .placement import place_by_position
-from .signature import get_signature
+from .signature import SignatureAssets, compile_signature_settings, get_signature
+from .preview import render_preview
+from .logsinks import ERROR_FIELDS, PLACEMENT_FIELDS, UNMATCHED_FIELDS, LogSink
+from .ledger import JobLedger, is_unfinished
+from .isolation import IsolatedPool, rss_bytes
+from .saving import check_save_mode, save_to, serialize
+from .discovery import compile_discovery_settings, iter_pdfs
+from .timing import TIMING_FIELDS, BatchTimings, StageTimer, timing_columns
+from .metrics import METRICS, textfile_writer
 
 # >>> ADD: utilidades mínimas para marcado/mover y reporte
 def _mark_filename(path: Path, prefix: str = "", suffix: str = "") -> Path:
@@ -23,6 +44,10 @@ class _MatchSource:
     RULES_FALLBACK = "rules_fallback"
     NO_RULES_MANIFEST = "no_rules_manifest"
     NO_RULES_DEFAULT = "no_rules_default"
+    # Sin procesar: el worker se mató por límite o murió (job_timeout / job_memory_mb)
+    TIMEOUT = "timeout"
+    MEMORY_LIMIT = "memory_limit"
+    WORKER_CRASH = "worker_crash"
 
 def _should_flag(match_source: str) -> bool:
     return match_source in {
@@ -31,16 +56,35 @@ def _should_flag(match_source: str) -> bool:
         _MatchSource.NO_RULES_DEFAULT,
     }
 
-def _write_unmatched_row(report_path: Path, filename: str, match_source: str,
-                         rule_name: str, reason: str, pages_affected: int, output_path: Path):
-    header = ["filename", "match_source", "rule_name", "reason", "pages_affected", "output_path"]
-    file_exists = report_path.exists()
-    report_path.parent.mkdir(parents=True, exist_ok=True)
-    with report_path.open("a", newline="", encoding="utf-8") as f:
-        w = csv.writer(f)
-        if not file_exists:
-            w.writerow(header)
-        w.writerow([filename, match_source, rule_name or "", reason or "", pages_affected or "", str(output_path)])
+def _file_key(pdf_path: Path, ctx: dict) -> str:
+    """
+    Nombre del PDF en logs, cachés y registro del lote: ruta relativa a
+    input_dir ("sub/contrato.pdf"); para los de la raíz, solo el nombre (como antes).
+    """
+    input_dir = ctx.get("input_dir")
+    if input_dir is not None:
+        try:
+            return pdf_path.relative_to(input_dir).as_posix()
+        except ValueError:
+            pass
+    return pdf_path.name
+
+def _review_path(out_path: Path, ctx: dict, force_subfolder: bool = False) -> Path:
+    """Destino de revisión manual según mark_unmatched (subcarpeta o prefijo/sufijo)."""
+    if ctx["move_to_subfolder"] or force_subfolder:
+        sub_dir = ctx["output_dir"] / (ctx["target_subfolder"] or "manual_review")
+        try:
+            target = sub_dir / out_path.relative_to(ctx["output_dir"])  # replica las subcarpetas de input_dir
+        except ValueError:
+            target = sub_dir / out_path.name
+        target.parent.mkdir(parents=True, exist_ok=True)
+        return target
+    return _mark_filename(out_path, prefix=ctx["mark_prefix"], suffix=ctx["mark_suffix"])
+
+def _unmatched_row(filename: str, match_source: str, rule_name: str, reason: str,
+                   pages_affected: int, output_path: Path) -> dict:
+    return dict(filename=filename, match_source=match_source, rule_name=rule_name or "",
+                reason=reason or "", pages_affected=pages_affected or "", output_path=str(output_path))
 # >>> END ADD
 
 def _calc_sig_size(img_w, img_h, width, height, scale, keep_aspect):
@@ -63,68 +107,923 @@ def _append_error(err_rows, file_name, where, exc: Exception):
         "stack": "".join(traceback.format_exception_only(type(exc), exc)).strip()
     })
 
-def process_batch(cfg: dict, auto_confirm: bool = False):
+
+def _page_text(page, p1, clip, page_texts, ocr, ocr_cache, err_rows, file_name, timer):
+    """
+    Texto de la zona clip (None = página completa), memorizado por página.
+    Si la zona no tiene texto y la página no tiene capa de texto, usa OCR
+    (solo de la zona) cuando ocr no es None.
+    """
+    key = (p1, clip)
+    text = page_texts.get(key)
+    if text is not None:
+        return text
+    with timer.stage("text"):
+        text = extract_page_text(page, clip=clip)
+    if not text.words and ocr is not None and not page_texts.get((p1, "ocr_failed")):
+        has_layer = page_texts.get((p1, "has_layer"))
+        if has_layer is None:
+            has_layer = bool(text.words) if clip is None else bool(page.get_text("words"))
+            page_texts[(p1, "has_layer")] = has_layer
+        if not has_layer:
+            try:
+                with timer.stage("ocr"):
+                    text = ocr_page_text(page, ocr, ocr_cache, clip=clip)
+            except Exception as e:
+                page_texts[(p1, "ocr_failed")] = True
+                _append_error(err_rows, file_name, f"ocr_page_{p1}", e)
+    page_texts[key] = text
+    return text
+
+def _layer_text(page, p1, page_texts, timer):
+    """
+    Palabras de la capa de texto de la página completa, sin OCR. Quedan en
+    page_texts para la búsqueda del anchor solo si hay texto: una página sin
+    capa se vuelve a pedir con OCR (y ya se sabe que no tiene capa).
+    """
+    text = page_texts.get((p1, None))
+    if text is not None:
+        return text
+    with timer.stage("text"):
+        text = extract_page_text(page)
+    if text.words:
+        page_texts[(p1, None)] = text
+    page_texts.setdefault((p1, "has_layer"), bool(text.words))
+    return text
+
+def _build_context(cfg: dict) -> dict:
+    """
+    Carga una sola vez todo lo que comparte el lote (reglas, manifest, firma
+    y defaults). Se usa en el proceso principal y en cada worker del pool.
+    """
+    output_dir = Path(cfg["output_dir"])
+    dry_run = bool(cfg.get("dry_run"))
+    phase = cfg.get("phase")  # None (normal) | "analyze" | "apply"
+    if phase not in (None, "analyze", "apply"):
+        raise ValueError(f"Fase desconocida: {phase!r} (válidas: analyze, apply)")
+
+    # >>> ADD: leer configuración de marcado/movido y reporte
+    mark_cfg = (cfg.get("output", {}) or {}).get("mark_unmatched", {}) or {}
+    # >>> END ADD
+
+    img_bytes, img_w, img_h = get_signature(cfg)
+    ocr = compile_ocr_settings(cfg)
+
+    # Reglas y manifest se validan/compilan aquí: si están mal formados
+    # el lote falla al arrancar y no página por página.
+    plan = load_rule_plan(cfg.get("rules_yaml"))
+    manifest = compile_manifest(
+        load_manifest(cfg.get("manifest_csv")), cfg,
+        rule_scale=plan.default_scale, rule_keep_aspect=plan.default_keep_aspect,
+    )
+
+    return {
+        "cfg": cfg,
+        "input_dir": Path(cfg["input_dir"]) if cfg.get("input_dir") else None,
+        "discovery": compile_discovery_settings(cfg),
+        "output_dir": output_dir,
+        "dry_run": dry_run,
+        "phase": phase,
+        "manifest": manifest,
+        "plan": plan,
+        "ocr": ocr if ocr.enabled else None,
+        "ocr_cache": OcrCache(ocr.cache_dir) if ocr.enabled else None,
+        "mark_enabled": bool(mark_cfg.get("enabled", False)),
+        "mark_prefix": mark_cfg.get("prefix", ""),
+        "mark_suffix": mark_cfg.get("suffix", ""),
+        "move_to_subfolder": bool(mark_cfg.get("move_to_subfolder", False)),
+        "target_subfolder": mark_cfg.get("subfolder", "manual_review"),
+        "write_report": bool(mark_cfg.get("write_report", False)),
+        "report_path": Path(mark_cfg.get("report_path", output_dir / "unmatched_pdfs.csv")),
+        "img_bytes": img_bytes,
+        "img_w": img_w,
+        "img_h": img_h,
+        "signature": SignatureAssets(img_bytes, img_w, img_h, compile_signature_settings(cfg)),
+        # Caché de resultados (solo ejecución real; --force la ignora al leer)
+        "result_cache": ResultCache(output_dir / CACHE_FILENAME)
+                        if (not dry_run and phase is None and cfg.get("result_cache", True)) else None,
+        # Plantillas conocidas (huella de diseño -> anchor/línea por página); apply no analiza
+        "template_cache": TemplateCache(output_dir / CACHE_FILENAME)
+                          if (phase != "apply" and cfg.get("template_cache", False)) else None,
+        # Registro del lote para --resume (solo ejecución real que guarda PDFs)
+        "ledger": JobLedger(output_dir / CACHE_FILENAME)
+                  if (not dry_run and phase != "analyze" and cfg.get("ledger", True)) else None,
+        "force": bool(cfg.get("force")),
+        "save_mode": check_save_mode((cfg.get("output", {}) or {}).get("save_mode")),
+        "log_timings": bool(cfg.get("log_timings", False)),
+        "sig_hash": hashlib.sha256(img_bytes).hexdigest(),
+        "cfg_hash": config_hash(cfg),
+    }
+
+def _search_page(page, p1: int, eff_rule, get_text, timer) -> tuple[dict, list]:
+    """
+    Estrategias que no dependen de la fila del manifest: anchor y línea.
+    Retorna (hit, errores) con hit = {"anchor": idx, "bbox": [...]} | {"line": [x, y]} | {}.
+    """
+    errors = []
+    # 1) Anchor por texto
+    try:
+        if eff_rule.anchors:
+            clips = [r.resolve(page.rect) for r in eff_rule.search_regions]
+            with timer.stage("anchor"):
+                found = find_anchor_in_regions(page, eff_rule.matcher, clips, get_text)
+            if found:
+                bbox, anchor = found
+                return {"anchor": eff_rule.anchors.index(anchor), "bbox": list(bbox)}, errors
+    except Exception as e:
+        errors.append((f"anchor_page_{p1}", e))
+
+    # 2) Detección de línea
+    try:
+        lcfg = eff_rule.line_detection
+        if lcfg.enabled:
+            clip = lcfg.region.resolve(page.rect) if lcfg.region else None
+            with timer.stage("line"):
+                xy = find_signature_line(page, lcfg.min_width, lcfg.dy_above_line, clip=clip,
+                                         max_thickness=lcfg.max_thickness, method=lcfg.method)
+            # Escaneos: sin dibujos vectoriales, se busca la línea en la imagen
+            if not xy:
+                with timer.stage("raster_line"):
+                    if lcfg.raster or (lcfg.raster is None and raster_available() and looks_scanned(page)):
+                        xy = find_signature_line_raster(page, lcfg.min_width, lcfg.dy_above_line, clip=clip,
+                                                        dpi=lcfg.raster_dpi, max_thickness=lcfg.max_thickness)
+            if xy:
+                return {"line": list(xy)}, errors
+    except Exception as e:
+        errors.append((f"line_detection_page_{p1}", e))
+    return {}, errors
+
+def _known_template(doc, pdf_name: str, ctx: dict, eff_rule, fp_pages, layer_text, err_rows: list):
+    """
+    Calcula la huella de diseño de las páginas buscadas y, si ya se conoce,
+    verifica cada anchor guardado en su bbox y cada línea en su franja.
+    Retorna (huella, hits | None); huella None si el diseño no se puede
+    reconocer (páginas sin texto). layer_text(p1) entrega las palabras de la
+    capa de texto, compartidas con la búsqueda del anchor.
+    """
+    templates = ctx["template_cache"]
+    if templates is None or not (eff_rule.anchors or eff_rule.line_detection.enabled):
+        return None, None
+    try:
+        fp = layout_fingerprint(doc, fp_pages, eff_rule.fingerprint, layer_text)
+        known = None if (fp is None or ctx["force"]) else templates.get(fp)
+        if not known:
+            return fp, None
+        hits = {}
+        for p1, hit in known.items():
+            page = doc.load_page(p1 - 1)
+            if "anchor" in hit:
+                found = verify_anchor(page, eff_rule.matcher, hit["anchor"], hit["bbox"], layer_text(p1))
+                if not found:
+                    return fp, None  # la huella coincidió pero el anchor no está: búsqueda completa
+                hit = {"anchor": hit["anchor"], "bbox": list(found[0])}
+            elif "line" in hit and eff_rule.line_detection.enabled:
+                xy = verify_line(page, eff_rule.line_detection, hit["line"])
+                if not xy:
+                    return fp, None  # la línea no está en la misma y: búsqueda completa
+                hit = {"line": xy}
+            else:
+                continue  # entrada desconocida (o sin resultado): la página se busca normalmente
+            hits[p1] = hit
+        return fp, hits or None
+    except Exception as e:
+        _append_error(err_rows, pdf_name, "template_fingerprint", e)
+        return None, None
+
+def _analyze_document(doc, pdf_name: str, ctx: dict, eff_rule, rows, err_rows: list,
+                      timer: StageTimer | None = None):
+    """
+    Fase de análisis: decide dónde va la firma en cada página sin modificar doc.
+    Retorna (colocaciones, plantilla) con colocaciones =
+    [{"page", "strategy", "x", "y", "w", "h", "rotation"}, ...] y plantilla =
+    (huella, hits por página) para guardar si el diseño es nuevo, o None.
+    """
+    timer = timer or StageTimer()
+    ocr, ocr_cache = ctx["ocr"], ctx["ocr_cache"]
+    img_w, img_h = ctx["img_w"], ctx["img_h"]
+    page_count = doc.page_count
+    placements = []
+
+    search_last = eff_rule.search_last_pages
+    # OCR solo en las páginas que search_last_pages examinaría
+    if search_last > 0:
+        ocr_pages = set(range(max(1, page_count - search_last + 1), page_count + 1))
+    else:
+        ocr_pages = {1}
+    page_texts = {}  # (p1, clip) -> PageText (una extracción por zona aunque haya varias filas)
+
+    def get_text_for(page, p1):
+        use_ocr = ocr if p1 in ocr_pages else None
+        return lambda clip: _page_text(page, p1, clip, page_texts, use_ocr, ocr_cache, err_rows, pdf_name, timer)
+
+    # Resultado de anchor/línea por página: se busca una vez aunque haya varias filas.
+    # Con una plantilla conocida viene precargado y no se llama a find_anchor_bbox/find_signature_line.
+    with timer.stage("template"):
+        fingerprint, page_hits = _known_template(
+            # huella solo de la primera página que se examina (la última con search_last_pages):
+            # su texto se extrae igual; cada hit se verifica en su página
+            doc, pdf_name, ctx, eff_rule, [page_count if search_last > 0 else 1],
+            lambda p1: _layer_text(doc.load_page(p1 - 1), p1, page_texts, timer), err_rows)
+    template_hit = page_hits is not None
+    page_hits = page_hits or {}
+
+    for row in rows:
+        explicit_range = row.page_range is not None
+        explicit_page = row.page is not None
+
+        if explicit_range:
+            pages = row.page_range.resolve(page_count) or []
+        elif explicit_page:
+            pages = [min(max(row.page, 1), page_count)]
+        elif search_last > 0:
+            start = max(1, page_count - search_last + 1)
+            pages = list(range(start, page_count + 1))
+        else:
+            pages = [1]
+
+        prefer_last = (search_last > 0) and not explicit_range and not explicit_page
+        iter_pages = reversed(pages) if prefer_last else pages
+
+        x, y = row.x, row.y
+        sig_w, sig_h = _calc_sig_size(img_w, img_h, row.width, row.height, row.scale, row.keep_aspect)
+
+        for p1 in iter_pages:
+            try:
+                page = doc.load_page(p1 - 1)
+
+                strategy_used = None
+                place_x, place_y = None, None
+
+                # 1) Anchor por texto / 2) Detección de línea
+                hit = page_hits.get(p1)
+                if hit is None:
+                    hit, errors = _search_page(page, p1, eff_rule, get_text_for(page, p1), timer)
+                    for where, e in errors:
+                        _append_error(err_rows, pdf_name, where, e)
+                    if not errors:
+                        page_hits[p1] = hit
+                if "anchor" in hit:
+                    anchor = eff_rule.anchors[hit["anchor"]]
+                    place_x, place_y = compute_pos_from_anchor(hit["bbox"], anchor.align, anchor.dx, anchor.dy, sig_w, sig_h)
+                    strategy_used = f"anchor:{anchor.regex}"
+                elif "line" in hit:
+                    place_x, place_y = hit["line"]
+                    strategy_used = f"line_detection(min_width={eff_rule.line_detection.min_width})"
+
+                # 3) Posición relativa (solo si el manifest NO trajo x/y)
+                if place_x is None and not row.has_xy:
+                    try:
+                        fback = eff_rule.fallback
+                        if fback.position:
+                            place_x, place_y = place_by_position(page, fback.position, sig_w, sig_h,
+                                                                 fback.margin_x, fback.margin_y,
+                                                                 fback.offset_x, fback.offset_y)
+                            strategy_used = f"relative:{fback.position}"
+                    except Exception as e:
+                        _append_error(err_rows, pdf_name, f"relative_pos_page_{p1}", e)
+
+
+                # 4) Absoluto
+                if place_x is None:
+                    place_x, place_y = x, y
+                    strategy_used = "absolute_xy"
+
+                placements.append({
+                    "page": p1,
+                    "strategy": strategy_used,
+                    "x": place_x,
+                    "y": place_y,
+                    "w": sig_w,
+                    "h": sig_h,
+                    "rotation": row.rotation,
+                })
+
+                # con anchor hallado no se sigue buscando en páginas anteriores
+                if strategy_used.startswith("anchor:"):
+                    break
+
+            except Exception as e:
+                _append_error(err_rows, pdf_name, f"process_page_{p1}", e)
+
+    template = None
+    if fingerprint and not template_hit:
+        # solo hits verificables: una página sin anchor ni línea ({}) se vuelve a buscar
+        learned = {p1: hit for p1, hit in page_hits.items() if p1 in ocr_pages and hit}
+        if learned:
+            template = (fingerprint, learned)
+    return placements, template
+
+def _stamp_placements(doc, pdf_path: Path, placements: list[dict], ctx: dict, err_rows: list,
+                      previews: dict | None = None) -> list[dict]:
+    """
+    Estampa (o, en dry-run, genera la vista previa de) cada colocación.
+    No extrae texto ni dibujos. Retorna las colocaciones aplicadas.
+    Las vistas previas van a previews/<pdf>/ o, si se pasa previews, a ese
+    dict como {página: JPEG}.
+    """
+    img_bytes = ctx["img_bytes"]
+    assets = ctx["signature"]
+    name = _file_key(pdf_path, ctx)
+    applied = []
+    sig_xrefs: dict[str, int] = {}  # variante de la firma -> xref ya embebido en este documento
+    for pl in placements:
+        p1 = pl["page"]
+        rect = fitz.Rect(pl["x"], pl["y"], pl["x"] + pl["w"], pl["y"] + pl["h"])
+        if ctx["dry_run"]:
+            try:
+                # Vista previa sobre una copia de la página: doc queda intacto
+                if previews is not None:
+                    previews[p1] = render_preview(doc, p1 - 1, rect, img_bytes, pl["rotation"])
+                else:
+                    out_dir = Path("previews") / Path(name).with_suffix("")
+                    out_dir.mkdir(parents=True, exist_ok=True)
+                    render_preview(doc, p1 - 1, rect, img_bytes, pl["rotation"], out_dir / f"page-{p1}.jpg")
+            except Exception as e:
+                _append_error(err_rows, name, f"dry_run_render_page_{p1}", e)
+        else:
+            try:
+                if not 1 <= p1 <= doc.page_count:
+                    raise IndexError(f"página {p1} fuera de rango (1-{doc.page_count})")
+                # variante reducida a signature.target_dpi para este tamaño (o la original)
+                variant = assets.variant(pl["w"], pl["h"], pl["rotation"])
+                assets.insert(doc[p1 - 1], rect, variant, pl["rotation"], sig_xrefs)
+            except Exception as e:
+                _append_error(err_rows, name, f"insert_image_page_{p1}", e)
+                continue
+        applied.append(pl)
+    return applied
+
+def _count_affected(placements: list[dict]) -> int:
+    # >>> ADD: contadores para match_source (line_detection no cuenta, como antes)
+    return sum(
+        1 for pl in placements
+        if (pl["strategy"] or "").startswith(("anchor:", "relative:")) or pl["strategy"] == "absolute_xy"
+    )
+
+def _decide_match_source(had_rule: bool, had_manifest_rows: bool, placements: list[dict]) -> tuple[str, str]:
+    # >>> ADD: decidir match_source por archivo
+    any_anchor_used = any((pl["strategy"] or "").startswith("anchor:") for pl in placements)
+    if had_rule and any_anchor_used:
+        return _MatchSource.RULES_MATCH, ""
+    if had_rule and not any_anchor_used:
+        return _MatchSource.RULES_FALLBACK, "anchors_not_found_or_unused"
+    if (not had_rule) and had_manifest_rows:
+        return _MatchSource.NO_RULES_MANIFEST, "no_rule_matched_used_manifest"
+    return _MatchSource.NO_RULES_DEFAULT, "no_rule_no_manifest_default_xy"
+
+def _placement_log_row(file_name: str, pl: dict) -> dict:
+    return {
+        "file": file_name,
+        "page": pl["page"],
+        "strategy": pl["strategy"],
+        "x": round(pl["x"], 2),
+        "y": round(pl["y"], 2),
+        "w": round(pl["w"], 2),
+        "h": round(pl["h"], 2),
+        "rotation": pl["rotation"],
+    }
+
+def _output_path(result: dict, ctx: dict) -> Path:
+    return ctx["output_dir"] / result["file"]  # subcarpetas de input_dir replicadas en output_dir
+
+def _save_output(pdf_bytes: bytes | None, pdf_path: Path, ctx: dict, result: dict) -> None:
+    """
+    Guarda el PDF estampado, lo marca/mueve si requiere revisión y arma la fila
+    del reporte (match_source, regla, motivo y páginas vienen en result).
+    pdf_bytes None: _stamp_document ya lo guardó en _output_path (lote).
+    """
+    match_source = result["match_source"]
+    try:
+        out_path = _output_path(result, ctx)
+        t0 = time.perf_counter()
+        if pdf_bytes is not None:
+            out_path.parent.mkdir(parents=True, exist_ok=True)
+            out_path.write_bytes(pdf_bytes)
+            result["out_bytes"] = len(pdf_bytes)
+        # costo de salida por modo (serializar + escribir) en cada fila del placement_log
+        save_ms = result.get("save_ms", 0.0) + (time.perf_counter() - t0) * 1000
+        for row in result["placements"]:
+            row.update(save_mode=result.get("save_mode", ""), save_ms=round(save_ms, 1),
+                       out_bytes=result["out_bytes"])
+
+        # >>> ADD: marcar/mover y reporte CSV
+        final_path = out_path
+        if ctx["mark_enabled"] and _should_flag(match_source):
+            final_path = _review_path(out_path, ctx)
+            if final_path != out_path:
+                out_path.replace(final_path)
+        result["output_path"] = str(final_path)
+
+        if ctx["write_report"]:
+            # El reporte lo escribe el proceso principal, en orden
+            result["report"] = dict(
+                filename=result["file"],
+                match_source=match_source,
+                rule_name=result["rule_name"],
+                reason=result["reason"],
+                pages_affected=result["pages_affected"],
+                output_path=final_path
+            )
+        # >>> END ADD
+
+    except Exception as e:
+        _append_error(result["errors"], result["file"], "save_pdf", e)
+
+def _open_document(pdf_path: Path, err_rows: list, data: bytes | None = None, name: str | None = None):
+    name = name or pdf_path.name
+    try:
+        doc = fitz.open(pdf_path) if data is None else fitz.open(stream=data, filetype="pdf")
+    except Exception as e:
+        _append_error(err_rows, name, "open_pdf", e)
+        return None
+    if doc.page_count <= 0:
+        _append_error(err_rows, name, "validate_pdf", ValueError("PDF sin páginas"))
+        doc.close()
+        return None
+    return doc
+
+def _new_result(pdf_path: Path, ctx: dict | None = None) -> dict:
+    name = _file_key(pdf_path, ctx) if ctx is not None else pdf_path.name
+    return {"file": name, "placements": [], "errors": [], "report": None}
+
+def _analyze_for(doc, pdf_name: str, ctx: dict, rule, rows, had_manifest_rows: bool, result: dict,
+                 timer: StageTimer | None = None):
+    """
+    Análisis de _stamp_document: colocaciones + match_source.
+    Retorna (colocaciones, match_source, motivo, nombre_regla); deja la
+    plantilla aprendida en result["template"].
+    """
+    eff_rule = rule or ctx["plan"].default_rule  # defaults de rules.yaml ya aplicados
+    timer = timer or StageTimer()
+    with timer.stage("analyze"):
+        placements, template = _analyze_document(doc, pdf_name, ctx, eff_rule, rows, result["errors"], timer)
+    if template:
+        result["template"] = template
+    match_source, reason = _decide_match_source(rule is not None, had_manifest_rows, placements)
+    return placements, match_source, reason, (rule.name if rule else "")
+
+def _stamp_document(data, pdf_path: Path, ctx: dict, rule, rows, had_manifest_rows: bool, result: dict,
+                    planned: tuple | None = None, previews: dict | None = None,
+                    timer: StageTimer | None = None, out_path: Path | None = None) -> None:
+    """
+    Núcleo en memoria del lote, del servicio HTTP y de api.stamp_pdf: abre el
+    PDF desde bytes, lo analiza (o usa planned = (colocaciones, match_source,
+    motivo, regla) de un plan) y lo estampa. Deja en result "placements" (filas
+    del log), match_source, rule_name, reason, pages_affected, "plan" (fase
+    analyze) y "pdf" (bytes estampados; None en dry-run/analyze o si no abre).
+    Solo toca disco para las vistas previas de dry-run cuando previews es None,
+    o con out_path (lote): ahí guarda con doc.save y deja result["saved"] en
+    lugar de "pdf".
+    Los tiempos por etapa quedan en result["timings"] (ms) y las páginas en result["pages"].
+    """
+    result["pdf"] = None
+    timer = timer or StageTimer()
+    name = result["file"]
+    with timer.stage("open"):
+        doc = _open_document(pdf_path, result["errors"], data=data, name=name)
+    if doc is None:
+        result["timings"] = timer.rounded()
+        return
+    result["pages"] = doc.page_count
+
+    try:
+        if planned is None:
+            placements, match_source, reason, rule_name = _analyze_for(doc, name, ctx, rule, rows,
+                                                                       had_manifest_rows, result, timer)
+        else:
+            placements, match_source, reason, rule_name = planned
+        result.update(match_source=match_source, rule_name=rule_name or "", reason=reason)
+
+        if ctx["phase"] == "analyze":
+            result["plan"] = [
+                dict(file=name, match_source=match_source, rule_name=rule_name or "",
+                     reason=reason, **{k: (round(v, 4) if isinstance(v, float) else v) for k, v in pl.items()})
+                for pl in placements
+            ] or [plan_marker(name, match_source, reason, rule_name or "")]
+            if ctx["dry_run"]:
+                with timer.stage("preview"):
+                    placements = _stamp_placements(doc, pdf_path, placements, ctx, result["errors"], previews)
+        else:
+            with timer.stage("preview" if ctx["dry_run"] else "stamp"):
+                placements = _stamp_placements(doc, pdf_path, placements, ctx, result["errors"], previews)
+            if not ctx["dry_run"]:
+                t0 = time.perf_counter()
+                with timer.stage("save"):
+                    if out_path is None:
+                        result["pdf"], result["save_mode"] = serialize(doc, ctx["save_mode"], len(data))
+                    else:
+                        try:
+                            out_path.parent.mkdir(parents=True, exist_ok=True)
+                            result["out_bytes"], result["save_mode"] = save_to(doc, out_path, ctx["save_mode"],
+                                                                               len(data))
+                            result["saved"] = True
+                        except Exception as e:
+                            _append_error(result["errors"], name, "save_pdf", e)
+                result["save_ms"] = (time.perf_counter() - t0) * 1000
+
+        result["pages_affected"] = _count_affected(placements)
+        result["placements"] = [_placement_log_row(name, pl) for pl in placements]
+    finally:
+        result["timings"] = timer.rounded()
+        try:
+            doc.close()
+        except Exception:
+            pass
+
+def _read_pdf(pdf_path: Path, err_rows: list, name: str | None = None) -> bytes | None:
+    try:
+        return pdf_path.read_bytes()
+    except OSError as e:
+        _append_error(err_rows, name or pdf_path.name, "open_pdf", e)
+        return None
+
+def _finish_output(result: dict, pdf_path: Path, ctx: dict, timer: StageTimer) -> None:
+    """Guarda el PDF estampado (si lo hay) y deja los tiempos por etapa en el log si log_timings."""
+    pdf_bytes = result.pop("pdf")
+    if pdf_bytes is not None or result.pop("saved", False):
+        with timer.stage("write"):
+            _save_output(pdf_bytes, pdf_path, ctx, result)
+    result["timings"] = timer.rounded()
+    if ctx["log_timings"]:
+        columns = timing_columns(result["timings"])
+        for row in result["placements"]:
+            row.update(columns)
+
+def _process_file(pdf_path: Path, ctx: dict) -> dict:
+    """
+    Procesa un PDF completo (análisis + estampado + guardado).
+    Retorna {"file", "placements": [...], "errors": [...], "report": dict | None, ...};
+    no escribe logs, así el resultado puede venir de un worker.
+    En la fase analyze agrega "plan" y no guarda el PDF.
+    """
+    plan = ctx["plan"]
+    result = _new_result(pdf_path, ctx)
+    name = result["file"]
+    error_rows = result["errors"]
+
+    rule = plan.pick(pdf_path.name)  # match de rules.yaml: solo el nombre del archivo
+    eff_rule = rule or plan.default_rule  # defaults de rules.yaml ya aplicados
+    # manifest: la ruta relativa ("sub/contrato.pdf") o, si no está, el nombre
+    rows, had_manifest_rows = ctx["manifest"].rows_for(name)
+    if not had_manifest_rows and name != pdf_path.name:
+        rows, had_manifest_rows = ctx["manifest"].rows_for(pdf_path.name)
+    timer = StageTimer()
+
+    # Una sola lectura: el mismo buffer sirve para la clave de caché y para abrir el PDF
+    with timer.stage("read"):
+        data = _read_pdf(pdf_path, error_rows, name)
+    if data is None:
+        return result
+
+    result_cache = ctx["result_cache"]
+    if result_cache is not None:
+        try:
+            # con la ruta relativa: copias idénticas en otras carpetas tienen su propia salida
+            cache_key = stable_hash([hashlib.sha256(data).hexdigest(), name, eff_rule.fingerprint, repr(rows),
+                                     ctx["sig_hash"], ctx["cfg_hash"]])
+            result["cache_key"] = cache_key
+            entry = None if ctx["force"] else result_cache.get(cache_key)
+            if entry and Path(entry["output_path"]).exists():
+                print(f"[INFO] Sin cambios (caché): {pdf_path}")
+                result.update(placements=entry["placements"], report=entry["report"], cached=True,
+                              output_path=entry["output_path"], match_source=entry.get("match_source", ""))
+                return result
+        except Exception as e:
+            _append_error(error_rows, name, "result_cache", e)
+
+    print(f"[INFO] Procesando: {pdf_path}")
+    _stamp_document(data, pdf_path, ctx, rule, rows, had_manifest_rows, result, timer=timer,
+                    out_path=_output_path(result, ctx))
+    _finish_output(result, pdf_path, ctx, timer)
+    return result
+
+def _apply_file(job: tuple[Path, list[dict]], ctx: dict) -> dict:
+    """
+    Fase apply: estampa directamente desde las filas del plan, sin extraer
+    texto ni buscar líneas. match_source/motivo salen del plan.
+    """
+    pdf_path, plan_rows = job
+    if all(is_marker(r) for r in plan_rows) and not plan_rows[0]["match_source"]:
+        # no se pudo analizar en --analyze (no abrió, worker muerto): se analiza ahora
+        return _process_file(pdf_path, ctx)
+    result = _new_result(pdf_path, ctx)
+    error_rows = result["errors"]
+    timer = StageTimer()
+
+    print(f"[INFO] Aplicando plan: {pdf_path}")
+    with timer.stage("read"):
+        data = _read_pdf(pdf_path, error_rows, result["file"])
+    if data is None:
+        return result
+
+    # las filas marcador (page vacía) no estampan nada: el PDF queda como sin firmas
+    placements = [{k: r[k] for k in ("page", "strategy", "x", "y", "w", "h", "rotation")}
+                  for r in plan_rows if not is_marker(r)]
+    first = plan_rows[0]
+    _stamp_document(data, pdf_path, ctx, None, (), False, result,
+                    planned=(placements, first["match_source"], first["reason"], first["rule_name"]), timer=timer,
+                    out_path=_output_path(result, ctx))
+    _finish_output(result, pdf_path, ctx, timer)
+    return result
+
+def _failed_plan_marker(result: dict) -> dict:
+    """
+    Fila marcador del plan para un PDF que no se pudo analizar (motivo: primer
+    error). Sin match_source: --apply lo analiza en lugar de estamparlo vacío.
+    """
+    first = result["errors"][0] if result["errors"] else None
+    reason = f"{first['where']}: {first['error']}" if first else "not_analyzed"
+    return plan_marker(result["file"], "", reason)
+
+def _isolation_failure(job, where: str, message: str, ctx: dict) -> dict:
+    """
+    Resultado de un PDF cuyo worker aislado se mató (timeout / memory_limit) o
+    murió: se registra el error y el original va a revisión manual, como un
+    no coincidente (a la subcarpeta si mark_unmatched no lo marcaría).
+    """
+    pdf_path = _job_path(job)
+    result = _new_result(pdf_path, ctx)
+    name = result["file"]
+    result["isolation"] = where
+    exc = {_MatchSource.TIMEOUT: TimeoutError, _MatchSource.MEMORY_LIMIT: MemoryError}.get(where, RuntimeError)
+    _append_error(result["errors"], name, where, exc(message))
+    print(f"[ERROR] {name}: {where} ({message})")
+    if ctx["dry_run"] or ctx["phase"] == "analyze":
+        return result
+
+    try:
+        out_path = ctx["output_dir"] / name
+        final_path = _review_path(out_path, ctx, force_subfolder=not ctx["mark_enabled"])
+        if final_path == out_path:  # sin prefijo/sufijo: no dejarlo como si estuviera estampado
+            final_path = _review_path(out_path, ctx, force_subfolder=True)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(pdf_path, final_path)
+        result["output_path"] = str(final_path)
+        result["match_source"] = where
+        if ctx["write_report"]:
+            result["report"] = dict(filename=name, match_source=where, rule_name="",
+                                    reason=message, pages_affected=0, output_path=final_path)
+    except Exception as e:
+        _append_error(result["errors"], name, "review_copy", e)
+    return result
+
+def _resolve_request(ctx: dict, filename: str, rule_name: str | None, rows: list[dict] | None):
+    """
+    Regla y filas para un PDF suelto (servicio HTTP / api.stamp_pdf).
+    rule_name fuerza una regla; rows (filas tipo manifest) reemplazan al manifest.
+    Retorna (regla | None, filas compiladas, hubo_filas_propias). ValueError si algo no es válido.
+    """
+    plan = ctx["plan"]
+    if rule_name:
+        rule = plan.by_name(rule_name)
+        if rule is None:
+            raise ValueError(f"Regla desconocida: {rule_name!r}")
+    else:
+        rule = plan.pick(filename)
+    if not rows:
+        compiled, had_manifest_rows = ctx["manifest"].rows_for(filename)
+        return rule, compiled, had_manifest_rows
+    try:
+        compiled = tuple(compile_row(r, ctx["cfg"], plan.default_scale, plan.default_keep_aspect) for r in rows)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f"Fila inválida: {e}") from None
+    return rule, compiled, True
+
+def _stamp_bytes(job: tuple[str, bytes, str | None, dict | None], ctx: dict) -> dict:
+    """
+    Servicio HTTP: estampa un PDF recibido en memoria, con el mismo núcleo que
+    el lote. job = (nombre, bytes, regla forzada | None, fila tipo manifest | None).
+    Retorna el resultado de siempre más "pdf" (bytes estampados, None si no se pudo).
+    Lanza ValueError si la regla o la fila no son válidas.
+    """
+    filename, data, rule_name, overrides = job
+    pdf_path = Path(filename)
+    rule, rows, had_manifest_rows = _resolve_request(ctx, pdf_path.name, rule_name,
+                                                     [overrides] if overrides else None)
+    result = _new_result(pdf_path)
+    try:
+        _stamp_document(data, pdf_path, ctx, rule, rows, had_manifest_rows, result)
+    except Exception as e:
+        result["pdf"] = None
+        _append_error(result["errors"], pdf_path.name, "stamp_bytes", e)
+    return result
+
+def _memory_context(plan, signature, cfg: dict | None = None, dry_run: bool = False,
+                    save_mode: str = "full") -> dict:
+    """
+    Contexto del núcleo para api.stamp_pdf: reglas y firma ya cargadas, sin
+    carpetas, manifest, cachés en disco ni registro del lote.
+    """
+    cfg = dict(cfg or {})
+    ocr = compile_ocr_settings(cfg)
+    return {
+        "cfg": cfg,
+        "dry_run": dry_run,
+        "phase": None,
+        "plan": plan,
+        "manifest": compile_manifest({}, cfg, rule_scale=plan.default_scale,
+                                     rule_keep_aspect=plan.default_keep_aspect),
+        "ocr": ocr if ocr.enabled else None,
+        "ocr_cache": OcrCache(None),
+        "img_bytes": signature.png,
+        "img_w": signature.width,
+        "img_h": signature.height,
+        "signature": SignatureAssets(signature.png, signature.width, signature.height,
+                                     replace(compile_signature_settings(cfg), cache_dir=None)),
+        "template_cache": None,
+        "force": False,
+        "save_mode": check_save_mode(save_mode),
+        "log_timings": False,
+    }
+
+# -------- Pool de procesos (--workers N) --------
+MAX_RETRY_BACKOFF = 60.0  # segundos, tope de la espera entre reintentos
+PROFILE_TOP = 40          # funciones en el resumen .txt de --profile
+_WORKER_CTX: dict | None = None
+
+def _worker_init(cfg: dict):
+    # Cada worker carga reglas, manifest y firma una sola vez
+    global _WORKER_CTX
+    _WORKER_CTX = _build_context(cfg)
+
+def _worker_call(func, job) -> dict:
+    return func(job, _WORKER_CTX)
+
+def _job_path(job) -> Path:
+    # job = Path (normal/analyze) o (Path, filas del plan) (apply)
+    return job[0] if isinstance(job, tuple) else job
+
+def _resolve_workers(value) -> int:
+    try:
+        n = int(value or 1)
+    except (TypeError, ValueError):
+        n = 1
+    if n <= 0:
+        n = os.cpu_count() or 1
+    return n
+
+def _isolation_limits(cfg: dict) -> tuple[float, int]:
+    """(job_timeout en s, job_memory_mb en bytes); 0 = sin límite."""
+    timeout = max(0.0, float(cfg.get("job_timeout") or 0))
+    memory = max(0, int(float(cfg.get("job_memory_mb") or 0) * (1 << 20)))
+    return timeout, memory
+
+def _profiled(func, profile_dir: str, job, ctx: dict) -> dict:
+    """
+    func(job, ctx) bajo cProfile (--profile): deja <pdf>.prof (pstats, p.ej.
+    para snakeviz) y <pdf>.txt con las funciones de mayor tiempo acumulado.
+    """
+    out_dir = Path(profile_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stem = _job_path(job).stem
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(func, job, ctx)
+    finally:
+        try:
+            prof.dump_stats(out_dir / f"{stem}.prof")
+            with (out_dir / f"{stem}.txt").open("w", encoding="utf-8") as f:
+                pstats.Stats(prof, stream=f).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        except Exception as e:
+            print(f"[WARN] profile {stem}: {e}")
+
+def _tracked(jobs, queued: deque):
+    """Genera los jobs anotándolos en queued: los resultados llegan en el mismo orden."""
+    for job in jobs:
+        queued.append(job)
+        yield job
+
+def _iter_results(jobs, cfg: dict, ctx: dict, workers: int, func=_process_file, count: int | None = None):
+    """
+    Ejecuta func(job, ctx) por cada job y genera los resultados en el mismo orden.
+    jobs puede ser un generador (descubrimiento en curso); count = cantidad si se conoce.
+    """
+    if cfg.get("profile_dir"):
+        func = functools.partial(_profiled, func, str(cfg["profile_dir"]))
+    timeout, memory = _isolation_limits(cfg)
+    if timeout or memory:
+        # Con límites cada PDF corre en un proceso que se puede matar (aunque workers sea 1)
+        pool = IsolatedPool(workers, _worker_init, cfg, _worker_call,
+                            functools.partial(_isolation_failure, ctx=ctx),
+                            timeout=timeout, memory_limit=memory)
+        yield from pool.imap(func, jobs)
+        return
+
+    if workers <= 1 or (count is not None and count <= 1):
+        for job in jobs:
+            yield func(job, ctx)
+        return
+
+    mp = multiprocessing.get_context("spawn")
+    with mp.Pool(processes=min(workers, count or workers),
+                 initializer=_worker_init, initargs=(cfg,)) as pool:
+        # imap conserva el orden de entrada -> logs deterministas
+        yield from pool.imap(functools.partial(_worker_call, func), jobs, chunksize=1)
+
+def process_batch(cfg: dict, auto_confirm: bool = False, files: list[Path] | None = None,
+                  ctx: dict | None = None):
+    """
+    Procesa los PDFs de input_dir (o el plan en la fase apply).
+    files / ctx los usa --watch: solo esos archivos, con el contexto ya cargado;
+    los logs y el registro del lote se agregan a los existentes.
+    """
     input_dir = Path(cfg["input_dir"])
     output_dir = Path(cfg["output_dir"])
     output_dir.mkdir(parents=True, exist_ok=True)
 
-    manifest = load_manifest(cfg.get("manifest_csv"))
     dry_run = bool(cfg.get("dry_run"))
     previews_dir = Path("previews") if dry_run else None
     if previews_dir:
         previews_dir.mkdir(parents=True, exist_ok=True)
 
-    rules_cfg = load_rules(cfg.get("rules_yaml"))
     outlog_path = Path(cfg.get("outlog", "output/placement_log.csv"))
     outlog_path.parent.mkdir(parents=True, exist_ok=True)
 
-    placement_rows = []
-    error_rows = []
-    error_log_path = output_dir / "error_log.csv"
+    # --resume continua el lote anterior: los logs se agregan en lugar de truncarse
+    resume = bool(cfg.get("resume"))
+    append_logs = resume or files is not None
+    retries = max(0, int(cfg.get("retries") or 0))
+    retry_backoff = float(cfg.get("retry_backoff", 2.0))
 
-    # >>> ADD: leer configuración de marcado/movido y reporte
-    mark_cfg = (cfg.get("output", {}) or {}).get("mark_unmatched", {}) or {}
-    mark_enabled = bool(mark_cfg.get("enabled", False))
-    mark_prefix = mark_cfg.get("prefix", "")
-    mark_suffix = mark_cfg.get("suffix", "")
-    move_to_subfolder = bool(mark_cfg.get("move_to_subfolder", False))
-    target_subfolder = mark_cfg.get("subfolder", "manual_review")
-    write_report = bool(mark_cfg.get("write_report", False))
-    report_path = Path(mark_cfg.get("report_path", output_dir / "unmatched_pdfs.csv"))
-    # >>> END ADD
-
-    default_x = cfg.get("x", 0)
-    default_y = cfg.get("y", 0)
-    default_width = cfg.get("width")
-    default_height = cfg.get("height")
-    default_rotation = cfg.get("rotation", 0)
-    default_scale = cfg.get("scale")
-    default_keep_aspect = bool(cfg.get("keep_aspect", True))
-    default_page = cfg.get("page", 1)
-    default_range = cfg.get("stamp_page_range")
+    # error_log solo se crea si hay errores (como antes); CSV o .jsonl según la extensión
+    error_log_path = Path(cfg.get("error_log") or output_dir / "error_log.csv")
+    error_sink = LogSink(error_log_path, ERROR_FIELDS, append=append_logs, lazy=True)
 
+    plan_path = cfg.get("plan_path")
     try:
-        img_bytes, img_w, img_h = get_signature(cfg)
+        if ctx is None:
+            ctx = _build_context(cfg)
+        phase = ctx["phase"]
+        if phase and not plan_path:
+            raise ValueError(f"La fase {phase} requiere la ruta del plan (plan_path)")
+        plan_by_file = read_plan(plan_path) if phase == "apply" else None
     except Exception as e:
-        _append_error(error_rows, "(global)", "load_signature", e)
-        with error_log_path.open("w", newline="", encoding="utf-8") as ef:
-            w = csv.DictWriter(ef, fieldnames=["file", "where", "error", "stack"])
-            w.writeheader()
-            w.writerows(error_rows)
+        _append_error(error_sink, "(global)", "load_context", e)
+        error_sink.close()
         raise
     
     # -------- DESCUBRIR PDFs + RESUMEN + CONFIRMACIÓN --------
-    pdf_files = sorted([p for p in input_dir.glob("*.pdf") if p.is_file()])
+    if phase == "apply":
+        # apply: los archivos y colocaciones salen del plan, no de input_dir
+        jobs = [(input_dir / name, rows) for name, rows in plan_by_file.items()]
+        func = _apply_file
+        source = plan_path
+    elif files is not None:
+        jobs = sorted(files)
+        func = _process_file
+        source = input_dir
+    else:
+        # os.scandir + filtros de discovery; la salida (si está dentro de input_dir) no se recorre
+        jobs = iter_pdfs(input_dir, ctx["discovery"], skip_dirs=(output_dir, Path("previews")))
+        func = _process_file
+        source = input_dir
+    # Con -y el lote arranca mientras se descubren los PDFs; para confirmar hace falta la lista
+    streaming = not isinstance(jobs, list) and auto_confirm
+    if not streaming:
+        jobs = list(jobs)
+
+    ledger = ctx["ledger"]
+    attempts: dict[str, int] = {}  # intentos previos por archivo (de lotes anteriores, al reanudar)
+    if ledger is not None and streaming:
+        # Cada PDF se registra al empezar (ledger.start); los no descubiertos aún
+        # no figuran y --resume los trata como pendientes
+        if resume:
+            states = ledger.states()
+            attempts = {name: st[1] for name, st in states.items()}
+            jobs = (job for job in jobs
+                    if is_unfinished(states.get(_file_key(_job_path(job), ctx)), retries + 1))
+            typer.echo("[INFO] Reanudando: se omiten los PDFs terminados o sin reintentos")
+        else:
+            ledger.reset([])
+    elif ledger is not None:
+        names = [_file_key(_job_path(job), ctx) for job in jobs]
+        if files is not None:
+            ledger.register(names)
+        elif resume:
+            ledger.register(names)
+            states = ledger.states()
+            attempts = {name: st[1] for name, st in states.items()}
+            jobs = [job for job, name in zip(jobs, names) if is_unfinished(states.get(name), retries + 1)]
+            typer.echo(f"[INFO] Reanudando: {len(names) - len(jobs)} PDF(s) omitidos (terminados o sin reintentos), "
+                       f"{len(jobs)} por procesar")
+        else:
+            ledger.reset(names)
+    elif resume:
+        typer.echo("[WARN] --resume no aplica en dry-run ni en --analyze; se procesa todo")
 
-    if not pdf_files:
+    if streaming:
+        recursive = " y subcarpetas" if ctx["discovery"].recursive else ""
+        typer.echo(f"[INFO] Procesando los PDFs de {source}{recursive} a medida que se encuentran")
+    elif not jobs:
         typer.echo("[INFO] No se encontraron PDFs para procesar en la carpeta de entrada.")
     else:
+        pdf_files = [_job_path(job) for job in jobs]
         total = len(pdf_files)
-        preview = "\n".join(f"  • {p.name}" for p in pdf_files[:10])
+        preview = "\n".join(f"  • {_file_key(p, ctx)}" for p in pdf_files[:10])
         if total > 10:
             preview += f"\n  … y {total - 10} más"
 
-        typer.echo(f"[INFO] Se encontraron {total} PDF(s) en {input_dir}")
+        typer.echo(f"[INFO] Se encontraron {total} PDF(s) en {source}")
         if preview:
             typer.echo(preview)
 
@@ -134,297 +1033,140 @@ def process_batch(cfg: dict, auto_confirm: bool = False):
                 typer.echo("Operación cancelada por el usuario.")
                 return
 
-    # -------- PROCESAMIENTO (usa la lista precomputada) --------
-    for pdf_path in pdf_files:
-        print(f"[INFO] Procesando: {pdf_path}") 
-        try:
-            doc = fitz.open(pdf_path)
-        except Exception as e:
-            _append_error(error_rows, pdf_path.name, "open_pdf", e)
-            continue
-
-        try:
-            page_count = doc.page_count
-            if page_count <= 0:
-                _append_error(error_rows, pdf_path.name, "validate_pdf", ValueError("PDF sin páginas"))
-                doc.close()
-                continue
+    # -------- PROCESAMIENTO (lista precomputada o PDFs a medida que se descubren) --------
+    count = None if streaming else len(jobs)
+    workers = _resolve_workers(cfg.get("workers"))
+    if workers > 1 and (count is None or count > 1):
+        typer.echo(f"[INFO] Procesando con {workers} workers")
+    if cfg.get("profile_dir"):
+        typer.echo(f"[INFO] Perfilando cada PDF con cProfile en {cfg['profile_dir']} (los tiempos incluyen su costo)")
+    timeout, memory = _isolation_limits(cfg)
+    if timeout or memory:
+        typer.echo(f"[INFO] Un proceso aislado por PDF (límites: "
+                   f"{f'{timeout:g}s' if timeout else 'sin tiempo'}, "
+                   f"{f'{memory >> 20} MB' if memory else 'sin memoria'})")
+        if memory and rss_bytes(os.getpid()) is None:
+            typer.echo("[WARN] No se puede medir la memoria de los procesos en este sistema "
+                       "(instalar psutil); job_memory_mb no se aplicará")
 
-            try:
-                rule = pick_rule_for(pdf_path.name, rules_cfg)
-                defaults_rule = rules_cfg.get("defaults", {}) or {}
-            except Exception as e:
-                _append_error(error_rows, pdf_path.name, "load_rules_for_file", e)
-                rule = None
-                defaults_rule = {}
-
-            #rows = manifest.get(pdf_path.name.lower(), []) or [dict()]
-            name_l = pdf_path.name.lower()
-            rows = manifest.get(name_l, []) or manifest.get("*", []) or manifest.get("__default__", []) or [dict()]
-
-
-            # >>> ADD: indicadores para decidir match_source al final
-            had_rule = bool(rule)
-            had_manifest_rows = manifest.get(pdf_path.name.lower(), None) not in (None, [])
-            any_anchor_used = False
-            any_relative_used = False
-            any_absolute_used = False
-            pages_affected = 0
-            # >>> END ADD
-
-            for row in rows:
-                try:
-                    row_range = row.get("stamp_page_range") if row else None
+    # Logs abiertos una vez por lote y escritos a medida que llegan los resultados
+    # (en orden, desde el proceso principal): un corte deja los logs parciales.
+    placement_fields = PLACEMENT_FIELDS + (TIMING_FIELDS if ctx["log_timings"] else [])
+    placement_sink = LogSink(outlog_path, placement_fields, append=append_logs)
+    report_sink = (LogSink(ctx["report_path"], UNMATCHED_FIELDS, append=True, lazy=True)
+                   if ctx["write_report"] else None)
+    result_cache = ctx["result_cache"]
+    template_cache = ctx["template_cache"]
+    metrics_file = textfile_writer(cfg)  # metrics.textfile (node_exporter), actualizado durante el lote
+    plan_rows = []
+    try:
+        real_run = not dry_run and phase != "analyze"
+        batch_timings = BatchTimings()
+        batch_t0 = time.perf_counter()
+        METRICS.batch_started(count or 0)
+        attempt = 1  # ronda dentro de esta ejecución
+        processed = 0
+        still_failed: set[str] = set()
+        while True:
+            failed = []
+            queued = deque()  # jobs entregados al pool, en orden: el resultado i es de queued[i]
+            marked = 0  # los primeros `marked` de queued ya están in_progress en el registro
+            for result in _iter_results(_tracked(jobs, queued), cfg, ctx, workers, func, count):
+                if ledger is not None:
+                    # El registro lo escribe solo este proceso: in_progress para lo entregado
+                    # desde el último resultado (queued lo llena el hilo que alimenta al pool)
+                    pending = len(queued)
+                    for i in range(marked, pending):
+                        name = _file_key(_job_path(queued[i]), ctx)
+                        try:
+                            ledger.start(name)
+                        except Exception as e:
+                            _append_error(error_sink, name, "ledger", e)
+                    marked = pending - 1
+                job = queued.popleft()
+                processed += 1
+                placement_sink.extend(result["placements"])
+                batch_timings.add(result)
+                if phase == "analyze":
+                    # sin filas (no abrió, worker muerto): una fila marcador para que --apply no lo omita
+                    plan_rows.extend(result.get("plan") or [_failed_plan_marker(result)])
+                error_sink.extend(result["errors"])
+                if result["report"] and report_sink is not None:
+                    report_sink.append(_unmatched_row(**result["report"]))
+                # Solo se cachean archivos terminados sin errores
+                if (result_cache is not None and result.get("cache_key") and not result.get("cached")
+                        and not result["errors"] and result.get("output_path")):
                     try:
-                        search_last = int(
-                            ((rule or {}).get("search_last_pages")
-                             or (rules_cfg.get("defaults", {}) or {}).get("search_last_pages")
-                             or 0)
-                        )
-                    except Exception:
-                        search_last = 0
-
-                    explicit_range = bool(row_range or default_range)
-                    explicit_page  = bool((row.get("page") if row else None) or cfg.get("page"))
-
-                    if explicit_range:
-                        pages = parse_page_range(row_range or default_range, page_count)
-                    elif explicit_page:
-                        page1 = int((row.get("page") if row else None) or cfg.get("page") or 1)
-                        pages = [min(max(page1, 1), page_count)]
-                    elif search_last > 0:
-                        start = max(1, page_count - search_last + 1)
-                        pages = list(range(start, page_count + 1))
-                    else:
-                        pages = [1]
-
-                except Exception as e:
-                    _append_error(error_rows, pdf_path.name, "resolve_pages", e)
-                    continue
-
-                prefer_last = (search_last > 0) and not explicit_range and not explicit_page
-                iter_pages = reversed(pages) if prefer_last else pages
-                placed_on_this_row = False
-
-                try:
-                    def _f(v):
-                        v = (v or "").strip() if isinstance(v, str) else v
-                        return None if v in ("", None) else v
-                    
-                    # NUEVO: leer crudo del manifest
-                    row_x_raw = _f(row.get("x"))
-                    row_y_raw = _f(row.get("y"))
-                    row_has_xy = (row_x_raw is not None) or (row_y_raw is not None)
-
-                    x = float(_f(row.get("x")) or default_x)
-                    y = float(_f(row.get("y")) or default_y)
-                    width = _f(row.get("width")) or default_width
-                    height = _f(row.get("height")) or default_height
-                    width = float(width) if width is not None else None
-                    height = float(height) if height is not None else None
-                    scale = _f(row.get("scale")) or default_scale or defaults_rule.get("scale")
-                    scale = float(scale) if scale is not None else None
-                    rotation = int(_f(row.get("rotation")) or default_rotation)
-                    keep_aspect = str(_f(row.get("keep_aspect")) or default_keep_aspect or defaults_rule.get("keep_aspect", True)).lower() == "true"
-
-                    sig_w, sig_h = _calc_sig_size(img_w, img_h, width, height, scale, keep_aspect)
-                except Exception as e:
-                    _append_error(error_rows, pdf_path.name, "resolve_geometry", e)
-                    continue
-
-                for p1 in iter_pages:
+                        result_cache.put(result["cache_key"], result["file"], result["output_path"],
+                                         result["placements"], result["report"], result.get("match_source", ""))
+                    except Exception as e:
+                        _append_error(error_sink, result["file"], "result_cache", e)
+                if template_cache is not None and result.get("template") and not result["errors"]:
                     try:
-                        page = doc.load_page(p1 - 1)
+                        template_cache.put(result["template"][0], result["file"], result["template"][1])
+                    except Exception as e:
+                        _append_error(error_sink, result["file"], "template_cache", e)
 
-                        strategy_used = None
-                        place_x, place_y = None, None
+                # Sin PDF de salida = fallido (no se pudo abrir/guardar); también si se mató el worker
+                ok = (bool(result.get("output_path")) and not result.get("isolation")) or not real_run
+                METRICS.observe(result, ok)
+                metrics_file.update()
+                attempts[result["file"]] = attempts.get(result["file"], 0) + 1
+                if ok:
+                    still_failed.discard(result["file"])
+                else:
+                    still_failed.add(result["file"])
+                    if attempts[result["file"]] <= retries:
+                        failed.append(job)
+                if ledger is not None:
+                    try:
+                        first_error = result["errors"][0]["error"] if result["errors"] else None
+                        ledger.finish(result["file"], ok, result.get("output_path"),
+                                      result.get("match_source"), first_error)
+                        if ledger.due():
+                            # Commit por tandas; primero los logs a disco y luego "done":
+                            # al reanudar no faltan filas
+                            for sink in (placement_sink, report_sink, error_sink):
+                                if sink is not None:
+                                    sink.flush()
+                            ledger.commit()
+                    except Exception as e:
+                        _append_error(error_sink, result["file"], "ledger", e)
 
-                        # 1) Anchor por texto
-                        try:
-                            anchor_list = (rule or {}).get("anchors") or defaults_rule.get("anchors")
-                            if anchor_list:
-                                found = find_anchor_bbox(page, anchor_list)
-                                if found:
-                                    bbox, anchor_rule = found
-                                    dx = anchor_rule.get("dx", 0)
-                                    dy = anchor_rule.get("dy", 0)
-                                    align = anchor_rule.get("align", "below_left")
-                                    place_x, place_y = compute_pos_from_anchor(bbox, align, dx, dy, sig_w, sig_h)
-                                    strategy_used = f"anchor:{anchor_rule.get('regex')}"
-                        except Exception as e:
-                            _append_error(error_rows, pdf_path.name, f"anchor_page_{p1}", e)
-
-                        # 2) Detección de línea
-                        if place_x is None:
-                            try:
-                                lcfg = ((rule or {}).get("line_detection") or {})
-                                if lcfg.get("enabled"):
-                                    min_w = lcfg.get("min_width")
-                                    dy_above_line = lcfg.get("dy_above_line", 10)
-                                    xy = find_signature_line(page, min_w, dy_above_line)
-                                    if xy:
-                                        lx, ly = xy
-                                        place_x, place_y = lx, ly
-                                        strategy_used = f"line_detection(min_width={min_w})"
-                            except Exception as e:
-                                _append_error(error_rows, pdf_path.name, f"line_detection_page_{p1}", e)
-
-                        # 3) Posición relativa (solo si el manifest NO trajo x/y)
-                        if place_x is None and not row_has_xy:
-                            try:
-                                fback = (rule or {}).get("fallback") or {}
-                                position = fback.get("position") or defaults_rule.get("position")
-                                margin_x = fback.get("margin_x", defaults_rule.get("margin_x"))
-                                margin_y = fback.get("margin_y", defaults_rule.get("margin_y"))
-                                offset_x = fback.get("offset_x", defaults_rule.get("offset_x"))
-                                offset_y = fback.get("offset_y", defaults_rule.get("offset_y"))
-                                if position:
-                                    place_x, place_y = place_by_position(page, position, sig_w, sig_h, margin_x, margin_y, offset_x, offset_y)
-                                    strategy_used = f"relative:{position}"
-                            except Exception as e:
-                                _append_error(error_rows, pdf_path.name, f"relative_pos_page_{p1}", e)
-
-
-                        # 4) Absoluto
-                        if place_x is None:
-                            place_x, place_y = x, y
-                            strategy_used = "absolute_xy"
-
-                        rect = fitz.Rect(place_x, place_y, place_x + sig_w, place_y + sig_h)
-
-                        if dry_run:
-                            try:
-                                page.insert_image(rect, stream=img_bytes, rotate=rotation)
-                                out_dir = (Path("previews") / Path(pdf_path.stem))
-                                out_dir.mkdir(parents=True, exist_ok=True)
-                                pix = page.get_pixmap()
-                                img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-                                img.save(out_dir / f"page-{p1}.jpg", format="JPEG", quality=92)
-
-                                if strategy_used and strategy_used.startswith("anchor:"):
-                                    placed_on_this_row = True
-                                    # >>> ADD: contadores para match_source
-                                    any_anchor_used = True
-                                    pages_affected += 1
-                                    # >>> END ADD
-                                elif strategy_used and strategy_used.startswith("relative:"):
-                                    any_relative_used = True
-                                    pages_affected += 1
-                                elif strategy_used == "absolute_xy":
-                                    any_absolute_used = True
-                                    pages_affected += 1
-
-                            except Exception as e:
-                                _append_error(error_rows, pdf_path.name, f"dry_run_render_page_{p1}", e)
-                            finally:
-                                try:
-                                    orig_path = doc.name
-                                    doc.close()
-                                    doc = fitz.open(orig_path)
-                                except Exception as e:
-                                    _append_error(error_rows, pdf_path.name, "dry_run_reopen_doc", e)
-                                    break
-                        else:
-                            try:
-                                page.insert_image(rect, stream=img_bytes, rotate=rotation)
-
-                                if strategy_used and strategy_used.startswith("anchor:"):
-                                    placed_on_this_row = True
-                                    # >>> ADD: contadores para match_source
-                                    any_anchor_used = True
-                                    pages_affected += 1
-                                    # >>> END ADD
-                                elif strategy_used and strategy_used.startswith("relative:"):
-                                    any_relative_used = True
-                                    pages_affected += 1
-                                elif strategy_used == "absolute_xy":
-                                    any_absolute_used = True
-                                    pages_affected += 1
-
-                            except Exception as e:
-                                _append_error(error_rows, pdf_path.name, f"insert_image_page_{p1}", e)
-                                continue
-
-                        placement_rows.append({
-                            "file": pdf_path.name,
-                            "page": p1,
-                            "strategy": strategy_used,
-                            "x": round(place_x, 2),
-                            "y": round(place_y, 2),
-                            "w": round(sig_w, 2),
-                            "h": round(sig_h, 2),
-                            "rotation": rotation
-                        })
-
-                        if placed_on_this_row:
-                            break
+            if not failed:
+                break
+            delay = min(retry_backoff * 2 ** (attempt - 1), MAX_RETRY_BACKOFF)
+            typer.echo(f"[INFO] Reintentando {len(failed)} PDF(s) fallidos en {delay:.1f}s "
+                       f"(máx. {retries + 1} intentos por PDF)")
+            time.sleep(delay)
+            jobs, count = failed, len(failed)
+            attempt += 1
 
-                    except Exception as e:
-                        _append_error(error_rows, pdf_path.name, f"process_page_{p1}", e)
-
-            # >>> ADD: decidir match_source por archivo
-            if had_rule and any_anchor_used:
-                match_source = _MatchSource.RULES_MATCH
-                reason = ""
-            elif had_rule and not any_anchor_used:
-                match_source = _MatchSource.RULES_FALLBACK
-                reason = "anchors_not_found_or_unused"
-            elif (not had_rule) and had_manifest_rows:
-                match_source = _MatchSource.NO_RULES_MANIFEST
-                reason = "no_rule_matched_used_manifest"
-            else:
-                match_source = _MatchSource.NO_RULES_DEFAULT
-                reason = "no_rule_no_manifest_default_xy"
-            # >>> END ADD
-
-            if not dry_run:
-                try:
-                    out_path = output_dir / pdf_path.name
-                    doc.save(out_path)
-
-                    # >>> ADD: marcar/mover y reporte CSV
-                    final_path = out_path
-                    if mark_enabled and _should_flag(match_source):
-                        if move_to_subfolder:
-                            sub_dir = output_dir / (target_subfolder or "manual_review")
-                            sub_dir.mkdir(parents=True, exist_ok=True)
-                            final_path = sub_dir / out_path.name
-                            if final_path != out_path:
-                                out_path.replace(final_path)
-                        else:
-                            renamed = _mark_filename(out_path, prefix=mark_prefix, suffix=mark_suffix)
-                            if renamed != out_path:
-                                out_path.replace(renamed)
-                                final_path = renamed
-
-                    if write_report:
-                        _write_unmatched_row(
-                            report_path=report_path,
-                            filename=pdf_path.name,
-                            match_source=match_source,
-                            rule_name=(rule or {}).get("name") if isinstance(rule, dict) else "",
-                            reason=reason,
-                            pages_affected=pages_affected,
-                            output_path=final_path
-                        )
-                    # >>> END ADD
-
-                except Exception as e:
-                    _append_error(error_rows, pdf_path.name, "save_pdf", e)
-
-        finally:
-            try:
-                doc.close()
-            except Exception:
-                pass
-
-    with outlog_path.open("w", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=["file", "page", "strategy", "x", "y", "w", "h", "rotation"])
-        w.writeheader()
-        w.writerows(placement_rows)
-
-    if error_rows:
-        with error_log_path.open("w", newline="", encoding="utf-8") as ef:
-            w = csv.DictWriter(ef, fieldnames=["file", "where", "error", "stack"])
-            w.writeheader()
-            w.writerows(error_rows)
+        if streaming and not processed:
+            typer.echo("[INFO] No quedan PDFs pendientes." if resume and ledger is not None
+                       else "[INFO] No se encontraron PDFs para procesar en la carpeta de entrada.")
+
+        if files is None:  # --watch: sin resumen por cada PDF que llega
+            for line in batch_timings.summary(time.perf_counter() - batch_t0):
+                typer.echo(line)
+
+        if still_failed:
+            typer.echo(f"[WARN] {len(still_failed)} PDF(s) fallidos; ver {error_log_path}")
+
+        if phase == "analyze":
+            write_plan(plan_path, plan_rows)
+            signatures = sum(1 for r in plan_rows if r.get("page") not in (None, ""))
+            typer.echo(f"[INFO] Plan de colocación: {plan_path} ({signatures} firma(s), "
+                       f"{len({r['file'] for r in plan_rows})} PDF(s))")
+    finally:
+        METRICS.batch_finished()
+        metrics_file.update(force=True)
+        for sink in (placement_sink, report_sink, error_sink):
+            if sink is not None:
+                sink.close()
+        if result_cache is not None:
+            result_cache.close()
+        if template_cache is not None:
+            template_cache.close()
+        if ledger is not None:
+            ledger.close()
@@ -0,0 +1,81 @@
+# src/pdf_ocr_stamper/placement_plan.py
+# Plan de colocación (fase analyze -> apply): una fila por firma a estampar.
+# CSV por defecto (editable a mano); JSON si la ruta termina en .json.
+# Un PDF sin firmas (o que no se pudo analizar) queda con una fila marcador:
+# page vacía y match_source/reason, así --apply no lo omite.
+from __future__ import annotations
+from pathlib import Path
+import csv
+import json
+
+PLAN_FIELDS = ["file", "page", "x", "y", "w", "h", "rotation", "strategy",
+               "match_source", "rule_name", "reason"]
+
+def plan_marker(file: str, match_source: str, reason: str, rule_name: str = "") -> dict:
+    """Fila sin colocación (page vacía) para un PDF analizado sin firmas."""
+    return {"file": file, "page": None, "match_source": match_source, "rule_name": rule_name, "reason": reason}
+
+def is_marker(row: dict) -> bool:
+    return row["page"] is None
+
+def write_plan(path: str | Path, rows: list[dict]) -> None:
+    p = Path(path)
+    p.parent.mkdir(parents=True, exist_ok=True)
+    rows = [{k: ("" if r.get(k) is None else r.get(k, "")) for k in PLAN_FIELDS} for r in rows]
+    if p.suffix.lower() == ".json":
+        p.write_text(json.dumps(rows, ensure_ascii=False, indent=2), encoding="utf-8")
+        return
+    with p.open("w", newline="", encoding="utf-8") as f:
+        w = csv.DictWriter(f, fieldnames=PLAN_FIELDS)
+        w.writeheader()
+        w.writerows(rows)
+
+def _coerce(row: dict, n: int) -> dict:
+    if row.get("page") in (None, ""):
+        out = plan_marker((row.get("file") or "").strip(), row.get("match_source") or "",
+                          row.get("reason") or "", row.get("rule_name") or "")
+        if not out["file"]:
+            raise ValueError(f"plan fila #{n}: falta 'file'")
+        return out
+    try:
+        out = {
+            "file": (row.get("file") or "").strip(),
+            "page": int(row["page"]),
+            "x": float(row["x"]),
+            "y": float(row["y"]),
+            "w": float(row["w"]),
+            "h": float(row["h"]),
+            "rotation": int(row.get("rotation") or 0),
+            "strategy": row.get("strategy") or "",
+            "match_source": row.get("match_source") or "",
+            "rule_name": row.get("rule_name") or "",
+            "reason": row.get("reason") or "",
+        }
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"plan fila #{n}: valor inválido ({type(e).__name__}: {e})") from None
+    if not out["file"]:
+        raise ValueError(f"plan fila #{n}: falta 'file'")
+    if out["page"] < 1:
+        raise ValueError(f"plan fila #{n}: page debe ser >= 1")
+    return out
+
+def read_plan(path: str | Path) -> dict[str, list[dict]]:
+    """
+    Lee y valida el plan; retorna {archivo: [filas]} en el orden del plan.
+    Las filas marcador (sin página) vienen con page=None.
+    """
+    p = Path(path)
+    if not p.exists():
+        raise FileNotFoundError(f"Plan no encontrado: {p}")
+    if p.suffix.lower() == ".json":
+        raw = json.loads(p.read_text(encoding="utf-8"))
+        if not isinstance(raw, list):
+            raise ValueError("plan JSON: se esperaba una lista de filas")
+    else:
+        with p.open("r", newline="", encoding="utf-8") as f:
+            raw = list(csv.DictReader(f))
+    per_file: dict[str, list[dict]] = {}
+    for n, row in enumerate(raw, 1):
+        r = _coerce(row, n)
+        per_file.setdefault(r["file"], []).append(r)
+    return per_file
@@ -0,0 +1,31 @@
+# src/pdf_ocr_stamper/preview.py
+from pathlib import Path
+import io
+import fitz
+from PIL import Image
+
+from .signature import insert_signature
+
+def render_preview(doc: fitz.Document, page_index: int, rect: fitz.Rect, img_bytes: bytes,
+                   rotation: int, out_path: Path | None = None, quality: int = 92) -> bytes | None:
+    """
+    Guarda un JPEG de la página con la firma SIN modificar doc.
+    Copia solo esa página a un documento temporal en memoria, la estampa ahí
+    y la renderiza; el costo depende de la página, no del tamaño del PDF.
+    Con out_path=None no escribe nada y retorna los bytes del JPEG.
+    """
+    scratch = fitz.open()
+    try:
+        scratch.insert_pdf(doc, from_page=page_index, to_page=page_index)
+        page = scratch[0]
+        insert_signature(page, rect, img_bytes, rotation)
+        pix = page.get_pixmap()
+        img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
+        if out_path is None:
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=quality)
+            return buf.getvalue()
+        img.save(out_path, format="JPEG", quality=quality)
+        return None
+    finally:
+        scratch.close()
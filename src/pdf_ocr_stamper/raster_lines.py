@@ -0,0 +1,136 @@
+# src/pdf_ocr_stamper/raster_lines.py
+# Detección de la línea de firma en páginas escaneadas (sin dibujos vectoriales):
+# se rasteriza la zona a baja resolución y se buscan tramos horizontales oscuros
+# con NumPy. Dependencia opcional: pip install "pdf-ocr-stamper[raster]".
+from __future__ import annotations
+from importlib.util import find_spec
+import math
+import fitz
+
+from .utils_units import Length, parse_length
+
+RASTER_DPI = 72             # 1 píxel = 1 pt
+DARK_THRESHOLD = 200        # gris < umbral = tinta (alto: a baja resolución las líneas finas quedan grises)
+MAX_GAP_PX = 1              # huecos tolerados dentro de una línea escaneada
+MIN_WIDTH_PT = 72.0         # sin min_width: al menos 1 pulgada
+SCAN_COVERAGE = 0.5         # imagen que cubre >= 50 % de la página = página escaneada
+EDGE_MARGIN_PT = 12.0       # bordes del escaneo (sombras del escáner, reglas cortadas) no son líneas
+STROKE_PT = 4.0             # trazo vertical que toca la línea (borde de tabla/celda): >= 4 pt de tinta seguida
+NEAR_PT = 2.0               # franja justo arriba/abajo de la línea que debe estar en blanco
+NEAR_INK = 0.10             # fracción de tinta tolerada en esa franja (texto subrayado, celdas)
+
+def raster_available() -> bool:
+    return find_spec("numpy") is not None
+
+def looks_scanned(page: fitz.Page) -> bool:
+    """True si alguna imagen cubre la mayor parte de la página."""
+    area = abs(page.rect)
+    if not area:
+        return False
+    for info in page.get_image_info():
+        if abs(fitz.Rect(info["bbox"]) & page.rect) >= SCAN_COVERAGE * area:
+            return True
+    return False
+
+def _has_stroke(dark, r0: int, r1: int, x0: int, x1: int, stroke: int) -> bool:
+    """
+    True si alguna columna de la banda (o a 2 px de sus extremos) sigue con
+    tinta stroke filas arriba o abajo: un borde vertical de tabla o celda.
+    """
+    h, w = dark.shape
+    c0, c1 = max(0, x0 - 2), min(w, x1 + 2)
+    if r0 >= stroke and dark[r0 - stroke:r0, c0:c1].all(axis=0).any():
+        return True
+    if r1 + 1 + stroke <= h and dark[r1 + 1:r1 + 1 + stroke, c0:c1].all(axis=0).any():
+        return True
+    return False
+
+def _has_ink_near(dark, r0: int, r1: int, x0: int, x1: int, near: int) -> bool:
+    """True si hay tinta justo arriba o abajo de la banda (se salta 1 fila de antialias)."""
+    for rows in (dark[max(0, r0 - 1 - near):max(0, r0 - 1), x0:x1], dark[r1 + 2:r1 + 2 + near, x0:x1]):
+        if rows.size and rows.mean() > NEAR_INK:
+            return True
+    return False
+
+def _lowest_band(dark, min_run: int, max_gap: int, max_thick: int, stroke: int = 4, near: int = 2):
+    """
+    Banda de filas más baja con un tramo oscuro >= min_run píxeles que parezca
+    una línea de firma: fina, sin trazos verticales que la toquen (bordes de
+    tabla o celda) y sin tinta justo arriba o abajo (texto subrayado, celdas).
+    Retorna (fila_centro, x0, x1) en píxeles o None.
+    """
+    import numpy as np
+
+    # 1) proyección por filas: descarta de una vez las que no tienen tinta suficiente
+    cand = np.flatnonzero(dark.sum(axis=1) >= min_run)
+    if cand.size == 0:
+        return None
+
+    # 2) tramos (run-length) en todas las filas candidatas a la vez
+    rr, cc = np.nonzero(dark[cand])
+    new = np.empty(rr.size, dtype=bool)
+    new[0] = True
+    new[1:] = (rr[1:] != rr[:-1]) | (np.diff(cc) > max_gap + 1)
+    starts = np.flatnonzero(new)
+    ends = np.append(starts[1:], rr.size) - 1
+    x0s, x1s = cc[starts], cc[ends]
+    long = (x1s - x0s + 1) >= min_run
+    if not long.any():
+        return None
+    rows, x0s, x1s = cand[rr[starts][long]], x0s[long], x1s[long]
+
+    # 3) agrupar filas contiguas en bandas; una banda gruesa es un bloque, no una línea
+    uniq = np.unique(rows)
+    splits = np.flatnonzero(np.diff(uniq) > 1) + 1
+    for band in reversed(np.split(uniq, splits)):
+        r0, r1 = int(band[0]), int(band[-1])
+        if r1 - r0 + 1 > max_thick:
+            continue
+        sel = (rows >= r0) & (rows <= r1)
+        x0, x1 = int(x0s[sel].min()), int(x1s[sel].max()) + 1
+        if _has_stroke(dark, r0, r1, x0, x1, stroke) or _has_ink_near(dark, r0, r1, x0, x1, near):
+            continue
+        return (r0 + r1 + 1) / 2.0, x0, x1
+    return None
+
+def find_signature_line_raster(page: fitz.Page, min_width: Length | str | float | None,
+                               dy_above_line: float | None, clip=None, dpi: int = RASTER_DPI,
+                               max_thickness: float = 3.0) -> tuple[float, float] | None:
+    """
+    Igual que anchors.find_signature_line (retorna (x, y_sup_izq) o None),
+    pero sobre la imagen renderizada de la zona: sirve para escaneos.
+    """
+    import numpy as np
+
+    W, H = page.mediabox_size
+    min_w_pts = parse_length(min_width, ref=W) if min_width else MIN_WIDTH_PT
+    area = fitz.Rect(clip) if clip is not None else fitz.Rect(page.rect)
+    vis = area * page.rotation_matrix
+    pix = page.get_pixmap(dpi=dpi, clip=vis, colorspace=fitz.csGRAY, alpha=False)
+    if not pix.width or not pix.height:
+        return None
+
+    # vista sin copia sobre los samples del pixmap (stride puede traer relleno)
+    img = np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.stride)[:, :pix.width]
+    zoom = pix.width / vis.width
+    dark = img < DARK_THRESHOLD
+    page_vis = page.rect * page.rotation_matrix
+    top = int((page_vis.y0 + EDGE_MARGIN_PT - vis.y0) * zoom)
+    bottom = int(math.ceil((page_vis.y1 - EDGE_MARGIN_PT - vis.y0) * zoom))
+    dark[:max(top, 0)] = False
+    dark[max(bottom, 0):] = False
+    found = _lowest_band(
+        dark,
+        min_run=max(1, int(min_w_pts * zoom)),
+        max_gap=MAX_GAP_PX,
+        max_thick=max(1, math.ceil(max_thickness * zoom)) + 1,  # +1: antialias del escaneo
+        stroke=max(2, math.ceil(STROKE_PT * zoom)),
+        near=max(1, math.ceil(NEAR_PT * zoom)),
+    )
+    if found is None:
+        return None
+
+    row, px0, _ = found
+    # píxel -> coordenadas visibles -> coordenadas de la página
+    p = fitz.Point(vis.x0 + px0 / zoom, vis.y0 + row / zoom) * page.derotation_matrix
+    return (p.x, p.y - float(dy_above_line or 10))
@@ -1,6 +1,16 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
 from pathlib import Path
+import re
 import yaml
-from .utils_units import name_matches
+from .anchors import LINE_MAX_THICKNESS, LINE_METHODS, AnchorMatcher
+from .raster_lines import RASTER_DPI, raster_available
+from .cache import stable_hash
+from .utils_naming import GlobIndex
+from .utils_units import Length, compile_length, name_matches
+
+ALIGNS = ("below_left", "below_center", "right_center", "above_left", "above_center")
+POSITIONS = ("top_left", "top_right", "bottom_left", "bottom_right", "center")
 
 def load_rules(path: str | None):
     if not path:
@@ -13,6 +23,7 @@ def load_rules(path: str | None):
     data.setdefault("rules", [])
     return data
 
+# Sobre el dict crudo (recorre las reglas); el lote usa RulePlan.pick (indexado)
 def pick_rule_for(filename: str, rules_cfg: dict) -> dict | None:
     rules = rules_cfg.get("rules", [])
     for r in rules:
@@ -20,3 +31,264 @@ def pick_rule_for(filename: str, rules_cfg: dict) -> dict | None:
         if pat and name_matches(pat, filename):
             return r
     return None
+
+
+# -------- Plan compilado (se valida una vez al cargar) --------
+
+@dataclass(frozen=True, slots=True)
+class AnchorSpec:
+    regex: str
+    rx: re.Pattern
+    dx: float = 0.0
+    dy: float = 0.0
+    align: str = "below_left"
+
+@dataclass(frozen=True, slots=True)
+class RegionSpec:
+    """Zona de búsqueda: banda inferior (bottom) o rectángulo x0,y0,x1,y1."""
+    bottom: Length | None = None
+    rect: tuple[Length, Length, Length, Length] | None = None
+
+    def resolve(self, page_rect) -> tuple[float, float, float, float] | None:
+        """Rect en puntos; None si cubre toda la página."""
+        x0, y0, x1, y1 = page_rect
+        W, H = x1 - x0, y1 - y0
+        if self.rect is not None:
+            rx0, ry0, rx1, ry1 = self.rect
+            clip = (x0 + rx0.to_points(W), y0 + ry0.to_points(H), x0 + rx1.to_points(W), y0 + ry1.to_points(H))
+        else:
+            clip = (x0, y1 - self.bottom.to_points(H), x1, y1)
+        if clip[0] <= x0 and clip[1] <= y0 and clip[2] >= x1 and clip[3] >= y1:
+            return None
+        return clip
+
+@dataclass(frozen=True, slots=True)
+class LineDetectionSpec:
+    enabled: bool = False
+    min_width: Length | None = None
+    dy_above_line: float = 10.0
+    region: RegionSpec | None = None    # solo se buscan líneas dentro de esta zona
+    max_thickness: float = LINE_MAX_THICKNESS
+    method: str = "cdrawings"           # "cdrawings" | "bboxlog" | "drawings" (ver find_signature_line)
+    raster: bool | None = False         # búsqueda en la imagen (opcional): None = auto (solo páginas escaneadas)
+    raster_dpi: int = RASTER_DPI
+
+@dataclass(frozen=True, slots=True)
+class FallbackSpec:
+    position: str | None = None
+    margin_x: Length | None = None
+    margin_y: Length | None = None
+    offset_x: Length | None = None
+    offset_y: Length | None = None
+
+@dataclass(frozen=True, slots=True)
+class CompiledRule:
+    """Regla efectiva: los valores de defaults ya están aplicados."""
+    match: str | None
+    name: str | None
+    search_last_pages: int
+    anchors: tuple[AnchorSpec, ...]
+    matcher: AnchorMatcher              # búsqueda combinada de anchors (una pasada)
+    search_regions: tuple[RegionSpec, ...]  # de menor a mayor; al final siempre la página completa
+    fingerprint: str                    # hash de la regla cruda + defaults (caché de resultados)
+    line_detection: LineDetectionSpec
+    fallback: FallbackSpec
+
+@dataclass(frozen=True, slots=True)
+class RulePlan:
+    rules: tuple[CompiledRule, ...]
+    default_rule: CompiledRule          # se usa cuando ninguna regla coincide
+    default_scale: float | None = None
+    default_keep_aspect: object = True  # valor crudo, se interpreta en manifest
+    index: GlobIndex = field(init=False, repr=False, compare=False)  # match de las reglas, en orden
+
+    def __post_init__(self):
+        object.__setattr__(self, "index", GlobIndex(r.match for r in self.rules))
+
+    def pick(self, filename: str) -> CompiledRule | None:
+        """Primera regla cuyo match coincide (como name_matches, sin recorrer todas)."""
+        i = self.index.first(filename)
+        return None if i is None else self.rules[i]
+
+    def by_name(self, name: str) -> CompiledRule | None:
+        for r in self.rules:
+            if r.name == name:
+                return r
+        return None
+
+
+def _where(idx: int | None) -> str:
+    return "defaults" if idx is None else f"regla #{idx + 1}"
+
+def _float(val, what: str, default: float = 0.0) -> float:
+    if val is None or val == "":
+        return default
+    try:
+        return float(val)
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: número inválido {val!r}") from None
+
+def _length(val, what: str) -> Length | None:
+    try:
+        return compile_length(val)
+    except ValueError as e:
+        raise ValueError(f"{what}: {e}") from None
+
+def _compile_anchors(items, where: str) -> tuple[AnchorSpec, ...]:
+    if items in (None, ""):
+        return ()
+    if not isinstance(items, list):
+        raise ValueError(f"rules.yaml ({where}): 'anchors' debe ser una lista")
+    out = []
+    for i, a in enumerate(items, 1):
+        what = f"rules.yaml ({where}, anchor #{i})"
+        if not isinstance(a, dict) or not a.get("regex"):
+            raise ValueError(f"{what}: falta 'regex'")
+        try:
+            rx = re.compile(a["regex"], flags=re.I)
+        except re.error as e:
+            raise ValueError(f"{what}: regex inválida {a['regex']!r}: {e}") from None
+        align = str(a.get("align") or "below_left").lower()
+        if align not in ALIGNS:
+            raise ValueError(f"{what}: align desconocido {align!r} (válidos: {', '.join(ALIGNS)})")
+        out.append(AnchorSpec(
+            regex=a["regex"],
+            rx=rx,
+            dx=_float(a.get("dx"), f"{what} dx"),
+            dy=_float(a.get("dy"), f"{what} dy"),
+            align=align,
+        ))
+    return tuple(out)
+
+def _compile_region(val: dict, what: str) -> RegionSpec:
+    if val.get("rect") is not None:
+        rect = val["rect"]
+        if not isinstance(rect, (list, tuple)) or len(rect) != 4:
+            raise ValueError(f"{what}.rect: se esperaban 4 valores [x0, y0, x1, y1]")
+        rect = tuple(_length(v, f"{what}.rect") for v in rect)
+        if any(v is None for v in rect):
+            raise ValueError(f"{what}.rect: valores vacíos")
+        return RegionSpec(rect=rect)
+    if val.get("bottom") is not None:
+        return RegionSpec(bottom=_length(val["bottom"], f"{what}.bottom"))
+    raise ValueError(f"{what}: falta 'bottom' o 'rect'")
+
+def _compile_regions(val, where: str) -> tuple[RegionSpec, ...]:
+    if not val:
+        return ()
+    what = f"rules.yaml ({where}) search_region"
+    if not isinstance(val, dict):
+        raise ValueError(f"{what}: debe ser un mapeo (bottom/rect/widen)")
+    regions = [_compile_region(val, what)]
+    widen = val.get("widen") or []
+    if not isinstance(widen, list):
+        raise ValueError(f"{what}.widen: debe ser una lista de bandas inferiores")
+    for w in widen:
+        regions.append(RegionSpec(bottom=_length(w, f"{what}.widen")))
+    return tuple(regions)
+
+def _compile_position(val, what: str) -> str | None:
+    if not val:
+        return None
+    pos = str(val).lower()
+    if pos not in POSITIONS:
+        raise ValueError(f"{what}: position desconocida {pos!r} (válidos: {', '.join(POSITIONS)})")
+    return pos
+
+def _compile_rule(raw: dict, defaults: dict, idx: int | None) -> CompiledRule:
+    where = _where(idx)
+    if not isinstance(raw, dict):
+        raise ValueError(f"rules.yaml ({where}): se esperaba un mapeo")
+    match = raw.get("match")
+    if idx is not None and (not match or not isinstance(match, str)):
+        raise ValueError(f"rules.yaml ({where}): falta 'match'")
+
+    search_last = raw.get("search_last_pages") or defaults.get("search_last_pages") or 0
+    try:
+        search_last = int(search_last)
+    except (TypeError, ValueError):
+        raise ValueError(f"rules.yaml ({where}): search_last_pages inválido {search_last!r}") from None
+    if search_last < 0:
+        raise ValueError(f"rules.yaml ({where}): search_last_pages no puede ser negativo")
+
+    anchors = _compile_anchors(raw.get("anchors"), where) or _compile_anchors(defaults.get("anchors"), "defaults")
+
+    lcfg = raw.get("line_detection") or {}
+    if not isinstance(lcfg, dict):
+        raise ValueError(f"rules.yaml ({where}): 'line_detection' debe ser un mapeo")
+    what = f"rules.yaml ({where}) line_detection"
+    region = lcfg.get("region")
+    if region and not isinstance(region, dict):
+        raise ValueError(f"{what}.region: debe ser un mapeo (bottom/rect)")
+    method = str(lcfg.get("method") or "cdrawings").lower()
+    if method not in LINE_METHODS:
+        raise ValueError(f"{what}: method desconocido {method!r} (válidos: {', '.join(LINE_METHODS)})")
+    raster = lcfg.get("raster", False)  # opcional: una tabla escaneada puede parecer una línea
+    if isinstance(raster, str) and raster.lower() == "auto":
+        raster = None
+    elif not isinstance(raster, bool):
+        raise ValueError(f"{what}: raster debe ser auto, true o false (recibido {raster!r})")
+    if raster and not raster_available():
+        raise ValueError(f"{what}: raster: true requiere numpy (pip install \"pdf-ocr-stamper[raster]\")")
+    try:
+        raster_dpi = int(lcfg.get("raster_dpi") or RASTER_DPI)
+    except (TypeError, ValueError):
+        raise ValueError(f"{what}: raster_dpi inválido {lcfg.get('raster_dpi')!r}") from None
+    line = LineDetectionSpec(
+        enabled=bool(lcfg.get("enabled")),
+        min_width=_length(lcfg.get("min_width"), f"{what}.min_width"),
+        dy_above_line=_float(lcfg.get("dy_above_line", 10), f"{what}.dy_above_line", 10.0),
+        region=_compile_region(region, f"{what}.region") if region else None,
+        max_thickness=_float(lcfg.get("max_thickness"), f"{what}.max_thickness", LINE_MAX_THICKNESS),
+        method=method,
+        raster=raster,
+        raster_dpi=raster_dpi,
+    )
+
+    fback = raw.get("fallback") or {}
+    if not isinstance(fback, dict):
+        raise ValueError(f"rules.yaml ({where}): 'fallback' debe ser un mapeo")
+    what = f"rules.yaml ({where}) fallback"
+    fallback = FallbackSpec(
+        position=_compile_position(fback.get("position") or defaults.get("position"), what),
+        margin_x=_length(fback.get("margin_x", defaults.get("margin_x")), f"{what}.margin_x"),
+        margin_y=_length(fback.get("margin_y", defaults.get("margin_y")), f"{what}.margin_y"),
+        offset_x=_length(fback.get("offset_x", defaults.get("offset_x")), f"{what}.offset_x"),
+        offset_y=_length(fback.get("offset_y", defaults.get("offset_y")), f"{what}.offset_y"),
+    )
+
+    return CompiledRule(
+        match=match,
+        name=raw.get("name"),
+        search_last_pages=search_last,
+        anchors=anchors,
+        matcher=AnchorMatcher(anchors),
+        search_regions=_compile_regions(raw.get("search_region") or defaults.get("search_region"), where),
+        fingerprint=stable_hash({"rule": raw, "defaults": defaults}),
+        line_detection=line,
+        fallback=fallback,
+    )
+
+def compile_rules(rules_cfg: dict) -> RulePlan:
+    """
+    Valida rules.yaml y lo convierte en un plan inmutable: regex compiladas,
+    longitudes parseadas y defaults ya resueltos por regla. Lanza ValueError
+    si algo está mal formado, antes de procesar cualquier PDF.
+    """
+    defaults = rules_cfg.get("defaults") or {}
+    if not isinstance(defaults, dict):
+        raise ValueError("rules.yaml: 'defaults' debe ser un mapeo")
+    rules = rules_cfg.get("rules") or []
+    if not isinstance(rules, list):
+        raise ValueError("rules.yaml: 'rules' debe ser una lista")
+
+    scale = defaults.get("scale")
+    return RulePlan(
+        rules=tuple(_compile_rule(r, defaults, i) for i, r in enumerate(rules)),
+        default_rule=_compile_rule({}, defaults, None),
+        default_scale=_float(scale, "rules.yaml (defaults) scale") if scale not in (None, "") else None,
+        default_keep_aspect=defaults.get("keep_aspect", True),
+    )
+
+def load_rule_plan(path: str | None) -> RulePlan:
+    return compile_rules(load_rules(path))
@@ -0,0 +1,81 @@
+# src/pdf_ocr_stamper/saving.py
+# Modos de salida del PDF estampado (output.save_mode / --save-mode):
+#   full         reescribe el documento completo (como siempre)
+#   incremental  original + actualización incremental al final: solo se
+#                escriben los objetos nuevos (firma), ideal para escaneos grandes
+#   compact      reescritura con limpieza de objetos, deflate y object streams:
+#                más lento, pero el archivo más chico
+from __future__ import annotations
+from pathlib import Path
+import fitz
+
+SAVE_MODES = ("full", "incremental", "compact")
+
+def check_save_mode(mode: str | None) -> str:
+    mode = (mode or "full").strip().lower()
+    if mode not in SAVE_MODES:
+        raise ValueError(f"save_mode desconocido: {mode!r} (válidos: {', '.join(SAVE_MODES)})")
+    return mode
+
+def _incremental_bytes(doc: fitz.Document, size_hint: int = 0) -> bytes | None:
+    """
+    Original + actualización incremental, en memoria. doc.save(incremental=True)
+    exige el archivo original en disco, así que se usa el binding de MuPDF
+    (PyMuPDF >= 1.23). None si no se puede (PDF reparado, cifrado, binding viejo).
+    """
+    try:
+        from pymupdf import mupdf
+    except ImportError:
+        return None
+    if doc.is_repaired or doc.needs_pass or not doc.can_save_incrementally():
+        return None
+    pdf = mupdf.pdf_document_from_fz_document(doc.this)
+    buf = mupdf.fz_new_buffer(size_hint + (1 << 16))
+    out = mupdf.FzOutput(buf)
+    opts = mupdf.PdfWriteOptions()
+    opts.do_incremental = 1
+    mupdf.pdf_write_document(pdf, out, opts)
+    out.fz_close_output()
+    return bytes(mupdf.fz_buffer_extract(buf))
+
+def _try_incremental(doc: fitz.Document, size_hint: int) -> bytes | None:
+    try:
+        return _incremental_bytes(doc, size_hint)
+    except Exception:
+        return None
+
+def serialize(doc: fitz.Document, mode: str, size_hint: int = 0) -> tuple[bytes, str]:
+    """Bytes del documento según el modo. Retorna (bytes, modo usado)."""
+    if mode == "incremental":
+        data = _try_incremental(doc, size_hint)
+        if data is not None:
+            return data, "incremental"
+        mode = "full"  # no se puede actualizar incrementalmente: reescritura completa
+    if mode == "compact":
+        try:
+            return doc.tobytes(garbage=3, deflate=True, use_objstms=1), "compact"
+        except TypeError:  # PyMuPDF sin object streams
+            return doc.tobytes(garbage=3, deflate=True), "compact"
+    return doc.tobytes(), "full"
+
+def save_to(doc: fitz.Document, path: Path, mode: str, size_hint: int = 0) -> tuple[int, str]:
+    """
+    Como serialize, pero escribe directo en path con doc.save (lote): sin pasar
+    el PDF entero por bytes de Python. El incremental sigue armándose en memoria
+    (el documento se abrió desde bytes, no hay original en disco sobre el cual
+    actualizar). Retorna (tamaño escrito, modo usado).
+    """
+    if mode == "incremental":
+        data = _try_incremental(doc, size_hint)
+        if data is not None:
+            path.write_bytes(data)
+            return len(data), "incremental"
+        mode = "full"
+    if mode == "compact":
+        try:
+            doc.save(str(path), garbage=3, deflate=True, use_objstms=1)
+        except TypeError:  # PyMuPDF sin object streams
+            doc.save(str(path), garbage=3, deflate=True)
+    else:
+        doc.save(str(path))
+    return path.stat().st_size, mode
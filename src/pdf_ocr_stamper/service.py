@@ -0,0 +1,235 @@
+# src/pdf_ocr_stamper/service.py
+# Servicio HTTP local (--serve): otros sistemas envían un PDF y reciben el PDF
+# estampado + metadatos de colocación. Solo biblioteca estándar (asyncio); el
+# estampado corre en un pool de procesos con el mismo núcleo que process_batch.
+#
+#   POST /stamp?filename=contrato.pdf[&rule=Nombre][&page=3&x=100&y=650...]
+#        cuerpo = bytes del PDF -> 200 application/pdf, metadatos en X-Stamp-Result (JSON)
+#   GET  /health -> {"status": "ok", "workers": N, "queued": M, "capacity": K}
+#   GET  /metrics -> métricas en formato Prometheus (ver metrics.py)
+#
+# Parámetros tipo manifest (page, x, y, width, height, scale, rotation,
+# keep_aspect, stamp_page_range) reemplazan las filas de manifest.csv.
+from __future__ import annotations
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import json
+import multiprocessing
+
+from .cache import CACHE_FILENAME, TemplateCache
+from .metrics import CONTENT_TYPE, METRICS, textfile_writer
+from .pipeline import _build_context, _resolve_workers, _stamp_bytes, _worker_call, _worker_init
+
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8765
+QUEUE_SIZE = 16             # solicitudes en espera además de las que se están procesando
+MAX_BODY_MB = 50
+HEADER_TIMEOUT = 30.0       # segundos para recibir encabezados + cuerpo
+OVERRIDE_KEYS = ("page", "x", "y", "width", "height", "scale", "rotation", "keep_aspect", "stamp_page_range")
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            411: "Length Required", 413: "Payload Too Large", 422: "Unprocessable Entity",
+            500: "Internal Server Error", 503: "Service Unavailable"}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+def _response(status: int, body: bytes, content_type: str, extra: dict | None = None) -> bytes:
+    headers = {"Content-Type": content_type, "Content-Length": str(len(body)), "Connection": "close"}
+    headers.update(extra or {})
+    head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+    head += "".join(f"{k}: {v}\r\n" for k, v in headers.items())
+    return head.encode("latin-1") + b"\r\n" + body
+
+def _json_response(status: int, payload: dict, extra: dict | None = None) -> bytes:
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    return _response(status, body, "application/json; charset=utf-8", extra)
+
+def _metadata(result: dict) -> dict:
+    return {k: result.get(k) for k in ("file", "match_source", "rule_name", "reason",
+                                       "pages_affected", "placements", "errors", "timings")}
+
+class StampService:
+    """
+    Cola acotada (QUEUE_SIZE) + `workers` tareas que la consumen enviando cada
+    PDF al pool de procesos. Con la cola llena responde 503 + Retry-After en
+    lugar de acumular PDFs en memoria (contrapresión hacia el cliente).
+    """
+
+    def __init__(self, cfg: dict):
+        svc = cfg.get("service", {}) or {}
+        self.cfg = dict(cfg, dry_run=False, phase=None)  # siempre estampa de verdad
+        self.host = svc.get("host", SERVICE_HOST)
+        self.port = int(svc.get("port", SERVICE_PORT))
+        self.workers = _resolve_workers(svc.get("workers", cfg.get("workers")))
+        self.queue_size = max(1, int(svc.get("queue_size", QUEUE_SIZE)))
+        self.max_body = int(float(svc.get("max_body_mb", MAX_BODY_MB)) * (1 << 20))
+        self.executor: ProcessPoolExecutor | None = None
+        self.queue: asyncio.Queue | None = None
+        self.template_cache: TemplateCache | None = None
+        self.metrics_file = textfile_writer(cfg)
+
+    # -------- pool --------
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_worker_init, initargs=(self.cfg,))
+
+    async def _consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job, fut = await self.queue.get()
+            executor = self.executor  # el pool al que se envía este job
+            try:
+                work = loop.run_in_executor(executor, _worker_call, _stamp_bytes, job)
+                # wait no lanza si el job se cancela (p.ej. otro consumidor reemplazó el
+                # pool); solo si se cancela esta tarea (cierre del servicio)
+                await asyncio.wait({work})
+                if work.cancelled():
+                    raise HttpError(500, "El trabajo se canceló al reiniciar el pool de workers")
+                result = work.result()
+            except BrokenProcessPool as e:
+                # un worker murió (PDF patológico): se levanta un pool nuevo, una sola vez
+                # aunque varios consumidores vean el mismo pool roto
+                if self.executor is executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = self._new_executor()
+                if not fut.done():
+                    fut.set_exception(HttpError(500, f"El worker terminó inesperadamente: {e}"))
+            except Exception as e:
+                if not fut.done():
+                    fut.set_exception(e)
+            else:
+                self._learn_template(result)
+                METRICS.observe(result, result["pdf"] is not None)
+                self.metrics_file.update()
+                if not fut.done():
+                    fut.set_result(result)
+            finally:
+                self.queue.task_done()
+
+    def _learn_template(self, result: dict):
+        if self.template_cache is not None and result.get("template") and not result["errors"]:
+            try:
+                self.template_cache.put(result["template"][0], result["file"], result["template"][1])
+            except Exception as e:
+                print(f"[WARN] template_cache: {e}")
+
+    async def submit(self, job) -> dict:
+        fut = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((job, fut))
+        except asyncio.QueueFull:
+            raise HttpError(503, "Cola llena, reintente más tarde") from None
+        return await fut
+
+    # -------- HTTP --------
+    async def _read_request(self, reader: asyncio.StreamReader):
+        line = await reader.readline()
+        if not line:
+            return None
+        try:
+            method, target, _ = line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Línea de solicitud inválida") from None
+        headers = {}
+        while True:
+            h = await reader.readline()
+            if h in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = h.decode("latin-1").partition(":")
+            headers[k.strip().lower()] = v.strip()
+        body = b""
+        if method == "POST":
+            if "content-length" not in headers:
+                raise HttpError(411, "Falta Content-Length")
+            try:
+                size = int(headers["content-length"])
+            except ValueError:
+                raise HttpError(400, "Content-Length inválido") from None
+            if size > self.max_body:
+                raise HttpError(413, f"El PDF supera {self.max_body >> 20} MB")
+            body = await reader.readexactly(size)
+        return method, target, headers, body
+
+    async def _handle_stamp(self, target: str, body: bytes) -> bytes:
+        query = {k: v[-1] for k, v in parse_qs(urlsplit(target).query).items()}
+        if not body:
+            raise HttpError(400, "Cuerpo vacío: envíe el PDF")
+        filename = query.get("filename") or "documento.pdf"
+        overrides = {k: query[k] for k in OVERRIDE_KEYS if k in query}
+        try:
+            result = await self.submit((filename, body, query.get("rule"), overrides or None))
+        except ValueError as e:
+            raise HttpError(400, str(e)) from None
+        meta = _metadata(result)
+        if result["pdf"] is None:
+            return _json_response(422, meta)
+        safe_name = filename.encode("ascii", "replace").decode().replace('"', "")
+        return _response(200, result["pdf"], "application/pdf",
+                         {"X-Stamp-Result": json.dumps(meta, ensure_ascii=True, default=str),
+                          "Content-Disposition": f'attachment; filename="{safe_name}"'})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                req = await asyncio.wait_for(self._read_request(reader), HEADER_TIMEOUT)
+                if req is None:
+                    return
+                method, target, _, body = req
+                path = urlsplit(target).path
+                if path == "/health":
+                    resp = _json_response(200, {"status": "ok", "workers": self.workers,
+                                                "queued": self.queue.qsize(), "capacity": self.queue_size})
+                elif path == "/metrics":
+                    resp = _response(200, METRICS.render().encode("utf-8"), CONTENT_TYPE)
+                elif path == "/stamp":
+                    if method != "POST":
+                        raise HttpError(405, "Use POST")
+                    resp = await self._handle_stamp(target, body)
+                else:
+                    raise HttpError(404, f"Ruta desconocida: {path}")
+            except HttpError as e:
+                extra = {"Retry-After": "1"} if e.status == 503 else None
+                resp = _json_response(e.status, {"error": str(e)}, extra)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                resp = _json_response(400, {"error": "Solicitud incompleta"})
+            except Exception as e:
+                resp = _json_response(500, {"error": f"{type(e).__name__}: {e}"})
+            writer.write(resp)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self):
+        _build_context(self.cfg)  # valida reglas/manifest/firma antes de abrir el puerto
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        self.executor = self._new_executor()
+        if self.cfg.get("template_cache", False):
+            self.template_cache = TemplateCache(Path(self.cfg["output_dir"]) / CACHE_FILENAME)
+        consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        server = await asyncio.start_server(self.handle, self.host, self.port)
+        print(f"[INFO] Servicio en http://{self.host}:{self.port} ({self.workers} workers, cola {self.queue_size}); "
+              f"Ctrl+C para salir")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            for c in consumers:
+                c.cancel()
+            self.metrics_file.update(force=True)
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.template_cache is not None:
+                self.template_cache.close()
+
+def serve(cfg: dict) -> None:
+    try:
+        asyncio.run(StampService(cfg).serve())
+    except KeyboardInterrupt:
+        print("[INFO] Servicio detenido")
@@ -1,6 +1,23 @@
+# src/pdf_ocr_stamper/signature.py
+# Imagen de firma: carga (PNG RGBA normalizado) y variantes para embeber.
+# Con signature.target_dpi / signature.format cada tamaño colocado usa una
+# copia reducida a esa resolución (PNG, PNG con paleta o JPEG con máscara
+# alfa), cacheada en memoria y en disco por hash de la firma + parámetros.
+from __future__ import annotations
+from dataclasses import dataclass
 from pathlib import Path
 from PIL import Image
+import hashlib
 import io
+import json
+import os
+import tempfile
+import zlib
+
+from .types import SignatureImage
+
+SIGNATURE_FORMATS = ("png", "palette", "jpeg", "auto")
+PALETTE_MAX_COLORS = 256  # "auto": con hasta estos colores la firma es "plana" -> paleta; si no, JPEG
 
 _CACHE = {"bytes": None, "w": None, "h": None, "path": None}
 
@@ -25,11 +42,201 @@ def get_signature(cfg: dict | None = None):
     if _CACHE["bytes"] is not None and _CACHE["path"] == str(p):
         return _CACHE["bytes"], _CACHE["w"], _CACHE["h"]
 
-    img = Image.open(p).convert("RGBA")
+    data, w, h = _to_png(Image.open(p))
+    _CACHE.update({"bytes": data, "w": w, "h": h, "path": str(p)})
+    return data, w, h
+
+def _to_png(img: Image.Image) -> tuple[bytes, int, int]:
+    img = img.convert("RGBA")
     w, h = img.size
     buf = io.BytesIO()
     img.save(buf, format="PNG")
-    data = buf.getvalue()
+    return buf.getvalue(), w, h
 
-    _CACHE.update({"bytes": data, "w": w, "h": h, "path": str(p)})
-    return data, w, h
+def load_signature(source: str | Path | bytes | bytearray | memoryview) -> SignatureImage:
+    """Firma para api.stamp_pdf desde una ruta o desde los bytes de la imagen (PNG, JPG...)."""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        img = Image.open(io.BytesIO(source))
+    else:
+        img = Image.open(Path(source))
+    return SignatureImage(*_to_png(img))
+
+def insert_signature(page, rect, img_bytes: bytes, rotation: int = 0, xref: int = 0,
+                     mask: bytes | None = None) -> int:
+    """
+    Inserta la firma en la página y retorna el xref de la imagen.
+    Con xref != 0 se referencia la imagen ya embebida en el documento
+    (sin volver a decodificarla ni duplicarla en el PDF de salida).
+    mask: transparencia aparte (variante JPEG de SignatureAssets).
+    """
+    if xref:
+        return page.insert_image(rect, xref=xref, rotate=rotation)
+    return page.insert_image(rect, stream=img_bytes, mask=mask, rotate=rotation)
+
+
+# -------- Variantes por tamaño colocado (signature.target_dpi / format) --------
+
+@dataclass(frozen=True, slots=True)
+class SignatureSettings:
+    target_dpi: float = 0               # 0 = embeber la resolución original
+    format: str = "png"                 # png | palette | jpeg | auto
+    jpeg_quality: int = 85
+    cache_dir: Path | None = None
+
+    @property
+    def passthrough(self) -> bool:
+        """Sin reducir ni convertir: se embebe la firma tal cual (como antes)."""
+        return not self.target_dpi and self.format == "png"
+
+def compile_signature_settings(cfg: dict) -> SignatureSettings:
+    """Lee target_dpi / format / jpeg_quality / cache_dir del bloque `signature:` de config.yaml."""
+    scfg = cfg.get("signature") or {}
+    if not isinstance(scfg, dict):
+        raise ValueError("config.yaml: 'signature' debe ser un mapeo")
+    fmt = str(scfg.get("format") or "png").lower()
+    if fmt not in SIGNATURE_FORMATS:
+        raise ValueError(f"config.yaml: signature.format desconocido {fmt!r} (válidos: {', '.join(SIGNATURE_FORMATS)})")
+    try:
+        target_dpi = float(scfg.get("target_dpi") or 0)
+        quality = int(scfg.get("jpeg_quality") or 85)
+    except (TypeError, ValueError):
+        raise ValueError("config.yaml: signature.target_dpi / jpeg_quality deben ser números") from None
+    if target_dpi < 0 or not 1 <= quality <= 95:
+        raise ValueError("config.yaml: signature.target_dpi >= 0 y jpeg_quality entre 1 y 95")
+    cache_dir = scfg.get("cache_dir")
+    if cache_dir is None:
+        cache_dir = Path(cfg.get("output_dir", "output")) / ".signature_cache"
+    return SignatureSettings(
+        target_dpi=target_dpi,
+        format=fmt,
+        jpeg_quality=quality,
+        cache_dir=Path(cache_dir) if cache_dir else None,
+    )
+
+@dataclass(frozen=True, slots=True)
+class SignatureVariant:
+    key: str                            # identifica la variante (xref reutilizable dentro del documento)
+    stream: bytes
+    mask: bytes | None = None           # alfa aparte para JPEG
+    width: int = 0                      # píxeles embebidos
+    height: int = 0
+
+class SignatureAssets:
+    """
+    Variantes de la firma por tamaño colocado. El tamaño en la página (w, h
+    en puntos) no cambia: solo cuántos píxeles se embeben. Nunca se amplía
+    por encima de la imagen original.
+    """
+
+    def __init__(self, png: bytes, width: int, height: int, settings: SignatureSettings):
+        self.png, self.width, self.height = png, width, height
+        self.settings = settings
+        self.source_hash = hashlib.sha256(png).hexdigest()
+        self._variants: dict[tuple, SignatureVariant] = {}
+        self._image: Image.Image | None = None
+        self._flate: dict[tuple[str, int], bytes] = {}  # (variante, 0=imagen/1=máscara) -> stream comprimido
+
+    def _target_size(self, w_pt: float, h_pt: float, rotation: int) -> tuple[int, int]:
+        if not self.settings.target_dpi:
+            return self.width, self.height
+        if rotation % 180:
+            w_pt, h_pt = h_pt, w_pt
+        # insert_image mantiene la proporción: la firma ocupa min(w/ancho, h/alto) puntos por píxel
+        pt_per_px = min(w_pt / self.width, h_pt / self.height)
+        factor = min(1.0, pt_per_px * self.settings.target_dpi / 72.0)
+        return max(1, round(self.width * factor)), max(1, round(self.height * factor))
+
+    def variant(self, w_pt: float, h_pt: float, rotation: int = 0) -> SignatureVariant:
+        if self.settings.passthrough:
+            return SignatureVariant("original", self.png, None, self.width, self.height)
+        size = self._target_size(w_pt, h_pt, rotation)
+        found = self._variants.get(size)
+        if found is None:
+            s = self.settings
+            key = hashlib.sha256(json.dumps([self.source_hash, size, s.format, s.jpeg_quality]).encode()).hexdigest()
+            found = self._load(key, size) or self._build(key, size)
+            self._variants[size] = found
+        return found
+
+    def insert(self, page, rect, variant: SignatureVariant, rotation: int, xrefs: dict[str, int]) -> int:
+        """
+        insert_signature con la variante; xrefs = {variante: xref} del documento.
+        MuPDF embebe los PNG (y la máscara del JPEG) decodificados y sin
+        comprimir, y el guardado "full" no los comprime: la primera vez en
+        cada documento se reemplazan por su versión Flate (calculada una vez).
+        """
+        xref = xrefs.get(variant.key, 0)
+        new = insert_signature(page, rect, variant.stream, rotation, xref, variant.mask)
+        if not xref and not self.settings.passthrough:
+            self._deflate(page.parent, new, variant.key)
+        xrefs[variant.key] = new
+        return new
+
+    def _deflate(self, doc, xref: int, key: str) -> None:
+        smask = doc.xref_get_key(xref, "SMask")
+        targets = [xref] + ([int(smask[1].split()[0])] if smask[0] == "xref" else [])
+        for role, x in enumerate(targets):
+            if doc.xref_get_key(x, "Filter")[0] != "null":
+                continue  # ya comprimida (DCTDecode del JPEG)
+            data = self._flate.get((key, role))
+            if data is None:
+                data = self._flate[(key, role)] = zlib.compress(doc.xref_stream(x), 6)
+            doc.update_stream(x, data, compress=False)
+            doc.xref_set_key(x, "Filter", "/FlateDecode")
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        d = self.settings.cache_dir / key[:2]
+        return d / f"{key}.img", d / f"{key}.mask"
+
+    def _load(self, key: str, size: tuple[int, int]) -> SignatureVariant | None:
+        if not self.settings.cache_dir:
+            return None
+        img_path, mask_path = self._paths(key)
+        try:
+            stream = img_path.read_bytes()
+        except OSError:
+            return None
+        mask = mask_path.read_bytes() if mask_path.exists() else None
+        return SignatureVariant(key, stream, mask, *size)
+
+    def _build(self, key: str, size: tuple[int, int]) -> SignatureVariant:
+        if self._image is None:
+            self._image = Image.open(io.BytesIO(self.png)).convert("RGBA")
+        img = self._image if size == self._image.size else self._image.resize(size, Image.Resampling.LANCZOS)
+        fmt = self.settings.format
+        if fmt == "auto":
+            fmt = "palette" if img.getcolors(PALETTE_MAX_COLORS) is not None else "jpeg"
+        mask = None
+        buf = io.BytesIO()
+        if fmt == "jpeg":
+            img.convert("RGB").save(buf, format="JPEG", quality=self.settings.jpeg_quality, optimize=True)
+            alpha = img.getchannel("A")
+            if alpha.getextrema() != (255, 255):  # totalmente opaca: sin máscara
+                mbuf = io.BytesIO()
+                alpha.save(mbuf, format="PNG", optimize=True)
+                mask = mbuf.getvalue()
+        elif fmt == "palette":
+            img.quantize(colors=PALETTE_MAX_COLORS, method=Image.Quantize.FASTOCTREE).save(
+                buf, format="PNG", optimize=True)
+        else:
+            img.save(buf, format="PNG", optimize=True)
+        found = SignatureVariant(key, buf.getvalue(), mask, *size)
+        self._store(found)
+        return found
+
+    def _store(self, found: SignatureVariant) -> None:
+        if not self.settings.cache_dir:
+            return
+        img_path, mask_path = self._paths(found.key)
+        try:
+            img_path.parent.mkdir(parents=True, exist_ok=True)
+            # escritura atómica: varios workers pueden compartir la caché; la máscara va primero
+            for path, data in ((mask_path, found.mask), (img_path, found.stream)):
+                if data is None:
+                    continue
+                fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp, path)
+        except OSError as e:
+            print(f"[WARN] No se pudo guardar la variante de la firma en {self.settings.cache_dir}: {e}")
@@ -0,0 +1,90 @@
+# src/pdf_ocr_stamper/templates.py
+# Huella de plantilla: contratos generados desde el mismo Word tienen el anchor
+# en las mismas coordenadas. Si la huella ya se conoce, se reutiliza lo que se
+# encontró en cada página y solo se verifica el anchor en su bbox (o la línea
+# en una franja angosta alrededor de su y).
+from __future__ import annotations
+from typing import Callable, Iterable
+import fitz
+
+from .anchors import AnchorMatcher, PageText, find_anchor_bbox, find_signature_line
+from .cache import stable_hash
+
+# Banda inferior (fracción del alto) donde se mide el diseño de bloques
+LAYOUT_BAND = 0.40
+# Rejilla (pt) para redondear orígenes de bloques: tolera diferencias mínimas
+LAYOUT_GRID = 2.0
+# Holgura (pt) al verificar el anchor en el bbox guardado
+VERIFY_TOL = 2.0
+
+def _snap(v: float) -> int:
+    return int(round(v / LAYOUT_GRID))
+
+def layout_fingerprint(doc: fitz.Document, pages: Iterable[int], rule_fingerprint: str,
+                       text_for: Callable[[int], PageText]) -> str | None:
+    """
+    Huella barata del diseño de las páginas buscadas: cantidad de páginas,
+    mediabox/rotación y origen (x0, y0) de los bloques de texto en la banda
+    inferior. Solo el origen: el ancho cambia con el texto variable (nombres,
+    montos). text_for(p1) entrega las palabras de la capa de texto de la
+    página, las mismas que después usa la búsqueda del anchor (sin otra
+    extracción). Retorna None si las bandas no tienen texto (p.ej. escaneos:
+    dos escaneos distintos del mismo tamaño tendrían la misma huella).
+    """
+    parts = [rule_fingerprint, doc.page_count]
+    has_text = False
+    for p1 in sorted(pages):
+        page = doc.load_page(p1 - 1)
+        r = page.rect
+        band_top = r.y1 - r.height * LAYOUT_BAND
+        origins: dict[int, list[float]] = {}  # bloque -> [x0, y0] de sus palabras en la banda
+        for w in text_for(p1).words:
+            if w[1] < band_top:
+                continue
+            o = origins.get(w[5])
+            if o is None:
+                origins[w[5]] = [w[0], w[1]]
+            else:
+                o[0], o[1] = min(o[0], w[0]), min(o[1], w[1])
+        has_text = has_text or bool(origins)
+        parts.append([
+            p1,
+            [round(v, 1) for v in page.mediabox],
+            page.rotation,
+            sorted((_snap(x0), _snap(y0)) for x0, y0 in origins.values()),
+        ])
+    return stable_hash(parts) if has_text else None
+
+def verify_anchor(page: fitz.Page, matcher: AnchorMatcher, anchor_idx: int, bbox, text: PageText):
+    """
+    Busca el anchor solo entre las palabras de text (la página completa) que
+    caen dentro de bbox (+ holgura). Retorna (bbox, AnchorSpec) si aparece el
+    mismo anchor en la misma posición; si no, None.
+    """
+    if not 0 <= anchor_idx < len(matcher.anchors):
+        return None
+    x0, y0, x1, y1 = bbox
+    x0, y0, x1, y1 = x0 - VERIFY_TOL, y0 - VERIFY_TOL, x1 + VERIFY_TOL, y1 + VERIFY_TOL
+    inside = PageText([w for w in text.words if w[0] >= x0 and w[1] >= y0 and w[2] <= x1 and w[3] <= y1])
+    found = find_anchor_bbox(page, matcher, inside)
+    if not found or found[1] is not matcher.anchors[anchor_idx]:
+        return None
+    if any(abs(a - b) > VERIFY_TOL for a, b in zip(found[0], bbox)):
+        return None
+    return found
+
+def verify_line(page: fitz.Page, line_cfg, xy):
+    """
+    Vuelve a buscar la línea solo en una franja angosta alrededor de la y
+    guardada. Retorna [x, y] si la misma línea sigue ahí (misma x e y, con
+    holgura); si no, None.
+    """
+    x, y_top = xy
+    y = y_top + float(line_cfg.dy_above_line or 10)  # la y guardada ya está desplazada sobre la línea
+    r = page.rect
+    clip = (r.x0, y - VERIFY_TOL, r.x1, y + VERIFY_TOL)
+    found = find_signature_line(page, line_cfg.min_width, line_cfg.dy_above_line, clip=clip,
+                                max_thickness=line_cfg.max_thickness, method=line_cfg.method)
+    if not found or abs(found[0] - x) > VERIFY_TOL or abs(found[1] - y_top) > VERIFY_TOL:
+        return None
+    return list(found)
@@ -0,0 +1,84 @@
+# src/pdf_ocr_stamper/timing.py
+# Tiempos por etapa de cada PDF (siempre activos: un perf_counter por etapa)
+# y resumen del lote. Las etapas anidadas se descuentan de la que las
+# contiene: "anchor" es solo la búsqueda del regex, sin la extracción de
+# texto ("text") ni el OCR ("ocr") que dispara.
+from __future__ import annotations
+from contextlib import contextmanager
+import time
+
+STAGES = ("read", "open", "template", "text", "ocr", "anchor", "line", "raster_line",
+          "analyze", "stamp", "preview", "save", "write")
+TIMING_FIELDS = [f"t_{s}_ms" for s in STAGES]  # columnas opcionales del placement_log (log_timings)
+SLOWEST = 3
+
+class StageTimer:
+    """ms acumulados por etapa de un documento (tiempo propio, sin subetapas)."""
+
+    __slots__ = ("ms", "_children")
+
+    def __init__(self):
+        self.ms: dict[str, float] = {}
+        self._children: list[float] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        t0 = time.perf_counter()
+        self._children.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - t0
+            nested = self._children.pop()
+            self.ms[name] = self.ms.get(name, 0.0) + (elapsed - nested) * 1000
+            if self._children:
+                self._children[-1] += elapsed
+
+    def rounded(self) -> dict[str, float]:
+        return {k: round(v, 2) for k, v in self.ms.items()}
+
+def timing_columns(timings: dict | None) -> dict:
+    """Columnas t_<etapa>_ms para las filas del placement_log."""
+    return {f"t_{s}_ms": (timings or {}).get(s, "") for s in STAGES}
+
+def _pct(values: list[float], p: float) -> float:
+    v = sorted(values)
+    return v[min(len(v) - 1, int(round(p / 100 * (len(v) - 1))))]
+
+class BatchTimings:
+    """Acumula result["timings"] del lote para el resumen final."""
+
+    def __init__(self):
+        self.files = 0
+        self.pages = 0
+        self.per_stage: dict[str, list[float]] = {}
+        self.totals: list[tuple[float, str]] = []
+
+    def add(self, result: dict):
+        timings = result.get("timings")
+        if not timings or result.get("cached"):
+            return
+        self.files += 1
+        self.pages += result.get("pages", 0)
+        for stage, ms in timings.items():
+            self.per_stage.setdefault(stage, []).append(ms)
+        self.totals.append((sum(timings.values()), result["file"]))
+
+    def summary(self, wall_s: float) -> list[str]:
+        if not self.files:
+            return []
+        wall_s = max(wall_s, 1e-9)
+        lines = [f"[INFO] Tiempos: {self.files} PDF(s), {self.pages} páginas en {wall_s:.2f}s "
+                 f"({self.files / wall_s:.2f} PDF/s, {self.pages / wall_s:.1f} páginas/s)"]
+        grand = sum(sum(v) for v in self.per_stage.values()) or 1.0
+        lines.append(f"       {'etapa':<12}{'total ms':>11}{'%':>6}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+        for stage in STAGES:
+            values = self.per_stage.get(stage)
+            if not values:
+                continue
+            total = sum(values)
+            lines.append(f"       {stage:<12}{total:>11.1f}{total / grand * 100:>6.1f}{_pct(values, 50):>10.2f}"
+                         f"{_pct(values, 90):>10.2f}{_pct(values, 99):>10.2f}{max(values):>10.2f}")
+        slowest = sorted(self.totals, reverse=True)[:SLOWEST]
+        lines.append("       más lentos: " + ", ".join(f"{name} ({ms:.0f} ms)" for ms, name in slowest))
+        return lines
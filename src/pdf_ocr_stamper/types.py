@@ -1,5 +1,5 @@
 # src/pdf_ocr_stamper/types.py
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from enum import Enum
 from typing import Optional
 
@@ -15,3 +15,17 @@ class StampOutcome:
     rule_name: Optional[str] = None
     reason: Optional[str] = None          # e.g., "anchors_not_found", "no_rule_matched", etc.
     pages_affected: Optional[int] = None
+
+@dataclass(frozen=True)
+class SignatureImage:
+    png: bytes                            # imagen normalizada a PNG RGBA
+    width: int
+    height: int
+
+@dataclass
+class StampResult:
+    pdf: Optional[bytes]                  # PDF estampado; None en dry-run o si no se pudo abrir
+    outcome: Optional[StampOutcome]       # None si no se pudo abrir
+    placements: list = field(default_factory=list)  # filas como placement_log.csv
+    errors: list = field(default_factory=list)      # filas como error_log.csv
+    previews: dict = field(default_factory=dict)    # dry-run: {página: JPEG}
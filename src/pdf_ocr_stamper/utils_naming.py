@@ -1,5 +1,9 @@
 # src/pdf_ocr_stamper/utils_naming.py
+from __future__ import annotations
+from fnmatch import translate
 from pathlib import Path
+from typing import Iterable
+import re
 
 def mark_filename(path: Path, prefix: str = "", suffix: str = "") -> Path:
     """Inserta prefix/suffix respetando la extensión."""
@@ -8,3 +12,86 @@ def mark_filename(path: Path, prefix: str = "", suffix: str = "") -> Path:
     stem = path.stem
     new_name = f"{prefix}{stem}{suffix}{path.suffix}"
     return path.with_name(new_name)
+
+_GLOB_CHARS = ("*", "?", "[")
+
+def is_glob(pattern: str) -> bool:
+    return any(c in pattern for c in _GLOB_CHARS)
+
+def _literal_ends(pattern: str) -> tuple[str, str]:
+    """Prefijo (antes del primer comodín) y sufijo (después del último) que todo nombre que coincide trae."""
+    first = min(pattern.index(c) for c in _GLOB_CHARS if c in pattern)
+    last = max(pattern.rindex(c) for c in ("*", "?", "[", "]") if c in pattern)
+    return pattern[:first], pattern[last + 1:]
+
+class GlobIndex:
+    """
+    Primer patrón (en el orden dado) que coincide con un nombre, con la misma
+    semántica que name_matches (fnmatch sin distinguir mayúsculas) pero sin
+    recorrer la lista: los literales van en un dict y los demás se agrupan
+    por su prefijo y sufijo literales ("rrhh_" + ".pdf" en "rrhh_*.pdf").
+    Si el patrón tiene un solo "*" ese par ya decide; si no, se prueba una
+    regex combinada solo con los patrones del grupo. Así el costo de first()
+    depende de cuántos largos distintos de prefijo/sufijo hay, no de
+    cuántos patrones.
+    """
+
+    __slots__ = ("size", "_exact", "_groups", "_prefix_lens")
+
+    def __init__(self, patterns: Iterable[str | None]):
+        exact: dict[str, int] = {}
+        star: dict[tuple[str, str], int] = {}
+        other: dict[tuple[str, str], list[tuple[int, str]]] = {}
+        self.size = 0
+        for i, pattern in enumerate(patterns):
+            if not pattern:
+                continue
+            self.size += 1
+            p = pattern.lower()
+            if not is_glob(p):
+                exact.setdefault(p, i)
+                continue
+            if p.count("*") == 1 and "?" not in p and "[" not in p:
+                star.setdefault(tuple(p.split("*")), i)
+            else:
+                other.setdefault(_literal_ends(p), []).append((i, p))
+
+        # prefijo -> ({sufijo: (índice "un *", regex del grupo, menor índice de la regex)}, largos de sufijo)
+        groups: dict[str, dict[str, tuple]] = {}
+        for prefix, suffix in star.keys() | other.keys():
+            items = other.get((prefix, suffix))
+            # re.match prueba las alternativas en orden: la primera que coincide es la de menor índice
+            rx = re.compile("|".join(f"(?P<p{i}>{translate(p)})" for i, p in items)) if items else None
+            groups.setdefault(prefix, {})[suffix] = (star.get((prefix, suffix)), rx, items[0][0] if items else None)
+        self._exact = exact
+        self._groups = {prefix: (by_suffix, sorted({len(s) for s in by_suffix})) for prefix, by_suffix in groups.items()}
+        self._prefix_lens = sorted({len(p) for p in groups})
+
+    def first(self, name: str) -> int | None:
+        """Índice del primer patrón que coincide con name, o None."""
+        name = name.lower()
+        n = len(name)
+        best = self._exact.get(name)
+        for plen in self._prefix_lens:
+            if plen > n:
+                break
+            group = self._groups.get(name[:plen])
+            if group is None:
+                continue
+            by_suffix, lens = group
+            for slen in lens:
+                if plen + slen > n:
+                    break
+                entry = by_suffix.get(name[n - slen:])
+                if entry is None:
+                    continue
+                star_i, rx, rx_first = entry
+                if star_i is not None and (best is None or star_i < best):
+                    best = star_i
+                if rx is not None and (best is None or rx_first < best):
+                    m = rx.match(name)
+                    if m:
+                        i = int(m.lastgroup[1:])  # el grupo externo p<i> es el último en cerrarse
+                        if best is None or i < best:
+                            best = i
+        return best
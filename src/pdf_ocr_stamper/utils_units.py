@@ -1,9 +1,52 @@
-def parse_length(val: str | float | int | None, ref: float | None = None) -> float | None:
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Length:
+    """Longitud ya parseada: puntos o porcentaje de una referencia."""
+    value: float
+    percent: bool = False
+
+    def to_points(self, ref: float | None = None) -> float:
+        if self.percent:
+            if ref is None:
+                raise ValueError("Porcentaje sin referencia (ref=None).")
+            return ref * self.value / 100.0
+        return self.value
+
+    def __str__(self) -> str:
+        return f"{self.value:g}%" if self.percent else f"{self.value:g}"
+
+
+def compile_length(val: "str | float | int | Length | None") -> Length | None:
+    """
+    Parsea una sola vez "10%" o un número a Length (lanza ValueError si es inválido).
+    """
+    if val is None or isinstance(val, Length):
+        return val
+    if isinstance(val, bool):
+        raise ValueError(f"Longitud inválida: {val!r}")
+    if isinstance(val, (int, float)):
+        return Length(float(val))
+    s = str(val).strip()
+    if not s:
+        return None
+    try:
+        if s.endswith("%"):
+            return Length(float(s[:-1]), percent=True)
+        return Length(float(s))
+    except ValueError:
+        raise ValueError(f"Longitud inválida: {val!r}") from None
+
+
+def parse_length(val: "str | float | int | Length | None", ref: float | None = None) -> float | None:
     """
     Convierte "10%" a puntos (usando ref como 100%), o número directo.
     """
     if val is None:
         return None
+    if isinstance(val, Length):
+        return val.to_points(ref)
     if isinstance(val, (int, float)):
         return float(val)
     s = str(val).strip()
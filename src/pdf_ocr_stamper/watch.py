@@ -0,0 +1,224 @@
+# src/pdf_ocr_stamper/watch.py
+# Modo --watch: proceso residente que vigila input_dir y estampa cada PDF nuevo
+# apenas termina de copiarse. Reglas, manifest y firma quedan cargados en
+# memoria (contexto "tibio"); si cambian config.yaml, rules.yaml o el manifest
+# se recargan sin reiniciar. Usa watchdog (inotify/ReadDirectoryChangesW) si
+# está instalado: pip install "pdf-ocr-stamper[watch]"; si no, sondea la carpeta.
+from __future__ import annotations
+from pathlib import Path
+from typing import Callable
+import os
+import threading
+import time
+
+from .metrics import start_http_server
+from .pipeline import _build_context, process_batch
+
+try:  # opcional
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:  # pragma: no cover
+    Observer = None
+
+WATCH_DEBOUNCE = 0.5        # segundos sin cambios de tamaño/fecha para dar un archivo por copiado
+WATCH_POLL_INTERVAL = 0.5   # sondeo de la carpeta (sin watchdog) y de config/reglas
+TICK = 0.1
+EOF_TAIL = 2048             # un PDF completo termina con %%EOF (más algún salto de línea)
+MAX_INCOMPLETE_WAIT = 30.0  # si nunca aparece %%EOF, se procesa igual (y falla con su error)
+
+def _is_pdf(path: Path) -> bool:
+    return path.suffix.lower() == ".pdf"  # como discovery.include por defecto (*.pdf, sin distinguir mayúsculas)
+
+def _stat_key(path: Path):
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def _looks_complete(path: Path) -> bool:
+    """Abrible (Windows bloquea archivos a medio copiar) y con %%EOF al final."""
+    try:
+        with path.open("rb") as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            f.seek(max(0, size - EOF_TAIL))
+            return b"%%EOF" in f.read()
+    except OSError:
+        return False
+
+class _Debouncer:
+    """
+    Archivos tocados -> listos cuando su (tamaño, fecha) no cambia durante
+    `debounce` segundos y el PDF parece completo. Seguro entre hilos.
+    """
+
+    def __init__(self, debounce: float):
+        self.debounce = debounce
+        self._pending: dict[Path, tuple] = {}   # path -> (stat, desde, primera vez)
+        self._lock = threading.Lock()
+
+    def touch(self, path: Path) -> None:
+        if not _is_pdf(path):
+            return
+        now = time.monotonic()
+        with self._lock:
+            _, _, first = self._pending.get(path, (None, now, now))
+            self._pending[path] = (_stat_key(path), now, first)
+
+    def ready(self) -> list[Path]:
+        now = time.monotonic()
+        out = []
+        with self._lock:
+            for path, (key, since, first) in list(self._pending.items()):
+                cur = _stat_key(path)
+                if cur is None:           # borrado o movido
+                    del self._pending[path]
+                elif cur != key:          # sigue creciendo
+                    self._pending[path] = (cur, now, first)
+                elif now - since >= self.debounce and cur[0] > 0:
+                    if _looks_complete(path) or now - first >= MAX_INCOMPLETE_WAIT:
+                        del self._pending[path]
+                        out.append(path)
+        return sorted(out)
+
+class _PollingSource:
+    """Sin watchdog: compara (tamaño, fecha) de input_dir en cada vuelta."""
+
+    def __init__(self, input_dir: Path, debouncer: _Debouncer, interval: float):
+        self.input_dir = input_dir
+        self.debouncer = debouncer
+        self.interval = interval
+        self._seen = self._snapshot()
+        self._last = time.monotonic()
+
+    def _snapshot(self) -> dict[str, tuple]:
+        snap = {}
+        try:
+            with os.scandir(self.input_dir) as it:
+                for e in it:
+                    if e.is_file() and e.name.lower().endswith(".pdf"):
+                        st = e.stat()
+                        snap[e.name] = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            pass
+        return snap
+
+    def poll(self) -> None:
+        if time.monotonic() - self._last < self.interval:
+            return
+        self._last = time.monotonic()
+        snap = self._snapshot()
+        for name, key in snap.items():
+            if self._seen.get(name) != key:
+                self.debouncer.touch(self.input_dir / name)
+        self._seen = snap
+
+    def stop(self) -> None:
+        pass
+
+if Observer is not None:
+    class _Handler(FileSystemEventHandler):
+        def __init__(self, debouncer: _Debouncer):
+            self.debouncer = debouncer
+
+        def on_any_event(self, event):
+            if event.is_directory:
+                return
+            for attr in ("src_path", "dest_path"):
+                path = getattr(event, attr, None)
+                if path:
+                    self.debouncer.touch(Path(os.fsdecode(path)))
+
+class _WatchdogSource:
+    def __init__(self, input_dir: Path, debouncer: _Debouncer):
+        self.observer = Observer()
+        self.observer.schedule(_Handler(debouncer), str(input_dir), recursive=False)
+        self.observer.start()
+
+    def poll(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        self.observer.stop()
+        self.observer.join(5)
+
+def _watched_files(cfg: dict, config_path: str) -> list[Path]:
+    paths = [config_path, cfg.get("rules_yaml") or cfg.get("rules_file"), cfg.get("manifest_csv")]
+    return [Path(p) for p in paths if p]
+
+def _mtimes(paths: list[Path]) -> dict[Path, tuple | None]:
+    return {p: _stat_key(p) for p in paths}
+
+def watch(load_cfg: Callable[[], dict], config_path: str) -> None:
+    """
+    Estampa lo que ya está en input_dir y luego cada PDF que llegue, hasta Ctrl+C.
+    load_cfg() relee config.yaml con las opciones de la línea de comandos.
+    """
+    cfg = load_cfg()
+    ctx = _build_context(cfg)
+    input_dir = Path(cfg["input_dir"])
+    input_dir.mkdir(parents=True, exist_ok=True)
+
+    debounce = float(cfg.get("watch_debounce", WATCH_DEBOUNCE))
+    interval = float(cfg.get("watch_poll_interval", WATCH_POLL_INTERVAL))
+    debouncer = _Debouncer(debounce)
+    if Observer is not None:
+        source = _WatchdogSource(input_dir, debouncer)
+        mode = "watchdog"
+    else:
+        source = _PollingSource(input_dir, debouncer, interval)
+        mode = f"sondeo cada {interval:g}s"
+
+    # Lo que ya estaba: lote normal (la caché de resultados omite lo ya estampado).
+    # La vigilancia arranca antes, así no se pierde lo que llegue mientras tanto.
+    metrics_server = None
+    try:
+        metrics_server = start_http_server(cfg)  # metrics.port (se lee una vez)
+        process_batch(cfg, auto_confirm=True, ctx=ctx)
+    except Exception:
+        source.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()
+        raise
+    print(f"[INFO] Vigilando {input_dir} ({mode}); Ctrl+C para salir")
+
+    watched = _watched_files(cfg, config_path)
+    stamps = _mtimes(watched)
+    last_check = time.monotonic()
+    try:
+        while True:
+            time.sleep(TICK)
+            source.poll()
+
+            # Recarga en caliente de config/reglas/manifest
+            if time.monotonic() - last_check >= interval:
+                last_check = time.monotonic()
+                now_stamps = _mtimes(watched)
+                if now_stamps != stamps:
+                    stamps = now_stamps
+                    try:
+                        new_cfg = load_cfg()
+                        new_ctx = _build_context(new_cfg)
+                    except Exception as e:
+                        print(f"[ERROR] Recarga fallida, se mantiene la configuración anterior: {e}")
+                    else:
+                        cfg, ctx = new_cfg, new_ctx
+                        watched = _watched_files(cfg, config_path)
+                        stamps = _mtimes(watched)
+                        if Path(cfg["input_dir"]) != input_dir:
+                            print("[WARN] input_dir cambió en config.yaml; reinicie --watch para vigilar la nueva carpeta")
+                        print("[INFO] Configuración y reglas recargadas")
+
+            ready = debouncer.ready()
+            if ready:
+                try:
+                    process_batch(cfg, auto_confirm=True, files=ready, ctx=ctx)
+                except Exception as e:
+                    print(f"[ERROR] Procesando {', '.join(p.name for p in ready)}: {e}")
+    except KeyboardInterrupt:
+        print("[INFO] Vigilancia detenida")
+    finally:
+        source.stop()
+        if metrics_server is not None:
+            metrics_server.shutdown()